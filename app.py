@@ -1,6 +1,8 @@
+import os
+
 from shophive_packages import create_app, db  # noqa
 
-app = create_app()
+app = create_app(os.environ.get("FLASK_CONFIG", "default"))
 with app.app_context():
     db.create_all()
 
@@ -1,15 +1,74 @@
 import os
 from datetime import timedelta
+from typing import Any
 from flask import Flask
 
 
+def postgres_engine_options(
+    pool_size: int,
+    max_overflow: int,
+    pool_timeout: float,
+    pool_recycle: int,
+    statement_timeout_ms: int,
+    lock_timeout_ms: int,
+    pgbouncer: bool = False,
+    application_name: str = "shophive",
+) -> dict[str, Any]:
+    """
+    ``SQLALCHEMY_ENGINE_OPTIONS`` for PostgreSQL through psycopg2.
+
+    Timeouts go in the connection's startup ``options`` when talking to
+    PostgreSQL directly.  PgBouncer refuses that startup parameter, so
+    behind it they are set per transaction instead (see
+    ``services.db_pool``).
+    """
+    connect_args: dict[str, Any] = {
+        "connect_timeout": 5,
+        "application_name": application_name,
+        # Notice dead peers (failovers, idle NAT timeouts) within ~a minute
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 3,
+    }
+    if not pgbouncer:
+        connect_args["options"] = (
+            f"-c statement_timeout={statement_timeout_ms} "
+            f"-c lock_timeout={lock_timeout_ms}"
+        )
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+        "pool_recycle": pool_recycle,
+        "pool_pre_ping": True,
+        # Most requests touch a handful of rows; reusing the most recent
+        # connection keeps the idle ones closable by PgBouncer/the server
+        "pool_use_lifo": True,
+        "connect_args": connect_args,
+    }
+
+
 class Config:
     """
     Base configuration class.
     """
 
     SECRET_KEY = os.environ.get("SECRET_KEY", os.urandom(24))
-    SESSION_TYPE = "filesystem"
+    # Server-side sessions: "redis" (SESSION_REDIS_URL), "sql" (the
+    # sessions table), "memory" (one process only) or "filesystem" (the
+    # legacy Flask-Session files, see ``flask sessions migrate-files``).
+    SESSION_REDIS_URL = os.environ.get("SESSION_REDIS_URL")
+    SESSION_BACKEND = os.environ.get(
+        "SESSION_BACKEND", "redis" if SESSION_REDIS_URL else "sql"
+    )
+    SESSION_REDIS_MAX_CONNECTIONS = int(
+        os.environ.get("SESSION_REDIS_MAX_CONNECTIONS", 20)
+    )
+    SESSION_REDIS_POOL_TIMEOUT = 1.0
+    SESSION_COMPRESS_MIN_BYTES = 512
+    # Flask-Session only serves the filesystem backend
+    SESSION_TYPE = "filesystem" if SESSION_BACKEND == "filesystem" else "null"
     SESSION_FILE_DIR = os.path.join(os.getcwd(), "flask_session")
     SESSION_PERMANENT = True
     PERMANENT_SESSION_LIFETIME = timedelta(days=31)
@@ -21,10 +80,191 @@ class Config:
     SESSION_COOKIE_SECURE = False  # Set to True in production
     SESSION_COOKIE_SAMESITE = "Lax"
     SESSION_REFRESH_EACH_REQUEST = True
+    # Seconds an unchanged session is left unwritten before its expiry
+    # is pushed forward; 0 rewrites it on every request.
+    SESSION_REFRESH_INTERVAL = int(
+        os.environ.get("SESSION_REFRESH_INTERVAL", 3600)
+    )
+    # Keep guest carts in a signed cookie (product ids and quantities
+    # only) instead of the server-side session.
+    GUEST_CART_COOKIE = os.environ.get(
+        "GUEST_CART_COOKIE", "false"
+    ).lower() in ("1", "true", "yes")
+    GUEST_CART_COOKIE_NAME = "shophive_cart"
+    GUEST_CART_COOKIE_MAX_AGE = timedelta(days=30)
+    GUEST_CART_MAX_LINES = 50
+    GUEST_CART_MAX_QUANTITY = 99
+    # Signed cookie holding an anonymous visitor's CSRF token, so a page
+    # with a form does not store a session for them.
+    CSRF_COOKIE_NAME = "shophive_csrf"
+    # Seconds a logged-in identity is reused per process before the user
+    # row is read again; 0 reads it on every request.  At most
+    # IDENTITY_CACHE_MAX_ENTRIES identities are kept per process.
+    IDENTITY_CACHE_TTL = float(os.environ.get("IDENTITY_CACHE_TTL", 30))
+    IDENTITY_CACHE_MAX_ENTRIES = int(
+        os.environ.get("IDENTITY_CACHE_MAX_ENTRIES", 10000)
+    )
+    # bcrypt cost for new hashes; existing hashes are upgraded on login.
+    # Hashing runs on PASSWORD_HASH_WORKERS threads per process with at
+    # most PASSWORD_HASH_QUEUE_DEPTH waiting; beyond that logins get a 503.
+    BCRYPT_LOG_ROUNDS = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_QUEUE_DEPTH = int(
+        os.environ.get("PASSWORD_HASH_QUEUE_DEPTH", 16)
+    )
+    PASSWORD_HASH_TIMEOUT = 10.0
+    # Token-bucket limits per "<scope>:<key>", as "<burst>/<period>".
+    # Buckets are shared through Redis when RATE_LIMIT_REDIS_URL is set,
+    # otherwise each process keeps its own.
+    RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL")
+    RATE_LIMITS = {
+        "login:ip": "30/minute",
+        "login:username": "10/minute",
+        "register:ip": "20/hour",
+        "checkout:user": "10/minute",
+        "orders.batch:ip": "60/minute",
+        "orders.bulk_status:ip": "60/minute",
+    }
+    # Token-authenticated JSON API (/api/v1). Paths under the stateless
+    # prefixes (the API, static files, health checks) never load or save
+    # a server-side session.  Revoked tokens are kept in Redis when
+    # JWT_DENYLIST_REDIS_URL is set, else in the revoked_tokens table.
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=15)
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    JWT_DENYLIST_REDIS_URL = os.environ.get("JWT_DENYLIST_REDIS_URL")
+    STATELESS_PATH_PREFIXES = ("/api/v1/", "/static/", "/health",
+                               "/metrics")
+    # Seconds stock is held while a buyer is on the checkout page;
+    # 0 disables holds and stock is only taken when the order is placed.
+    INVENTORY_RESERVATION_TTL = int(
+        os.environ.get("INVENTORY_RESERVATION_TTL", 0)
+    )
+    # How long a response is replayed for a repeated Idempotency-Key, and
+    # how long a duplicate waits for the first request to finish.
+    IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", 86400))
+    # How long a key stays claimed by a request that has not finished;
+    # after that a retry may claim it (the first worker probably died).
+    IDEMPOTENCY_LEASE_SECONDS = int(
+        os.environ.get("IDEMPOTENCY_LEASE_SECONDS", 120)
+    )
+    IDEMPOTENCY_WAIT_SECONDS = float(
+        os.environ.get("IDEMPOTENCY_WAIT_SECONDS", 10)
+    )
+    # Background job worker (``flask jobs work``)
+    JOBS_MAX_ATTEMPTS = int(os.environ.get("JOBS_MAX_ATTEMPTS", 5))
+    JOBS_BACKOFF_SECONDS = float(os.environ.get("JOBS_BACKOFF_SECONDS", 5))
+    JOBS_BACKOFF_MAX_SECONDS = 3600
+    JOBS_LEASE_SECONDS = 300
+    JOBS_POLL_INTERVAL = 1.0
+    # Order status stream (Server-Sent Events). Without a Redis URL events
+    # are only delivered to streams held by the same process.
+    ORDER_EVENTS_REDIS_URL = os.environ.get("ORDER_EVENTS_REDIS_URL")
+    SSE_HEARTBEAT_SECONDS = 15.0
+    SSE_BUFFER_SIZE = 100
+    SSE_MAX_STREAM_SECONDS = 300.0
+    # Delivered/cancelled orders untouched for this many days move to the
+    # archive tables (``flask archive run``).
+    ORDER_ARCHIVE_AFTER_DAYS = int(
+        os.environ.get("ORDER_ARCHIVE_AFTER_DAYS", 365)
+    )
+    ORDER_ARCHIVE_BATCH_SIZE = 1000
+    # Bearer token integrations send to ``POST /api/orders/batch``; unset,
+    # only admins can call it
+    ORDER_BATCH_TOKEN = os.environ.get("ORDER_BATCH_TOKEN")
+    # Largest accepted ``POST /api/orders/batch``
+    ORDER_BATCH_MAX_ORDERS = int(
+        os.environ.get("ORDER_BATCH_MAX_ORDERS", 1000)
+    )
+    # Domain event outbox (``flask outbox dispatch``); sinks are comma
+    # separated names: log, file, memory.
+    OUTBOX_SINKS = os.environ.get("OUTBOX_SINKS", "log")
+    OUTBOX_FILE_PATH = os.environ.get("OUTBOX_FILE_PATH", "outbox.jsonl")
+    OUTBOX_BATCH_SIZE = 500
+    OUTBOX_POLL_INTERVAL = 1.0
+    # Payment processor. "fake" approves everything in-process; "http"
+    # talks to PAYMENT_GATEWAY_URL.  Calls beyond PAYMENT_MAX_CONCURRENCY
+    # wait at most PAYMENT_ACQUIRE_TIMEOUT seconds, then fail fast.
+    # Startup refuses "fake" unless PAYMENT_ALLOW_FAKE is on.
+    PAYMENT_GATEWAY = os.environ.get("PAYMENT_GATEWAY", "fake")
+    PAYMENT_ALLOW_FAKE = True
+    PAYMENT_GATEWAY_URL = os.environ.get("PAYMENT_GATEWAY_URL")
+    PAYMENT_API_KEY = os.environ.get("PAYMENT_API_KEY")
+    PAYMENT_CURRENCY = os.environ.get("PAYMENT_CURRENCY", "USD")
+    PAYMENT_CONNECT_TIMEOUT = 2.0
+    PAYMENT_READ_TIMEOUT = 5.0
+    PAYMENT_MAX_CONCURRENCY = int(
+        os.environ.get("PAYMENT_MAX_CONCURRENCY", 10)
+    )
+    PAYMENT_ACQUIRE_TIMEOUT = 0.5
+    PAYMENT_BREAKER_THRESHOLD = 5
+    PAYMENT_BREAKER_RESET_SECONDS = 30.0
+    # Connect once at startup and log the connection budget (pool size x
+    # DB_CLIENT_PROCESSES against the server's max_connections).
+    DB_STARTUP_CHECK = False
+    DB_CLIENT_PROCESSES = int(os.environ.get("WEB_CONCURRENCY", 1))
+    # SQLite file databases: WAL and tuned pragmas on every connection,
+    # and write transactions serialized (BEGIN IMMEDIATE behind one lock
+    # per process) so concurrent buyers queue instead of failing.
+    SQLITE_HIGH_CONCURRENCY = os.environ.get(
+        "SQLITE_HIGH_CONCURRENCY", "true"
+    ).lower() in ("1", "true", "yes")
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -64000,  # 64 MiB
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    }
+    # Seconds a write transaction may queue for the writer before a 503
+    SQLITE_WRITE_QUEUE_TIMEOUT = 30.0
+    # Read replicas (comma-separated URLs), added as binds replica1..N.
+    # GETs to DB_REPLICA_BLUEPRINTS read from a healthy replica unless
+    # the browser wrote within DB_REPLICA_STICKY_SECONDS.
+    DB_REPLICA_URLS = [
+        url.strip()
+        for url in os.environ.get("DB_REPLICA_URLS", "").split(",")
+        if url.strip()
+    ]
+    SQLALCHEMY_BINDS = {
+        f"replica{number}": url
+        for number, url in enumerate(DB_REPLICA_URLS, 1)
+    }
+    DB_REPLICA_BLUEPRINTS = ("read_product", "pagination", "order_bp")
+    DB_REPLICA_STICKY_SECONDS = float(
+        os.environ.get("DB_REPLICA_STICKY_SECONDS", 5)
+    )
+    DB_REPLICA_COOKIE_NAME = "shophive_primary"
+    # Replicas further behind than this (seconds) get no reads
+    DB_REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", 10))
+    DB_REPLICA_CHECK_INTERVAL = 2.0
+    # Per-request SQL statistics: a Server-Timing header, a log line per
+    # request, and SQL_REPEAT_ACTION ("warn" or "raise") when one
+    # statement shape runs more than SQL_REPEAT_THRESHOLD times (N+1).
+    SQL_INSTRUMENTATION = os.environ.get(
+        "SQL_INSTRUMENTATION", "false"
+    ).lower() in ("1", "true", "yes")
+    SQL_REPEAT_THRESHOLD = int(os.environ.get("SQL_REPEAT_THRESHOLD", 10))
+    SQL_REPEAT_ACTION = os.environ.get("SQL_REPEAT_ACTION", "warn")
+    # Prometheus metrics at /metrics. Under gunicorn, point
+    # PROMETHEUS_MULTIPROC_DIR at an empty directory so the workers'
+    # numbers add up (see gunicorn.conf.py). Scrapes must send
+    # METRICS_TOKEN as a bearer token; METRICS_PUBLIC serves them without
+    # one, for a port only the scraper can reach. On by default once
+    # either is set.
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    METRICS_PUBLIC = os.environ.get(
+        "METRICS_PUBLIC", "false"
+    ).lower() in ("1", "true", "yes")
+    METRICS_ENABLED = os.environ.get(
+        "METRICS_ENABLED",
+        "true" if METRICS_TOKEN or METRICS_PUBLIC else "false",
+    ).lower() in ("1", "true", "yes")
 
     @staticmethod
     def init_app(app: 'Flask') -> None:
-        os.makedirs(app.config["SESSION_FILE_DIR"], exist_ok=True)
+        if app.config["SESSION_TYPE"] == "filesystem":
+            os.makedirs(app.config["SESSION_FILE_DIR"], exist_ok=True)
 
 
 class DevelopmentConfig(Config):
@@ -53,10 +293,67 @@ class TestingConfig(Config):
 
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    OUTBOX_SINKS = "memory"
+    SESSION_BACKEND = "memory"
+    SESSION_TYPE = "null"
+    BCRYPT_LOG_ROUNDS = 4
+    SQLITE_HIGH_CONCURRENCY = False
+    METRICS_ENABLED = True
+    METRICS_PUBLIC = True
+
+
+class ProductionConfig(Config):
+    """
+    Production configuration class, read from the environment.
+
+    ``DATABASE_URL`` (or the ``DB_*`` parts) names the PostgreSQL server,
+    or PgBouncer in front of it with ``DB_PGBOUNCER=1``.  Every process
+    holds at most ``DB_POOL_SIZE + DB_MAX_OVERFLOW`` connections, so size
+    both against ``max_connections`` divided by the number of processes;
+    ``flask pool check`` prints the budget.
+    """
+
+    DB_USER = os.getenv('DB_USER', 'postgres')
+    DB_PASS = os.getenv('DB_PASS', 'postgres')
+    DB_NAME = os.getenv('DB_NAME', 'shophive')
+    DB_HOST = os.getenv('DB_HOST', 'localhost')
+    DB_PORT = os.getenv('DB_PORT', '5432')
+
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL") or (
+        f"postgresql+psycopg2://{DB_USER}:{DB_PASS}"
+        f"@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 5))
+    # Seconds a request waits for a pooled connection before failing
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 5))
+    # Replace connections older than this, below server/proxy idle limits
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    DB_STATEMENT_TIMEOUT_MS = int(
+        os.environ.get("DB_STATEMENT_TIMEOUT_MS", 5000)
+    )
+    DB_LOCK_TIMEOUT_MS = int(os.environ.get("DB_LOCK_TIMEOUT_MS", 2000))
+    DB_PGBOUNCER = os.environ.get(
+        "DB_PGBOUNCER", "false"
+    ).lower() in ("1", "true", "yes")
+    SQLALCHEMY_ENGINE_OPTIONS = postgres_engine_options(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS,
+        lock_timeout_ms=DB_LOCK_TIMEOUT_MS,
+        pgbouncer=DB_PGBOUNCER,
+    )
+    DB_STARTUP_CHECK = True
+    # No default: a deploy must name its processor, and never "fake"
+    PAYMENT_GATEWAY = os.environ.get("PAYMENT_GATEWAY")
+    PAYMENT_ALLOW_FAKE = False
 
 
 config = {
     "default": DevelopmentConfig,
     "development": DevelopmentConfig,
     "testing": TestingConfig,
+    "production": ProductionConfig,
 }
@@ -0,0 +1,26 @@
+"""
+Gunicorn settings read from the working directory by ``gunicorn app:app``.
+
+With ``PROMETHEUS_MULTIPROC_DIR`` set, every worker writes its metrics
+to files in that directory and ``/metrics`` adds them up.  The files of
+a previous run are removed at startup, and the live gauges of a worker
+that exits are dropped so pool usage is not counted twice.
+"""
+import glob
+import os
+from typing import Any
+
+from prometheus_client import multiprocess
+
+
+def on_starting(server: Any) -> None:
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(path)
+
+
+def child_exit(server: Any, worker: Any) -> None:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
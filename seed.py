@@ -27,11 +27,13 @@ with app.app_context():
         name="Laptop",
         description="A high-performance laptop.",
         price=999.99,
+        quantity=25,
     )
     product2 = Product(
         name="Smartphone",
         description="A latest model smartphone.",
         price=799.99,
+        quantity=50,
     )
     db.session.add_all([product1, product2])
     db.session.commit()  # Commit to get product IDs
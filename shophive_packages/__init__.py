@@ -10,18 +10,19 @@ from flask_login import current_user
 import os
 from dotenv import load_dotenv
 from datetime import timedelta
-from typing import TYPE_CHECKING, Optional, Union
+from typing import TYPE_CHECKING, Optional
 
 from config import config
+from shophive_packages.db_routing import RoutingSession
 
 if TYPE_CHECKING:
-    from shophive_packages.models.user import User, Seller
+    from shophive_packages.services.identity_service import CachedIdentity
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
 login_manager = LoginManager()
@@ -48,12 +49,7 @@ def setup_config(app: Flask, config_name: str) -> None:
 
 def setup_session(app: Flask) -> None:
     """Configure session handling."""
-    session_dir = os.path.join(os.getcwd(), "flask_session")
-    os.makedirs(session_dir, exist_ok=True)
-
     app.config.update(
-        SESSION_TYPE="filesystem",
-        SESSION_FILE_DIR=session_dir,
         SESSION_PERMANENT=True,
         PERMANENT_SESSION_LIFETIME=timedelta(days=31),
         SESSION_REFRESH_EACH_REQUEST=True,
@@ -71,9 +67,46 @@ def init_extensions(app: Flask) -> None:
     login_manager.init_app(app)
     csrf.init_app(app)
     flask_session.init_app(app)
+    from shophive_packages.services.session_store import init_session_store
+    init_session_store(app)
+    from shophive_packages.session_config import (
+        StatelessPathSessionInterface
+    )
+    app.session_interface = StatelessPathSessionInterface(
+        app.session_interface, app.config.get("STATELESS_PATH_PREFIXES", ())
+    )
 
     app.jinja_env.filters['price'] = format_price
 
+    from shophive_packages.services.order_events import init_order_events
+    init_order_events(app)
+    from shophive_packages.services.outbox_service import init_outbox
+    init_outbox(app)
+    from shophive_packages.services.payment_service import init_payments
+    init_payments(app)
+    from shophive_packages.services.identity_service import (
+        init_identity_cache
+    )
+    init_identity_cache(app)
+    from shophive_packages.services.password_service import init_passwords
+    init_passwords(app)
+    from shophive_packages.services.rate_limit import init_rate_limiter
+    init_rate_limiter(app)
+    from shophive_packages.services.token_service import init_tokens
+    init_tokens(app)
+    from shophive_packages.services.db_pool import init_db_pool
+    init_db_pool(app)
+    from shophive_packages.services.sqlite_profile import init_sqlite_profile
+    init_sqlite_profile(app)
+    from shophive_packages.services.replica_router import init_replicas
+    init_replicas(app)
+    from shophive_packages.services.sql_instrumentation import (
+        init_sql_instrumentation
+    )
+    init_sql_instrumentation(app)
+    from shophive_packages.services.metrics import init_metrics
+    init_metrics(app)
+
     # Configure LoginManager
     login_manager.login_view = "user_bp.login"
     login_manager.session_protection = "strong"
@@ -83,8 +116,12 @@ def init_extensions(app: Flask) -> None:
 def register_blueprints(app: Flask) -> None:
     """Register all blueprints."""
     from shophive_packages.routes.user_api_routes import user_api_bp
+    from shophive_packages.routes.api_v1_routes import api_v1_bp
     from shophive_packages.routes.auth_routes import auth_bp
-    from shophive_packages.routes.order_routes import order_bp
+    from shophive_packages.routes.order_routes import (
+        create_orders_batch, order_bp
+    )
+    from shophive_packages.routes.order_stream_routes import order_stream_bp
     from shophive_packages.routes.home import home_bp
     from shophive_packages.routes.user_routes import user_bp
     from shophive_packages.routes.cart_routes import cart_bp
@@ -108,12 +145,49 @@ def register_blueprints(app: Flask) -> None:
         cart_bp,
         checkout_bp,
         order_bp,
+        order_stream_bp,
         auth_bp,
         user_api_bp,
+        api_v1_bp,
     ]
 
     for blueprint in blueprints:
         app.register_blueprint(blueprint)
+    # Bearer tokens are not sent automatically by browsers
+    csrf.exempt(api_v1_bp)
+    csrf.exempt(create_orders_batch)
+
+
+def register_commands(app: Flask) -> None:
+    """Register CLI command groups."""
+    import shophive_packages.services.order_tasks  # noqa: F401
+    from shophive_packages.services.archive_service import archive_cli
+    from shophive_packages.services.bulk_status_service import orders_cli
+    from shophive_packages.services.db_pool import pool_cli
+    from shophive_packages.services.idempotency_service import (
+        idempotency_cli
+    )
+    from shophive_packages.services.outbox_service import outbox_cli
+    from shophive_packages.services.password_service import passwords_cli
+    from shophive_packages.services.replica_router import replicas_cli
+    from shophive_packages.services.rollup_service import rollups_cli
+    from shophive_packages.services.session_store import sessions_cli
+    from shophive_packages.services.sqlite_profile import sqlite_cli
+    from shophive_packages.services.task_queue import jobs_cli
+    from shophive_packages.services.token_service import tokens_cli
+
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(idempotency_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(orders_cli)
+    app.cli.add_command(outbox_cli)
+    app.cli.add_command(passwords_cli)
+    app.cli.add_command(pool_cli)
+    app.cli.add_command(replicas_cli)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(sessions_cli)
+    app.cli.add_command(sqlite_cli)
+    app.cli.add_command(tokens_cli)
 
 
 def create_app(config_name: str = "default") -> Flask:
@@ -127,12 +201,13 @@ def create_app(config_name: str = "default") -> Flask:
         init_extensions(app)
 
     register_blueprints(app)
+    register_commands(app)
 
     @app.context_processor
     def inject_cart_count() -> dict:
         """Inject cart count into all templates."""
         from shophive_packages.models.cart import Cart
-        from flask import session
+        from shophive_packages.services.guest_cart import get_guest_cart
 
         cart_count = 0
         app.logger.debug("Starting cart count calculation")
@@ -161,7 +236,7 @@ def create_app(config_name: str = "default") -> Flask:
         else:
             # Handle anonymous users with session cart
             try:
-                cart_items = session.get('cart_items', [])
+                cart_items = get_guest_cart()
                 cart_count = sum(
                     item.get('quantity', 0) for item in cart_items
                 )
@@ -178,28 +253,8 @@ def create_app(config_name: str = "default") -> Flask:
 
 
 @login_manager.user_loader  # type: ignore[misc]
-def load_user(user_id: str) -> Optional[Union["User", "Seller"]]:
-    """Load user by ID."""
-    from shophive_packages.models.user import User, Seller
+def load_user(user_id: str) -> Optional["CachedIdentity"]:
+    """Load the identity behind a session token, cached per process."""
+    from shophive_packages.services.identity_service import load_identity
 
-    try:
-        if '_' not in user_id:
-            return None
-
-        user_type, id_str = user_id.split('_')
-        user_id_int = int(id_str)
-
-        # Query base User table first to determine type
-        base_user = User.query.get(user_id_int)
-        if not base_user:
-            return None
-
-        # Return appropriate type based on user_type
-        if user_type == 'seller' and isinstance(base_user, Seller):
-            return base_user
-        elif user_type == 'user' and type(base_user) is User:
-            return base_user
-        return None
-
-    except (ValueError, AttributeError):
-        return None
+    return load_identity(user_id)
@@ -0,0 +1,52 @@
+"""
+The ORM session class used by ``db``, which can send reads to replicas.
+
+It lives outside ``services`` because ``db`` is created with it, before
+anything else in the package can be imported.  The routing decisions
+are made by ``services.replica_router``; without replicas configured
+this is Flask-SQLAlchemy's own session.
+"""
+from typing import Any
+
+import sqlalchemy as sa
+from flask import current_app, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+ROUTER_KEY = "replica_router"
+
+# request.environ key set once the request has written to the primary
+WROTE_KEY = "shophive.db_wrote"
+
+
+class RoutingSession(Session):
+    def get_bind(
+        self,
+        mapper: Any = None,
+        clause: Any = None,
+        bind: Any = None,
+        **kwargs: Any,
+    ) -> Any:
+        engine = super().get_bind(
+            mapper=mapper, clause=clause, bind=bind, **kwargs
+        )
+        if bind is not None or self._flushing or not has_app_context():
+            return engine
+        router = current_app.extensions.get(ROUTER_KEY)
+        if router is None or engine is not router.primary:
+            return engine
+        if isinstance(clause, (sa.Insert, sa.Update, sa.Delete)):
+            _note_write()
+            return engine
+        if isinstance(clause, sa.Select) \
+                and clause._for_update_arg is not None:
+            return engine
+        return router.engine_for_request() or engine
+
+
+def _note_write(*args: Any) -> None:
+    if has_request_context():
+        request.environ[WROTE_KEY] = True
+
+
+event.listen(RoutingSession, "after_flush", _note_write)
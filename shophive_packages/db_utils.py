@@ -1,4 +1,5 @@
 
+from datetime import datetime, timezone
 from typing import TypeVar, Optional, Type
 from shophive_packages import db
 
@@ -8,3 +9,8 @@ T = TypeVar('T')
 def get_by_id(model: Type[T], id: int) -> Optional[T]:
     """Get model instance by ID using modern SQLAlchemy method."""
     return db.session.get(model, id)
+
+
+def utcnow() -> datetime:
+    """Naive UTC timestamp, matching what the database stores."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
@@ -1,9 +1,18 @@
 from .user import User, Seller
 from .product import Product
 from .cart import Cart
-from .orders import Order, OrderItem
+from .orders import Order, OrderItem, OrderHistory
 from .tags import Tag
 from .categories import Category
+from .inventory import StockReservation
+from .idempotency import IdempotencyKey
+from .jobs import BackgroundJob
+from .rollups import SellerSalesDaily, SellerSalesHourly
+from .archive import ArchivedOrder, ArchivedOrderItem, ArchivedOrderHistory
+from .outbox import OutboxEvent
+from .tokens import RevokedToken
+from .sessions import ServerSession
+from .replicas import ReplicaHeartbeat
 
 __all__ = [
     "User",
@@ -12,6 +21,19 @@ __all__ = [
     "Seller",
     "Order",
     "OrderItem",
+    "OrderHistory",
     "Tag",
-    "Category"
+    "Category",
+    "StockReservation",
+    "IdempotencyKey",
+    "BackgroundJob",
+    "SellerSalesDaily",
+    "SellerSalesHourly",
+    "ArchivedOrder",
+    "ArchivedOrderItem",
+    "ArchivedOrderHistory",
+    "OutboxEvent",
+    "RevokedToken",
+    "ServerSession",
+    "ReplicaHeartbeat",
 ]
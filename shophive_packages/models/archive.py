@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+"""
+This module contains the cold tier for finished orders.
+
+Delivered and cancelled orders past the archive age are moved here with
+their lines and history, keeping their original ids so links, cursors and
+idempotent replays stay valid.  The tables carry no foreign keys back to
+the hot tables.
+"""
+from shophive_packages import db
+from shophive_packages.models.orders import ORDER_STATUSES
+
+
+class ArchivedOrder(db.Model):  # type: ignore[name-defined]
+    """A finished order moved out of ``order``."""
+
+    __tablename__ = "archived_orders"
+    __table_args__ = (
+        db.Index("ix_archived_orders_buyer_id_id", "buyer_id", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    total_amount = db.Column(db.Numeric(10, 2), nullable=False, default=0.0)
+    status = db.Column(db.Enum(*ORDER_STATUSES, name="order_status"))
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    payment_reference = db.Column(db.String(100))
+    buyer_id = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, default=db.func.now())
+
+    def __repr__(self) -> str:
+        return f"<ArchivedOrder {self.id} {self.status}>"
+
+
+class ArchivedOrderItem(db.Model):  # type: ignore[name-defined]
+    """A line of an archived order."""
+
+    __tablename__ = "archived_order_items"
+    __table_args__ = (
+        db.Index("ix_archived_order_items_seller_id_id", "seller_id", "id"),
+        db.Index("ix_archived_order_items_order_id", "order_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Numeric(10, 2), nullable=False)
+    address = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.Enum(*ORDER_STATUSES, name="order_status"))
+    order_id = db.Column(db.Integer, nullable=False)
+    product_id = db.Column(db.Integer, nullable=False)
+    seller_id = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<ArchivedOrderItem ({self.id} {self.price} {self.quantity})>"
+
+
+class ArchivedOrderHistory(db.Model):  # type: ignore[name-defined]
+    """Status changes of an archived order."""
+
+    __tablename__ = "archived_order_history"
+    __table_args__ = (
+        db.Index("ix_archived_order_history_order_id_id", "order_id", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(db.Integer, nullable=False)
+    from_status = db.Column(db.Enum(*ORDER_STATUSES, name="order_status"))
+    status = db.Column(
+        db.Enum(*ORDER_STATUSES, name="order_status"), nullable=False
+    )
+    note = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "from_status": self.from_status,
+            "status": self.status,
+            "note": self.note,
+            "created_at": (
+                self.created_at.isoformat() if self.created_at else None
+            ),
+        }
+
+    def __repr__(self) -> str:
+        return f"<ArchivedOrderHistory {self.order_id} {self.status}>"
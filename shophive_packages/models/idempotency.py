@@ -0,0 +1,40 @@
+#!/usr/bin/python3
+"""
+This module contains the model storing idempotency keys and the response
+cached for each of them
+"""
+from shophive_packages import db
+
+
+class IdempotencyKey(db.Model):  # type: ignore[name-defined]
+    """
+    A client supplied ``Idempotency-Key`` and the outcome of its request.
+
+    The unique ``(scope, key)`` index is what makes the first request win;
+    duplicates find the row and either wait for it to complete or replay
+    the cached response.
+    """
+
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        db.UniqueConstraint("scope", "key", name="uq_idempotency_scope_key"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(50), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status = db.Column(
+        db.Enum("in_progress", "completed", name="idempotency_status"),
+        nullable=False,
+        default="in_progress",
+    )
+    response_status = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    response_mimetype = db.Column(db.String(100))
+    response_location = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return f"<IdempotencyKey {self.scope}:{self.key} {self.status}>"
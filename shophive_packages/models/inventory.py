@@ -0,0 +1,35 @@
+#!/usr/bin/python3
+"""
+This module contains the stock reservation model used to hold inventory
+while a buyer is on the checkout page
+"""
+from shophive_packages import db
+
+
+class StockReservation(db.Model):  # type: ignore[name-defined]
+    """
+    A time-limited hold on product stock.
+
+    The held quantity has already been subtracted from ``Product.quantity``;
+    it is either claimed by an order at checkout or handed back to the
+    product once ``expires_at`` has passed.
+    """
+
+    __tablename__ = "stock_reservations"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("user.id"), nullable=False, index=True
+    )
+    product_id = db.Column(
+        db.Integer, db.ForeignKey("product.id"), nullable=False
+    )
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    def __repr__(self) -> str:
+        return (
+            f"<StockReservation {self.id} product={self.product_id} "
+            f"qty={self.quantity}>"
+        )
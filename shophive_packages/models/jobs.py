@@ -0,0 +1,39 @@
+#!/usr/bin/python3
+"""
+This module contains the durable queue table used by the background
+task worker
+"""
+from shophive_packages import db
+
+
+class BackgroundJob(db.Model):  # type: ignore[name-defined]
+    """
+    A unit of deferred work.
+
+    Jobs are inserted in the same transaction as the change that caused
+    them, so a job exists if and only if that change was committed.
+    """
+
+    __tablename__ = "background_jobs"
+    __table_args__ = (
+        db.Index("ix_background_jobs_status_run_at", "status", "run_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(
+        db.Enum("queued", "running", "done", "failed", name="job_status"),
+        nullable=False,
+        default="queued",
+    )
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    def __repr__(self) -> str:
+        return f"<BackgroundJob {self.id} {self.name} {self.status}>"
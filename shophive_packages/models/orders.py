@@ -1,27 +1,51 @@
-from shophive_packages import db
+from sqlalchemy import event
 
-# Add documentation
+from shophive_packages import db
+from shophive_packages.db_utils import utcnow
+
+ORDER_STATUSES = (
+    "Pending",
+    "Processing",
+    "Shipped",
+    "Delivered",
+    "Cancelled",
+)
+
+# Statuses an order may move to from each status
+ORDER_TRANSITIONS: dict[str, frozenset[str]] = {
+    "Pending": frozenset({"Processing", "Cancelled"}),
+    "Processing": frozenset({"Shipped", "Cancelled"}),
+    "Shipped": frozenset({"Delivered"}),
+    "Delivered": frozenset(),
+    "Cancelled": frozenset(),
+}
 
 
 class Order(db.Model):  # type: ignore[name-defined]
+    """
+    A buyer's order.
+
+    ``status`` is a denormalized copy of the latest ``OrderHistory`` event
+    so reading the current status is a primary key lookup.
+    """
+    __table_args__ = (
+        # Finds finished orders old enough to archive
+        db.Index("ix_order_status_updated_at", "status", "updated_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     total_amount = db.Column(db.Numeric(10, 2), nullable=False, default=0.0)
     status = db.Column(
-        db.Enum(
-            "Pending",
-            "Processing",
-            "Shipped",
-            "Delivered",
-            "Cancelled",
-            name="order_status",
-        ),
+        db.Enum(*ORDER_STATUSES, name="order_status"),
         default="Pending",
     )
-    created_at = db.Column(db.DateTime, default=db.func.now())
+    # Set in Python so rollups can bucket a new order without reloading it
+    created_at = db.Column(db.DateTime, default=utcnow)
     updated_at = db.Column(
         db.DateTime, default=db.func.now(), onupdate=db.func.now()
     )
+    # Processor authorization taken at checkout, captured by a worker
+    payment_reference = db.Column(db.String(100))
 
     # Foreign keys
     buyer_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
@@ -29,13 +53,23 @@ class Order(db.Model):  # type: ignore[name-defined]
     # Relationships
     buyer = db.relationship("User", back_populates="orders")
     items = db.relationship("OrderItem", back_populates="order", lazy="select")
-    # history = db.relationship(
-    # "OrderHistory", back_populates="order", cascade="all, delete-orphan")
+    history = db.relationship(
+        "OrderHistory",
+        back_populates="order",
+        order_by="OrderHistory.id",
+        lazy="dynamic",
+    )
 
-    def add_item(self, item: "OrderItem", address) -> None:
+    def add_item(self, item: "OrderItem", address) -> "OrderItem":
+        """
+        Add a cart line to the order.
+
+        Only flushes, so every line of an order is committed (or rolled
+        back) together by the caller.
+        """
         if not self.id:
             db.session.add(self)
-            db.session.commit()
+            db.session.flush()
         order_item = OrderItem(
                 product_id=item.product_id,
                 quantity=item.quantity,
@@ -44,11 +78,11 @@ class Order(db.Model):  # type: ignore[name-defined]
                 order_id=self.id,
                 seller_id=item.product.seller_id
             )
-        if not self.total_amount:
-            self.total_amount = item.product.price * item.quantity
-        self.total_amount += item.product.price * item.quantity
+        self.total_amount = (
+            (self.total_amount or 0) + item.product.price * item.quantity
+        )
         db.session.add(order_item)
-        db.session.commit()
+        return order_item
 
     def __repr__(self) -> str:
         return f"<Order {self.id} {self.status}>"
@@ -56,20 +90,16 @@ class Order(db.Model):  # type: ignore[name-defined]
 
 class OrderItem(db.Model):  # type: ignore[name-defined]
     __tablename__ = "order_items"
+    __table_args__ = (
+        db.Index("ix_order_items_seller_id_id", "seller_id", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Numeric(10, 2), nullable=False)
     address = db.Column(db.String(255), nullable=False)
     status = db.Column(
-        db.Enum(
-            "Pending",
-            "Processing",
-            "Shipped",
-            "Delivered",
-            "Cancelled",
-            name="order_status",
-        ),
+        db.Enum(*ORDER_STATUSES, name="order_status"),
         default="Pending",
     )
 
@@ -91,30 +121,56 @@ class OrderItem(db.Model):  # type: ignore[name-defined]
         return f"<Order_item ({self.id} {self.price} {self.quantity})>"
 
 
-"""
-class OrderHistory(db.Model):
-    # Tracks changes in order status:
+class OrderHistory(db.Model):  # type: ignore[name-defined]
+    """
+    Append-only log of order status changes.
+
+    Rows are only ever inserted; ``(order_id, id)`` and
+    ``(order_id, created_at)`` indexes back the history range queries.
+    """
     __tablename__ = "order_history"
+    __table_args__ = (
+        db.Index("ix_order_history_order_id_id", "order_id", "id"),
+        db.Index(
+            "ix_order_history_order_id_created_at", "order_id", "created_at"
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(
-        db.Integer, db.ForeignKey("orders.id"), nullable=False
+        db.Integer, db.ForeignKey("order.id"), nullable=False
     )
+    from_status = db.Column(db.Enum(*ORDER_STATUSES, name="order_status"))
     status = db.Column(
-        db.Enum(
-            "Pending",
-            "Processing",
-            "Shipped",
-            "Delivered",
-            "Cancelled",
-            name="order_status"
-        )
+        db.Enum(*ORDER_STATUSES, name="order_status"), nullable=False
     )
-    timestamp = db.Column(db.DateTime, default=db.func.now())
+    note = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=db.func.now())
 
     order = db.relationship("Order", back_populates="history")
 
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "from_status": self.from_status,
+            "status": self.status,
+            "note": self.note,
+            "created_at": (
+                self.created_at.isoformat() if self.created_at else None
+            ),
+        }
 
+    def __repr__(self) -> str:
+        return f"<OrderHistory {self.order_id} {self.status}>"
+
+
+@event.listens_for(OrderHistory, "before_update")
+@event.listens_for(OrderHistory, "before_delete")
+def _history_is_append_only(*_: object) -> None:
+    raise ValueError("Order history is append-only")
+
+
+"""
 class RefundRequest(db.Model):
     # Handles refund or return requests:
     __tablename__ = "refund_requests"
@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+"""
+This module contains the transactional outbox of domain events read by
+the outbox dispatcher
+"""
+from shophive_packages import db
+from shophive_packages.db_utils import utcnow
+
+
+class OutboxEvent(db.Model):  # type: ignore[name-defined]
+    """
+    A domain event waiting to be delivered.
+
+    Events are inserted in the same transaction as the change they
+    describe, so an event exists if and only if that change was committed.
+    ``dispatched_at`` is set once every sink has accepted the event.
+    """
+
+    __tablename__ = "outbox_events"
+    __table_args__ = (
+        db.Index(
+            "ix_outbox_events_dispatched_at_id", "dispatched_at", "id"
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(100), nullable=False)
+    aggregate_type = db.Column(db.String(50), nullable=False)
+    aggregate_id = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    dispatched_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "topic": self.topic,
+            "aggregate_type": self.aggregate_type,
+            "aggregate_id": self.aggregate_id,
+            "payload": self.payload,
+            "created_at": self.created_at.isoformat(),
+        }
+
+    def __repr__(self) -> str:
+        return f"<OutboxEvent {self.id} {self.topic}>"
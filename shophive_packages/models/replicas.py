@@ -0,0 +1,23 @@
+#!/usr/bin/python3
+"""
+This module contains the heartbeat row used to measure replica lag
+"""
+from shophive_packages import db
+
+
+class ReplicaHeartbeat(db.Model):  # type: ignore[name-defined]
+    """
+    A timestamp written to the primary every few seconds.
+
+    Replication copies it like any other row, so comparing the value on a
+    replica with the one on the primary shows how far behind the replica
+    is, on any database and behind any proxy.
+    """
+
+    __tablename__ = "replica_heartbeat"
+
+    id = db.Column(db.Integer, primary_key=True)
+    beat_at = db.Column(db.Float, nullable=False)  # seconds since epoch
+
+    def __repr__(self) -> str:
+        return f"<ReplicaHeartbeat {self.beat_at}>"
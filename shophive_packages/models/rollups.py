@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+"""
+This module contains the pre-aggregated seller sales rollups read by the
+seller dashboard
+"""
+from shophive_packages import db
+
+
+class SellerSalesDaily(db.Model):  # type: ignore[name-defined]
+    """Revenue and units sold per seller, product and UTC day."""
+
+    __tablename__ = "seller_sales_daily"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "seller_id", "bucket", "product_id",
+            name="uq_seller_sales_daily_bucket",
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    seller_id = db.Column(db.Integer, nullable=False)
+    product_id = db.Column(db.Integer, nullable=False)
+    bucket = db.Column(db.Date, nullable=False)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    order_lines = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f"<SellerSalesDaily {self.seller_id} {self.bucket}>"
+
+
+class SellerSalesHourly(db.Model):  # type: ignore[name-defined]
+    """Revenue and units sold per seller, product and UTC hour."""
+
+    __tablename__ = "seller_sales_hourly"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "seller_id", "bucket", "product_id",
+            name="uq_seller_sales_hourly_bucket",
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    seller_id = db.Column(db.Integer, nullable=False)
+    product_id = db.Column(db.Integer, nullable=False)
+    bucket = db.Column(db.DateTime, nullable=False)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    order_lines = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f"<SellerSalesHourly {self.seller_id} {self.bucket}>"
@@ -0,0 +1,24 @@
+#!/usr/bin/python3
+"""
+This module contains the table behind the SQL session backend
+"""
+from shophive_packages import db
+
+
+class ServerSession(db.Model):  # type: ignore[name-defined]
+    """
+    One server-side session, serialized.
+
+    Reads filter on ``expires_at`` so an expired row is never served even
+    before ``flask sessions purge`` deletes it; the index keeps the purge
+    a range scan.
+    """
+
+    __tablename__ = "sessions"
+
+    sid = db.Column(db.String(80), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return f"<ServerSession {self.sid}>"
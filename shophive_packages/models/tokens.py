@@ -0,0 +1,23 @@
+#!/usr/bin/python3
+"""
+This module contains the denylist of revoked API tokens
+"""
+from shophive_packages import db
+
+
+class RevokedToken(db.Model):  # type: ignore[name-defined]
+    """
+    The ``jti`` of a JWT revoked before it expired.
+
+    A row is only needed until the token would have expired anyway, so the
+    table stays small: ``flask tokens purge`` drops rows past
+    ``expires_at``.
+    """
+
+    __tablename__ = "revoked_tokens"
+
+    jti = db.Column(db.String(36), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return f"<RevokedToken {self.jti}>"
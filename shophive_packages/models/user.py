@@ -1,11 +1,11 @@
 from flask_login import UserMixin  # type: ignore
-from flask_bcrypt import (  # type: ignore
-    generate_password_hash, check_password_hash)
+from shophive_packages.services.password_service import (
+    hash_password, verify_password)
 from shophive_packages import db
 from shophive_packages.models.product import Product
 from typing import List, TYPE_CHECKING, Optional
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, DateTime
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
+from sqlalchemy import String, DateTime, func
 from datetime import datetime
 from shophive_packages.models.types import BaseQuery
 
@@ -16,6 +16,16 @@ else:
     from shophive_packages.models.cart import Cart
 
 
+def normalize_username(username: str) -> str:
+    """Usernames keep their case but not surrounding whitespace."""
+    return username.strip()
+
+
+def normalize_email(email: str) -> str:
+    """Emails are stored trimmed and lower-cased."""
+    return email.strip().lower()
+
+
 class BaseUser(db.Model):  # type: ignore[name-defined]
     """Base user class with common functionality."""
     __abstract__ = True
@@ -26,12 +36,10 @@ class BaseUser(db.Model):  # type: ignore[name-defined]
     id: Mapped[int] = mapped_column(primary_key=True)
     username: Mapped[str] = mapped_column(
         String(80),
-        unique=True,
         nullable=False
     )
     email: Mapped[str] = mapped_column(
         String(120),
-        unique=True,
         nullable=False
     )
     password: Mapped[str] = mapped_column(
@@ -42,13 +50,13 @@ class BaseUser(db.Model):  # type: ignore[name-defined]
     def set_password(self, password: str) -> None:
         """Hash and set the user's password"""
         if password:
-            self.password = generate_password_hash(password).decode('utf-8')
+            self.password = hash_password(password)
 
     def check_password(self, password: str) -> bool:
         """Check if provided password matches hash"""
         if not self.password:
             return False
-        return bool(check_password_hash(self.password, password))
+        return verify_password(password, self.password)
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} {self.username}>"
@@ -63,12 +71,10 @@ class User(BaseUser, UserMixin):  # Changed to inherit from BaseUser
     id: Mapped[int] = mapped_column(primary_key=True)
     username: Mapped[str] = mapped_column(
         String(80),
-        unique=True,
         nullable=False
     )
     email: Mapped[str] = mapped_column(
         String(120),
-        unique=True,
         nullable=False
     )
     password: Mapped[str] = mapped_column(
@@ -112,6 +118,14 @@ class User(BaseUser, UserMixin):  # Changed to inherit from BaseUser
         lazy=True
     )
 
+    @validates("username")
+    def _normalize_username(self, key: str, value: str) -> str:
+        return normalize_username(value) if value else value
+
+    @validates("email")
+    def _normalize_email(self, key: str, value: str) -> str:
+        return normalize_email(value) if value else value
+
     # Remove the direct query assignment
     # Instead, let SQLAlchemy handle it through the metaclass
     query_class = BaseQuery
@@ -172,7 +186,7 @@ class User(BaseUser, UserMixin):  # Changed to inherit from BaseUser
         """Check if provided password matches stored hash."""
         if not self.password:
             return False
-        return bool(check_password_hash(self.password, password))
+        return verify_password(password, self.password)
 
     def get_id(self) -> str:
         """Return user ID with type prefix."""
@@ -181,6 +195,12 @@ class User(BaseUser, UserMixin):  # Changed to inherit from BaseUser
         return f"user_{self.id}"
 
 
+# Uniqueness is case-insensitive, and ``find_user`` looks accounts up by
+# the same expressions so both lookups are index seeks.
+db.Index("uq_user_username_lower", func.lower(User.username), unique=True)
+db.Index("uq_user_email_lower", func.lower(User.email), unique=True)
+
+
 class Seller(User):
     """Seller model extending the User model."""
     __tablename__ = 'seller'
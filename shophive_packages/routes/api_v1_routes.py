@@ -0,0 +1,296 @@
+#!/usr/bin/python3
+"""
+This module contains the token-authenticated JSON API under ``/api/v1``.
+
+Requests here carry ``Authorization: Bearer <access token>`` instead of a
+session cookie and never touch the session store (see
+``session_config.StatelessPathSessionInterface``).  The caller is
+``get_current_user()``, a cached identity, so authenticating costs no
+query once the identity is warm.
+"""
+from functools import wraps
+from typing import Any, Callable, Optional, TypeVar, cast
+
+from flask import Blueprint, Response, jsonify, request
+from flask_jwt_extended import (
+    get_current_user, get_jwt, jwt_required
+)
+from sqlalchemy import delete, select
+from sqlalchemy.orm import selectinload
+
+from shophive_packages import db
+from shophive_packages.models.cart import Cart
+from shophive_packages.models.orders import Order
+from shophive_packages.models.product import Product
+from shophive_packages.services.auth_service import authenticate
+from shophive_packages.services.idempotency_service import idempotent
+from shophive_packages.services.order_ingest_service import ingest_orders
+from shophive_packages.services.rate_limit import (
+    by_ip, by_user, by_username, rate_limited
+)
+from shophive_packages.services.sqlite_profile import read_mostly
+from shophive_packages.services.token_service import (
+    issue_tokens, revoke_encoded, revoke_token
+)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+api_v1_bp = Blueprint("api_v1", __name__, url_prefix="/api/v1")
+
+MAX_LIMIT = 100
+
+
+def buyer_required(view: F) -> F:
+    """Require a valid access token belonging to a buyer."""
+
+    @wraps(view)
+    @jwt_required()  # type: ignore[misc]
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if get_current_user().is_seller:
+            return jsonify({"message": "Only buyers can do this"}), 403
+        return view(*args, **kwargs)
+
+    return cast(F, wrapper)
+
+
+def _limit() -> Optional[int]:
+    limit = request.args.get("limit", type=int, default=50)
+    if limit <= 0 or limit > MAX_LIMIT:
+        return None
+    return limit
+
+
+def _product_dict(product: Product) -> dict:
+    return {
+        "id": product.id,
+        "name": product.name,
+        "description": product.description,
+        "price": str(product.price),
+        "image_url": product.image_url,
+        "quantity": product.quantity,
+        "tags": [{"id": t.id, "name": t.name} for t in product.tags],
+        "categories": [
+            {"id": c.id, "name": c.name} for c in product.categories
+        ],
+    }
+
+
+def _order_dict(order: Order) -> dict:
+    return {
+        "order_id": order.id,
+        "status": order.status,
+        "total_amount": str(order.total_amount),
+        "created_at": (
+            order.created_at.isoformat() if order.created_at else None
+        ),
+        "items": [
+            {
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "price": str(item.price),
+            }
+            for item in order.items
+        ],
+    }
+
+
+def _cart_body(user_id: int) -> dict:
+    lines = db.session.execute(
+        select(Cart.product_id, Cart.quantity, Product.name, Product.price)
+        .join(Product, Product.id == Cart.product_id)
+        .where(Cart.user_id == user_id)
+        .order_by(Cart.id)
+    ).all()
+    return {
+        "items": [
+            {
+                "product_id": line.product_id,
+                "name": line.name,
+                "price": str(line.price),
+                "quantity": line.quantity,
+            }
+            for line in lines
+        ],
+        "total": str(sum(line.price * line.quantity for line in lines)),
+    }
+
+
+# Tokens
+
+@api_v1_bp.route("/auth/token", methods=["POST"])
+@read_mostly
+@rate_limited("login", by_ip, by_username)
+def create_token() -> tuple[Response, int]:
+    """Exchange a username (or email) and password for tokens."""
+    data = request.get_json(silent=True) or {}
+    username, password = data.get("username"), data.get("password")
+    if not isinstance(username, str) or not isinstance(password, str):
+        return jsonify({"message": "username and password are required"}), 400
+    user = authenticate(username, password)
+    if user is None:
+        return jsonify({"message": "Invalid credentials"}), 401
+    return jsonify(issue_tokens(user)), 200
+
+
+@api_v1_bp.route("/auth/refresh", methods=["POST"])
+@jwt_required(refresh=True)  # type: ignore[misc]
+def refresh_token() -> tuple[Response, int]:
+    """Trade a refresh token for a new token pair, revoking the old one."""
+    revoke_token(get_jwt())
+    return jsonify(issue_tokens(get_current_user())), 200
+
+
+@api_v1_bp.route("/auth/revoke", methods=["POST"])
+@jwt_required(verify_type=False)  # type: ignore[misc]
+def revoke() -> tuple[Response, int]:
+    """
+    Revoke the presented token, and the ``refresh_token`` in the body if
+    given, e.g. on logout.
+    """
+    revoke_token(get_jwt())
+    refresh = (request.get_json(silent=True) or {}).get("refresh_token")
+    if isinstance(refresh, str) and not revoke_encoded(refresh):
+        return jsonify({"message": "refresh_token is not valid"}), 400
+    return jsonify({"message": "Token revoked"}), 200
+
+
+# Products
+
+@api_v1_bp.route("/products", methods=["GET"])
+def list_products() -> tuple[Response, int]:
+    """Newest products first; ``before_id`` continues a listing."""
+    limit = _limit()
+    if limit is None:
+        return jsonify(
+            {"message": f"limit must be between 1 and {MAX_LIMIT}"}
+        ), 400
+    query = (
+        select(Product)
+        .options(selectinload(Product.tags), selectinload(Product.categories))
+        .order_by(Product.id.desc())
+        .limit(limit)
+    )
+    before_id = request.args.get("before_id", type=int)
+    if before_id is not None:
+        query = query.where(Product.id < before_id)
+    products = db.session.scalars(query).all()
+    return jsonify({
+        "products": [_product_dict(p) for p in products],
+        "next_before_id": products[-1].id if len(products) == limit else None,
+    }), 200
+
+
+@api_v1_bp.route("/products/<int:product_id>", methods=["GET"])
+def get_product(product_id: int) -> tuple[Response, int]:
+    product = db.session.get(
+        Product, product_id,
+        options=[selectinload(Product.tags), selectinload(Product.categories)],
+    )
+    if product is None:
+        return jsonify({"message": "Product not found"}), 404
+    return jsonify({"product": _product_dict(product)}), 200
+
+
+# Cart
+
+@api_v1_bp.route("/cart", methods=["GET"])
+@buyer_required
+def get_cart() -> tuple[Response, int]:
+    return jsonify(_cart_body(get_current_user().id)), 200
+
+
+@api_v1_bp.route("/cart/items", methods=["PUT"])
+@buyer_required
+def put_cart_item() -> tuple[Response, int]:
+    """Set a product's quantity in the cart; 0 removes it."""
+    data = request.get_json(silent=True) or {}
+    product_id, quantity = data.get("product_id"), data.get("quantity")
+    if not isinstance(product_id, int) or not isinstance(quantity, int) \
+            or quantity < 0:
+        return jsonify({
+            "message": "product_id and a non-negative quantity are required"
+        }), 400
+    user_id = get_current_user().id
+    line = db.session.scalar(
+        select(Cart).where(Cart.user_id == user_id,
+                           Cart.product_id == product_id)
+    )
+    if quantity == 0:
+        if line is not None:
+            db.session.delete(line)
+    elif line is not None:
+        line.quantity = quantity
+    elif db.session.get(Product, product_id) is None:
+        return jsonify({"message": "Product not found"}), 404
+    else:
+        db.session.add(Cart(user_id, product_id, quantity))
+    db.session.commit()
+    return jsonify(_cart_body(user_id)), 200
+
+
+@api_v1_bp.route("/cart/items/<int:product_id>", methods=["DELETE"])
+@buyer_required
+def delete_cart_item(product_id: int) -> tuple[Response, int]:
+    user_id = get_current_user().id
+    db.session.execute(
+        delete(Cart).where(
+            Cart.user_id == user_id, Cart.product_id == product_id
+        )
+    )
+    db.session.commit()
+    return jsonify(_cart_body(user_id)), 200
+
+
+# Orders
+
+@api_v1_bp.route("/orders", methods=["GET"])
+@buyer_required
+def list_orders() -> tuple[Response, int]:
+    """The caller's orders, newest first; ``before_id`` continues."""
+    limit = _limit()
+    if limit is None:
+        return jsonify(
+            {"message": f"limit must be between 1 and {MAX_LIMIT}"}
+        ), 400
+    query = (
+        select(Order)
+        .options(selectinload(Order.items))
+        .where(Order.buyer_id == get_current_user().id)
+        .order_by(Order.id.desc())
+        .limit(limit)
+    )
+    before_id = request.args.get("before_id", type=int)
+    if before_id is not None:
+        query = query.where(Order.id < before_id)
+    orders = db.session.scalars(query).all()
+    return jsonify({
+        "orders": [_order_dict(o) for o in orders],
+        "next_before_id": orders[-1].id if len(orders) == limit else None,
+    }), 200
+
+
+@api_v1_bp.route("/orders", methods=["POST"])
+@buyer_required
+@rate_limited("checkout", by_user)
+@idempotent("api.orders")
+def create_order() -> tuple[Response, int]:
+    """Place an order for the caller: ``{"items": [...], "address": ...}``."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"message": "Order must be an object"}), 400
+    result = ingest_orders([{**data, "user_id": get_current_user().id}])[0]
+    if result["status"] != "created":
+        status_code = 409 if result["error"] == "insufficient_stock" else 400
+        return jsonify(result), status_code
+    return jsonify(result), 201
+
+
+@api_v1_bp.route("/orders/<int:order_id>", methods=["GET"])
+@buyer_required
+def get_order(order_id: int) -> tuple[Response, int]:
+    order = db.session.get(
+        Order, order_id, options=[selectinload(Order.items)]
+    )
+    if order is None or order.buyer_id != get_current_user().id:
+        return jsonify({"message": "Order not found"}), 404
+    return jsonify({"order": _order_dict(order)}), 200
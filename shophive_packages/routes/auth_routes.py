@@ -1,16 +1,23 @@
 from flask import Blueprint, jsonify, request
-from shophive_packages.services.auth_service import register_user
+from shophive_packages.services.auth_service import (
+    authenticate, register_user
+)
 from flask_login import (  # type: ignore
     login_user as flask_login_user,
     logout_user,
     login_required
 )
-from shophive_packages.models.user import User
+from shophive_packages.services.password_service import HasherBusy
+from shophive_packages.services.rate_limit import (
+    by_ip, by_username, rate_limited
+)
+from shophive_packages.services.sqlite_profile import read_mostly
 
 auth_bp = Blueprint("auth_bp", __name__)
 
 
 @auth_bp.route("/register", methods=["POST"])
+@rate_limited("register", by_ip)
 def register() -> tuple:
     """Handle user registration"""
     data = request.get_json()
@@ -24,24 +31,31 @@ def register() -> tuple:
         return jsonify({"message": "User registered successfully!"}), 201
     except ValueError as error:
         return jsonify({"error": str(error)}), 400
+    except HasherBusy:
+        raise
     except Exception:
         return jsonify({"error": "Registration failed"}), 500
 
 
 @auth_bp.route("/login", methods=["POST"])
+@read_mostly
+@rate_limited("login", by_ip, by_username)
 def login() -> tuple:
     """Handle user login"""
     try:
         data = request.json
         if not data:
             return jsonify({"error": "No data provided"}), 400
-        user = User.query.filter_by(username=data.get("username")).first()
+        user = authenticate(
+            data.get("username") or "", data.get("password") or ""
+        )
 
-        if (user and "password" in data
-                and user.check_password(data["password"])):
+        if user:
             flask_login_user(user)
             return jsonify({"message": "Logged in successfully!"}), 200
         return jsonify({"message": "Invalid credentials!"}), 401
+    except HasherBusy:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
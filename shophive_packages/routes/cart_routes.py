@@ -4,7 +4,6 @@ from flask import (
     render_template,
     redirect,
     url_for,
-    session,
     Response,  # This is Flask's Response
     make_response,
     current_app,
@@ -20,6 +19,9 @@ from shophive_packages.models.product import Product
 from shophive_packages.db_utils import get_by_id
 from flask_wtf import FlaskForm  # type: ignore # noqa
 from shophive_packages.forms.forms import CartForm
+from shophive_packages.services.guest_cart import (
+    get_guest_cart, in_cookie, price_guest_cart, save_guest_cart
+)
 
 F = TypeVar('F', bound=Callable)
 
@@ -35,7 +37,7 @@ def get_cart_count() -> int:
     """Get the number of items in cart."""
     if current_user.is_authenticated and hasattr(current_user, 'get_cart'):
         return sum(item.quantity for item in current_user.get_cart())
-    cart_items = session.get('cart_items', [])
+    cart_items = get_guest_cart()
     return sum(item['quantity'] for item in cart_items)
 
 
@@ -46,15 +48,9 @@ def inject_cart_count() -> None:
     if not current_user.is_authenticated or hasattr(current_user, 'get_cart'):
         current_app.jinja_env.globals['cart_count'] = get_cart_count()
         if current_user.is_authenticated and hasattr(current_user, 'get_cart'):
-            cart_items = current_user.get_cart()
             total = current_user.get_cart_total()
         else:
-            cart_items = session.get('cart_items', [])
-            total = sum(
-                Product.query.get(item['product_id']).price * item['quantity']
-                for item in cart_items
-                if Product.query.get(item['product_id'])
-            )
+            _, total = price_guest_cart(get_guest_cart())
         current_app.jinja_env.globals['cart_total'] = total
     else:
         # Set empty cart data for sellers
@@ -62,19 +58,28 @@ def inject_cart_count() -> None:
         current_app.jinja_env.globals['cart_total'] = 0
 
 
+def _notify(message: str, category: str) -> None:
+    """
+    Flash ``message``, except to guests whose cart lives in the cookie: the
+    flash would give them a stored session just to carry it.
+    """
+    if current_user.is_authenticated or not in_cookie():
+        flash(message, category)
+
+
 def _get_or_create_cart() -> list:
-    """Get cart from session for guest users or database for
+    """Get the guest cart for guest users or database for
     authenticated users"""
     if current_user.is_authenticated:
         return list(current_user.get_cart())
-    return session.get('cart_items', [])
+    return get_guest_cart()
 
 
 def _save_cart(cart_items: list) -> None:
-    """Save cart to session for guest users or database for
+    """Save the guest cart for guest users or database for
     authenticated users"""
     if not current_user.is_authenticated:
-        session['cart_items'] = cart_items
+        save_guest_cart(cart_items)
 
 
 def _handle_remove_item(product_id: int, user_id: int) -> None:
@@ -107,7 +112,7 @@ def _update_item_quantity(
 
 def _update_guest_cart(form_data: dict) -> list:
     """Update guest user's cart from form data."""
-    cart_items = session.get('cart_items', [])
+    cart_items = get_guest_cart()
     updated_cart = []
 
     if "remove" in form_data:
@@ -145,14 +150,7 @@ def cart() -> Response:
         products = [(item.product, item.quantity) for item in cart_items]
         total = current_user.get_cart_total()
     else:
-        cart_items = session.get('cart_items', [])
-        products = []
-        total = 0
-        for item in cart_items:
-            product = Product.query.get(item['product_id'])
-            if product:
-                products.append((product, item['quantity']))
-                total += product.price * item['quantity']
+        products, total = price_guest_cart(get_guest_cart())
 
     form = CartForm()
     return make_response(
@@ -188,9 +186,7 @@ def update_cart() -> Response:
                     )
         else:
             # Handle guest cart updates
-            updated_cart = _update_guest_cart(request.form)
-            session['cart_items'] = updated_cart
-            session.modified = True
+            save_guest_cart(_update_guest_cart(request.form))
 
     except (ValueError, Exception):
         db.session.rollback()
@@ -227,7 +223,7 @@ def add_to_cart() -> Response:
         if current_user.is_authenticated:
             current_user.add_to_cart(product, quantity)
         else:
-            cart_items = session.get('cart_items', [])
+            cart_items = get_guest_cart()
             item_exists = False
             for item in cart_items:
                 if item['product_id'] == int(product_id):
@@ -239,13 +235,13 @@ def add_to_cart() -> Response:
                     'product_id': int(product_id),
                     'quantity': quantity
                 })
-            session['cart_items'] = cart_items
+            save_guest_cart(cart_items)
 
-        flash(f'Added {product.name} to cart!', 'success')
+        _notify(f'Added {product.name} to cart!', 'success')
         return make_response(redirect(next_page))
 
     except Exception:
-        flash('Error adding item to cart', 'error')
+        _notify('Error adding item to cart', 'error')
         return make_response(redirect(next_page))
 
 
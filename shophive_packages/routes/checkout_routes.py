@@ -1,13 +1,140 @@
+import logging
+from decimal import Decimal
+from uuid import uuid4
 from flask import Blueprint, render_template, request, redirect, url_for, \
-    session, Response as FlaskResponse, make_response, flash
+    session, Response as FlaskResponse, make_response, flash, current_app
 from flask_login import login_required, current_user  # type: ignore
 from shophive_packages import db
-from shophive_packages.models.orders import Order, OrderItem
+from shophive_packages.models.orders import Order
+from shophive_packages.services.idempotency_service import idempotent
+from shophive_packages.services.inventory_service import (
+    InsufficientStockError, claim_stock, hold_stock, record_sales
+)
+from shophive_packages.services.order_status_service import record_created
+from shophive_packages.services.order_tasks import (
+    enqueue_order_placed, enqueue_payment_capture
+)
+from shophive_packages.services.payment_service import (
+    PaymentClient, PaymentDeclined, PaymentError, PaymentUnavailable,
+    get_payments
+)
+from shophive_packages.services.rate_limit import by_user, rate_limited
+from shophive_packages.services.rollup_service import record_order_items
+from shophive_packages.services.sqlite_profile import writes
+
+logger = logging.getLogger(__name__)
 
 checkout_bp = Blueprint("checkout_bp", __name__)
 
+
+def _void(payments: PaymentClient, authorization_id: str) -> None:
+    """Release an authorization whose order was not placed."""
+    try:
+        payments.void(authorization_id)
+    except PaymentError as e:
+        # The processor expires unused authorizations on its own
+        logger.warning("Could not void authorization %s: %s",
+                       authorization_id, e)
+
+
+def _cart_lines(cart: list) -> dict[int, int]:
+    """Map a buyer's cart rows to ``{product_id: quantity}``."""
+    lines: dict[int, int] = {}
+    for item in cart:
+        lines[item.product_id] = lines.get(item.product_id, 0) + item.quantity
+    return lines
+
+
+def _create_order(
+    cart: list, lines: dict[int, int], payment_reference: str
+) -> None:
+    """Create the order, take stock and clear the cart in one transaction."""
+    claim_stock(current_user.id, lines)
+    record_sales(lines)
+    order = Order(
+        buyer_id=current_user.id,
+        payment_reference=payment_reference,
+    )
+    db.session.add(order)
+    db.session.flush()
+    order_items = []
+    for item in cart:
+        order_items.append(
+            order.add_item(item, address=request.form.get("address"))
+        )
+        db.session.delete(item)
+    record_order_items(order_items, order.created_at)
+    record_created(order)
+    enqueue_order_placed(order)
+    enqueue_payment_capture(order)
+    db.session.commit()
+
+
+def _place_order(cart: list) -> FlaskResponse:
+    """Authorize the cart total, then place the order or void the payment."""
+    lines = _cart_lines(cart)
+    amount = sum(
+        (Decimal(str(item.product.price)) * item.quantity for item in cart),
+        Decimal("0"),
+    )
+    # Authorize with no transaction open so no locks are held while
+    # waiting on the processor
+    db.session.commit()
+    payments = get_payments()
+    try:
+        # A fresh reference per attempt: a retry of a failed attempt must
+        # not get back the authorization it voided
+        authorization = payments.authorize(
+            amount,
+            current_app.config.get("PAYMENT_CURRENCY", "USD"),
+            uuid4().hex,
+            request.form.get("payment_token", ""),
+        )
+    except PaymentDeclined:
+        flash("Your payment was declined", "error")
+        return make_response(redirect(url_for("checkout_bp.checkout")))
+    except PaymentUnavailable:
+        flash("Payments are temporarily unavailable, please try again",
+              "warning")
+        return make_response(redirect(url_for("checkout_bp.checkout")))
+
+    try:
+        _create_order(cart, lines, authorization.id)
+    except InsufficientStockError:
+        db.session.rollback()
+        _void(payments, authorization.id)
+        flash("Some items in your cart are out of stock", "error")
+        return make_response(redirect(url_for("cart_bp.cart")))
+    except Exception:
+        db.session.rollback()
+        _void(payments, authorization.id)
+        raise
+
+    # Clear the cart summary kept in the session
+    session.pop("cart_items", None)
+    session.pop("cart_total", None)
+    flash("Order successfully placed!", "success")
+    return make_response(redirect(url_for("home_bp.home")))
+
+
+def _hold_cart() -> None:
+    """Hold the buyer's cart for ``INVENTORY_RESERVATION_TTL`` seconds."""
+    ttl = current_app.config.get("INVENTORY_RESERVATION_TTL")
+    if not ttl:
+        return
+    try:
+        hold_stock(current_user.id, _cart_lines(current_user.get_cart()), ttl)
+        db.session.commit()
+    except InsufficientStockError:
+        db.session.rollback()
+        flash("Some items in your cart are out of stock", "warning")
+
+
 @checkout_bp.route("/checkout", methods=["GET", "POST"])
+@writes
 @login_required  # type: ignore[misc]
+@rate_limited("checkout", by_user)
+@idempotent("checkout")
 def checkout() -> FlaskResponse:
     """Checkout route for processing payments"""
     # Prevent sellers from accessing checkout
@@ -20,22 +147,18 @@ def checkout() -> FlaskResponse:
             flash("Please login to complete your purchase", "warning")
             return make_response(redirect(url_for("user_bp.login")))
 
-        # Create order
         cart = current_user.get_cart()
-        order = Order(buyer_id=current_user.id)
-        for item in cart:
-            order.add_item(item, address=request.form.get("address"))
-            db.session.delete(item)
-        db.session.add(order)
-
-        # Process payment and clear the cart
-        session.pop("cart_items", None)
-        session.pop("cart_total", None)
-        db.session.commit()
-        flash("Order successfully placed!", "success")
-        return make_response(redirect(url_for("home_bp.home")))
+        if not cart:
+            flash("Your cart is empty", "warning")
+            return make_response(redirect(url_for("cart_bp.cart")))
+        return _place_order(cart)
 
+    _hold_cart()
     cart_total = session.get("cart_total", 0)
     return make_response(
-        render_template("checkout.html", cart_total=cart_total)
+        render_template(
+            "checkout.html",
+            cart_total=cart_total,
+            idempotency_key=uuid4().hex
+        )
     )
@@ -1,6 +1,8 @@
 from flask import (
-    Blueprint, render_template, Response, make_response
+    Blueprint, render_template, Response, make_response, jsonify
 )
+from sqlalchemy import text
+from shophive_packages import db
 from shophive_packages.models.product import Product
 from flask_wtf import FlaskForm  # type: ignore
 
@@ -34,3 +36,13 @@ def home() -> Response:
             form=form
         )
     )
+
+
+@home_bp.route("/health", methods=["GET"])
+def health() -> tuple[Response, int]:
+    """Liveness check for load balancers; never opens a session."""
+    try:
+        db.session.execute(text("SELECT 1"))
+    except Exception:
+        return jsonify({"status": "unavailable"}), 503
+    return jsonify({"status": "ok"}), 200
@@ -1,23 +1,123 @@
 from flask import (
-    request, jsonify, render_template, Blueprint, Response, redirect, url_for)
+    request, jsonify, render_template, Blueprint, Response, redirect, url_for,
+    abort, current_app)
 from flask_login import login_required, current_user  # type: ignore
-from shophive_packages import db
-from shophive_packages.models import Order, OrderItem
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+import hmac
+from typing import Any, Callable, Mapping, Optional
+from sqlalchemy import select
+from shophive_packages import csrf, db
+from shophive_packages.db_utils import utcnow
+from shophive_packages.models import (
+    ArchivedOrder, ArchivedOrderHistory, ArchivedOrderItem, Order,
+    OrderHistory, OrderItem
+)
+from shophive_packages.services.archive_service import wants_archive
+from shophive_packages.services.bulk_status_service import (
+    OrderFilter, bulk_transition
+)
+from shophive_packages.services.idempotency_service import idempotent
+from shophive_packages.services.order_ingest_service import ingest_orders
+from shophive_packages.services.order_status_service import (
+    InvalidTransitionError, transition_order, validate_status
+)
+from shophive_packages.services.rate_limit import by_ip, rate_limited
+from shophive_packages.services.rollup_service import seller_dashboard
 
 
 order_bp = Blueprint('order_bp', __name__)
 
 
-def calculate_total(items: list[dict]) -> float:
-    """
-    Calculates the total amount of an order
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO 8601 query parameter into a naive UTC datetime."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _seller_order_page(
+    seller_id: int, args: Mapping[str, str]
+) -> tuple[list[dict], Optional[int]]:
     """
-    total_amount = 0.0
-    for item in items:
-        price = item["price"] * item["quantity"]
-        total_amount += price
+    One keyset page of a seller's order lines, newest first.
 
-    return total_amount
+    Walks the ``(seller_id, id)`` index so deep pages cost the same as the
+    first one.  Archived lines are only read with ``include_archived``.
+    """
+    try:
+        limit = int(args.get("limit", 50))
+        before_id = (
+            int(args["before_id"]) if args.get("before_id") else None
+        )
+        product_id = (
+            int(args["product_id"]) if args.get("product_id") else None
+        )
+    except ValueError:
+        raise ValueError("limit, before_id and product_id must be integers")
+    if limit <= 0 or limit > 200:
+        raise ValueError("limit must be between 1 and 200")
+    status = args.get("status")
+    if status:
+        validate_status(status)
+
+    # Archived lines keep their ids, so a page over both tiers is the
+    # newest ``limit`` lines of the two keyset queries combined.
+    tiers = [OrderItem]
+    if wants_archive(args):
+        tiers.append(ArchivedOrderItem)
+    rows = []
+    for model in tiers:
+        query = select(
+            model.id,
+            model.order_id,
+            model.status,
+            model.product_id,
+            model.quantity,
+            model.price,
+        ).where(model.seller_id == seller_id)
+        if before_id is not None:
+            query = query.where(model.id < before_id)
+        if status:
+            query = query.where(model.status == status)
+        if product_id is not None:
+            query = query.where(model.product_id == product_id)
+        rows.extend(db.session.execute(
+            query.order_by(model.id.desc()).limit(limit)
+        ).all())
+    rows = sorted(rows, key=lambda row: row.id, reverse=True)[:limit]
+
+    page = [
+        {
+            "item_id": row.id,
+            "order_id": row.order_id,
+            "status": row.status,
+            "product_id": row.product_id,
+            "quantity": row.quantity,
+            "price": float(row.price),
+            "total_amount": float(row.price * row.quantity),
+        }
+        for row in rows
+    ]
+    next_before_id = rows[-1].id if len(rows) == limit else None
+    return page, next_before_id
+
+
+def _buyer_orders(user_id: int, include_archived: bool = False) -> list:
+    """A buyer's orders, newest first, optionally followed by archived ones."""
+    orders: list = Order.query.filter_by(buyer_id=user_id).order_by(
+        Order.id.desc()
+    ).all()
+    if include_archived:
+        orders.extend(
+            ArchivedOrder.query.filter_by(buyer_id=user_id).order_by(
+                ArchivedOrder.id.desc()
+            )
+        )
+    return orders
 
 
 @order_bp.route("/api/orders", methods=["GET"], strict_slashes=False)
@@ -46,37 +146,30 @@ def get_orders() -> tuple[Response, int]:
 
 
 @order_bp.route("/api/orders", methods=["POST"], strict_slashes=False)
+@idempotent("orders")
 def create_order() -> tuple[Response, int]:
-    data = request.get_json()
-    # Remember to add logic to check if user id exists
-    user_id = data.get("user_id")
-    items = data.get("items")
-
-    # Logic for creating order and calculating total amount
-    order = Order(buyer_id=user_id, total_amount=calculate_total(items))
-    db.session.add(order)
-    db.session.commit()
-
-    # Add order items
-    for item in items:
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=item["product_id"],
-            quantity=item["quantity"],
-            price=item["price"],
-            seller_id=1,
-        )
-        db.session.add(order_item)
-    db.session.commit()
+    """
+    Place one order.
+
+    Sellers and prices are taken from the products, not from the request.
+    """
+    data = request.get_json(silent=True)
+    result = ingest_orders([data])[0]
+    if result["status"] != "created":
+        status_code = 409 if result["error"] == "insufficient_stock" else 400
+        body = {"status": "error", "message": result["message"]}
+        if "product_id" in result:
+            body["product_id"] = result["product_id"]
+        return jsonify(body), status_code
 
     return (
         jsonify(
             {
                 "status": "success",
                 "data": {
-                    "order_id": order.id,
-                    "total_amount": order.total_amount,
-                    "status": order.status,
+                    "order_id": result["order_id"],
+                    "total_amount": result["total_amount"],
+                    "status": "Pending",
                 },
                 "message": "Order created successfully.",
             }
@@ -85,21 +178,93 @@ def create_order() -> tuple[Response, int]:
     )
 
 
+def _integration_required(view: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Let in callers with the ``ORDER_BATCH_TOKEN`` bearer token, or admins.
+
+    The route is exempt from CSRF for the token, so an admin's browser
+    session still has to pass the CSRF check here.
+    """
+
+    @wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        token = current_app.config.get("ORDER_BATCH_TOKEN")
+        if token and hmac.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {token}"
+        ):
+            return view(*args, **kwargs)
+        if current_user.is_authenticated and current_user.role == "admin":
+            if current_app.config.get("WTF_CSRF_ENABLED", True):
+                csrf.protect()
+            return view(*args, **kwargs)
+        return jsonify({"message": "Integration credential required"}), 401
+
+    return wrapper
+
+
+@order_bp.route("/api/orders/batch", methods=["POST"], strict_slashes=False)
+@rate_limited("orders.batch", by_ip)
+@_integration_required
+@idempotent("orders.batch")
+def create_orders_batch() -> tuple[Response, int]:
+    """
+    Place many orders at once for marketplace integrations.
+
+    Body: ``{"orders": [<order as for POST /api/orders>, ...]}``.  Returns
+    one result per order in submission order; rejected orders do not
+    prevent the others from being placed.  Integrations authenticate with
+    ``Authorization: Bearer <ORDER_BATCH_TOKEN>``.
+    """
+    data = request.get_json(silent=True) or {}
+    orders = data.get("orders")
+    if not isinstance(orders, list) or not orders:
+        return jsonify({"message": "orders must be a non-empty list"}), 400
+    max_orders = current_app.config.get("ORDER_BATCH_MAX_ORDERS", 1000)
+    if len(orders) > max_orders:
+        return jsonify(
+            {"message": f"At most {max_orders} orders per batch"}
+        ), 413
+
+    results = ingest_orders(orders)
+    created = sum(1 for r in results if r["status"] == "created")
+    return jsonify({
+        "status": "success",
+        "data": {
+            "created": created,
+            "rejected": len(results) - created,
+            "results": results,
+        },
+    }), 200
+
+
 @order_bp.route(
     "/api/orders/<int:order_id>",
     methods=["GET"],
     strict_slashes=False
 )
 def get_order(order_id: int) -> tuple[Response, int]:
-    """Retrieve details of a specific order."""
-    order = Order.query.get_or_404(order_id)
+    """
+    Retrieve details of a specific order.
+
+    Archived orders are found only with ``include_archived``.
+    """
+    order = db.session.get(Order, order_id)
+    if order is not None:
+        order_items = order.items
+    elif wants_archive(request.args):
+        order = db.get_or_404(ArchivedOrder, order_id)
+        order_items = ArchivedOrderItem.query.filter_by(
+            order_id=order_id
+        ).all()
+    else:
+        abort(404)
     items = [
         {
             "product_id": item.product_id,
             "quantity": item.quantity,
             "price": item.price,
         }
-        for item in order.items
+        for item in order_items
     ]
 
     return (
@@ -124,28 +289,140 @@ def get_order(order_id: int) -> tuple[Response, int]:
 )
 def update_order_status(order_id: int) -> tuple[Response, int]:
     """Update the status of an order."""
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     status = data.get("status")
 
     order = Order.query.get_or_404(order_id)
-    order.status = status
-
-    """# Add to order history
-    history = OrderHistory(order_id=order.id, status=status)
-    db.session.add(history)"""
+    try:
+        validate_status(status)
+        event = transition_order(order, status, note=data.get("note"))
+        db.session.commit()
+    except InvalidTransitionError as e:
+        db.session.rollback()
+        return jsonify({"status": "error", "message": str(e)}), 409
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"status": "error", "message": str(e)}), 400
 
-    db.session.commit()
     return (
         jsonify(
             {
                 "status": "success",
                 "message": "Order status updated successfully.",
+                "data": event.to_dict(),
             }
         ),
         200,
     )
 
 
+@order_bp.route(
+    "/api/orders/bulk-status", methods=["POST"], strict_slashes=False
+)
+@rate_limited("orders.bulk_status", by_ip)
+def bulk_update_order_status() -> tuple[Response, int]:
+    """
+    Move many orders to one status.
+
+    Body: ``status``, plus ``order_ids`` and/or a ``filter`` object with
+    ``seller_id``, ``status``, ``created_before`` and ``created_after``.
+    Orders that cannot make the transition are reported, not fatal.
+
+    Only sellers and admins may call this.  A seller's selection is
+    always narrowed to orders made up entirely of their own lines.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({"message": "Authentication required"}), 401
+    if current_user.role not in ("seller", "admin"):
+        return jsonify({"message": "Only sellers can do this"}), 403
+    data = request.get_json(silent=True) or {}
+    order_ids = data.get("order_ids")
+    raw_filter = data.get("filter")
+    if order_ids is not None and (
+        not isinstance(order_ids, list)
+        or not all(isinstance(i, int) for i in order_ids)
+    ):
+        return jsonify({"message": "order_ids must be a list of ids"}), 400
+    if raw_filter is not None and not isinstance(raw_filter, dict):
+        return jsonify({"message": "filter must be an object"}), 400
+
+    raw_filter = dict(raw_filter or {})
+    if current_user.role == "seller":
+        if raw_filter.get("seller_id", current_user.id) != current_user.id:
+            return jsonify({"message": "Not your orders"}), 403
+        raw_filter["seller_id"] = current_user.id
+
+    try:
+        order_filter = None
+        if raw_filter:
+            order_filter = OrderFilter(
+                seller_id=raw_filter.get("seller_id"),
+                status=raw_filter.get("status"),
+                created_before=_parse_timestamp(
+                    raw_filter.get("created_before")
+                ),
+                created_after=_parse_timestamp(
+                    raw_filter.get("created_after")
+                ),
+            )
+        result = bulk_transition(
+            data.get("status"), order_ids, order_filter, data.get("note")
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    return jsonify({"status": "success", "data": result.to_dict()}), 200
+
+
+@order_bp.route(
+    "/api/orders/<int:order_id>/history",
+    methods=["GET"],
+    strict_slashes=False
+)
+def get_order_history(order_id: int) -> tuple[Response, int]:
+    """
+    List status changes of an order, oldest first.
+
+    Supports ``since``/``until`` ISO timestamps, an ``after_id`` cursor and
+    ``limit`` (max 200); each is served from an ``order_history`` index.
+    Archived orders are found only with ``include_archived``.
+    """
+    limit = request.args.get("limit", type=int, default=50)
+    if limit <= 0 or limit > 200:
+        return jsonify({"message": "limit must be between 1 and 200"}), 400
+    after_id = request.args.get("after_id", type=int)
+    try:
+        since = _parse_timestamp(request.args.get("since"))
+        until = _parse_timestamp(request.args.get("until"))
+    except ValueError:
+        return jsonify({"message": "Invalid timestamp"}), 400
+
+    model: type = OrderHistory
+    if not db.session.scalar(select(Order.id).where(Order.id == order_id)):
+        if not wants_archive(request.args) or not db.session.scalar(
+            select(ArchivedOrder.id).where(ArchivedOrder.id == order_id)
+        ):
+            return jsonify({"message": "Order not found"}), 404
+        model = ArchivedOrderHistory
+
+    query = select(model).where(model.order_id == order_id)
+    if after_id is not None:
+        query = query.where(model.id > after_id)
+    if since is not None:
+        query = query.where(model.created_at >= since)
+    if until is not None:
+        query = query.where(model.created_at < until)
+    events = db.session.scalars(
+        query.order_by(model.id).limit(limit)
+    ).all()
+
+    return jsonify({
+        "status": "success",
+        "data": [event.to_dict() for event in events],
+        "next_after_id": events[-1].id if len(events) == limit else None,
+    }), 200
+
+
 @order_bp.route(
     "/api/orders/<int:order_id>/status",
     methods=["GET"],
@@ -171,14 +448,19 @@ def get_order_status(order_id: int) -> tuple[Response, int]:
     strict_slashes=False
 )
 def get_user_orders(user_id: int) -> tuple[Response, int]:
-    """Get all orders for a specific user"""
-    orders = Order.query.filter_by(buyer_id=user_id).all()
+    """
+    Get all orders for a specific user.
+
+    Archived orders are appended only with ``include_archived``.
+    """
+    orders = _buyer_orders(user_id, wants_archive(request.args))
     return jsonify({
         "status": "success",
         "data": [{
             "order_id": order.id,
             "status": order.status,
             "total_amount": order.total_amount,
+            "archived": isinstance(order, ArchivedOrder),
         } for order in orders]
     }), 200
 
@@ -190,13 +472,14 @@ def get_user_orders(user_id: int) -> tuple[Response, int]:
 )
 def get_buyer_orders(user_id: int) -> tuple[Response, int]:
     """Endpoint to get a buyer's orders"""
-    orders = Order.query.filter_by(buyer_id=user_id).all()
+    orders = _buyer_orders(user_id, wants_archive(request.args))
     return jsonify({
         "status": "success",
         "data": [{
             "order_id": o.id,
             "status": o.status,
             "total_amount": o.total_amount,
+            "archived": isinstance(o, ArchivedOrder),
             } for o in orders]
     }), 200
 
@@ -207,26 +490,80 @@ def get_buyer_orders(user_id: int) -> tuple[Response, int]:
     strict_slashes=False
 )
 def get_seller_orders(seller_id: int) -> tuple[Response, int]:
-    """Endpoints for sellers to manage orders."""
-    orders = OrderItem.query.filter_by(seller_id=seller_id).all()
+    """
+    Endpoints for sellers to manage orders.
+
+    Newest lines first, ``limit`` per page (max 200); pass the returned
+    ``next_before_id`` as ``before_id`` for the next page.  ``status`` and
+    ``product_id`` filter the lines.
+    """
+    try:
+        rows, next_before_id = _seller_order_page(seller_id, request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     return (
         jsonify(
             {
                 "status": "success",
-                "data": [
-                    {
-                        "order_id": o.id,
-                        "status": o.status,
-                        "product_id": o.product_id,
-                        "total_amount": o.price * o.quantity,
-                    }
-                    for o in orders
-                ],
+                "data": rows,
+                "next_before_id": next_before_id,
             }
         ),
         200,
     )
 
+
+@order_bp.route(
+    "/api/sellers/<int:seller_id>/dashboard",
+    methods=["GET"],
+    strict_slashes=False
+)
+def get_seller_dashboard(seller_id: int) -> tuple[Response, int]:
+    """
+    Revenue and units per day or hour, served from the rollup tables.
+
+    Only the seller themselves and admins may read it.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({"message": "Authentication required"}), 401
+    if current_user.role != "admin" and (
+        current_user.role != "seller" or current_user.id != seller_id
+    ):
+        return jsonify({"message": "Not your dashboard"}), 403
+    granularity = request.args.get("granularity", "daily")
+    if granularity not in ("daily", "hourly"):
+        return jsonify(
+            {"message": "granularity must be daily or hourly"}
+        ), 400
+    try:
+        since = _parse_timestamp(request.args.get("since"))
+        until = _parse_timestamp(request.args.get("until"))
+    except ValueError:
+        return jsonify({"message": "Invalid timestamp"}), 400
+    if since is None:
+        since = utcnow() - (
+            timedelta(days=30) if granularity == "daily"
+            else timedelta(hours=48)
+        )
+
+    buckets = seller_dashboard(
+        seller_id,
+        granularity,
+        since=since,
+        until=until,
+        product_id=request.args.get("product_id", type=int),
+    )
+    return jsonify({
+        "status": "success",
+        "data": {
+            "granularity": granularity,
+            "buckets": buckets,
+            "revenue": sum(b["revenue"] for b in buckets),
+            "units": sum(b["units"] for b in buckets),
+        },
+    }), 200
+
+
 @order_bp.route('/orders', methods=['GET'], strict_slashes=False)
 def orders() -> str:
     user_id = 1  # current_user.id
@@ -247,8 +584,23 @@ def view_seller_orders():
     """View orders for sellers"""
     if current_user.role != 'seller':
         return redirect(url_for('home_bp.home'))
-    orders = OrderItem.query.filter_by(seller_id=current_user.id).all()
-    return render_template('seller_orders.html', orders=orders)
+    try:
+        orders, next_before_id = _seller_order_page(
+            current_user.id, request.args
+        )
+    except ValueError:
+        orders, next_before_id = [], None
+    summary = seller_dashboard(
+        current_user.id, "daily", since=utcnow() - timedelta(days=30)
+    )
+    return render_template(
+        'seller_orders.html',
+        orders=orders,
+        next_before_id=next_before_id,
+        status_filter=request.args.get("status"),
+        revenue_30d=sum(b["revenue"] for b in summary),
+        units_30d=sum(b["units"] for b in summary),
+    )
 
 
 @order_bp.route('/buyer/orders')
@@ -257,5 +609,10 @@ def view_buyer_orders():
     """View orders for buyers"""
     if current_user.role != 'buyer':
         return redirect(url_for('home_bp.home'))
-    orders = current_user.orders
-    return render_template('buyer_orders.html', orders=orders)
+    include_archived = wants_archive(request.args)
+    orders = _buyer_orders(current_user.id, include_archived)
+    return render_template(
+        'buyer_orders.html',
+        orders=orders,
+        include_archived=include_archived,
+    )
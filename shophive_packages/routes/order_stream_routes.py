@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+"""
+This module contains the Server-Sent Events stream of order status changes
+"""
+import json
+import time
+from typing import Iterator
+
+from flask import Blueprint, Response, current_app, jsonify, request
+from flask_login import current_user, login_required  # type: ignore
+from sqlalchemy import select
+
+from shophive_packages import db
+from shophive_packages.models.orders import Order, OrderHistory
+from shophive_packages.services.order_events import (
+    InProcessBroker, Subscription, get_broker
+)
+
+order_stream_bp = Blueprint("order_stream_bp", __name__)
+
+OPEN_STATUSES = ("Pending", "Processing", "Shipped")
+
+
+def _format_event(payload: dict) -> str:
+    return (
+        f"id: {payload['id']}\n"
+        "event: status\n"
+        f"data: {json.dumps(payload)}\n\n"
+    )
+
+
+def _stream(
+    broker: InProcessBroker,
+    sub: Subscription,
+    backlog: list[dict],
+    heartbeat: float,
+    max_duration: float,
+) -> Iterator[str]:
+    """Yield missed events, then live ones, with periodic heartbeats."""
+    try:
+        yield "retry: 3000\n\n"
+        # Ids only: live events may arrive out of id order (concurrent
+        # commits, the Redis fan-out), so no high-water mark is safe
+        sent: set[int] = set()
+        for payload in backlog:
+            sent.add(payload["id"])
+            yield _format_event(payload)
+
+        deadline = time.monotonic() + max_duration
+        while time.monotonic() < deadline:
+            events = sub.drain(
+                min(heartbeat, max(deadline - time.monotonic(), 0))
+            )
+            if sub.overflowed:
+                sub.overflowed = False
+                yield "event: resync\ndata: {}\n\n"
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for payload in events:
+                # Skip anything already sent from the backlog
+                if payload["id"] in sent:
+                    sent.discard(payload["id"])
+                    continue
+                yield _format_event(payload)
+    finally:
+        broker.unsubscribe(sub)
+
+
+@order_stream_bp.route(
+    "/api/orders/stream", methods=["GET"], strict_slashes=False
+)
+@login_required  # type: ignore[misc]
+def stream_order_status() -> Response | tuple[Response, int]:
+    """
+    Stream status changes for the current buyer's orders.
+
+    ``order_id`` may be repeated to pick orders; without it every open
+    order is followed.  ``Last-Event-ID`` (or ``last_event_id``) replays
+    changes missed while the client was disconnected.
+    """
+    requested = request.args.getlist("order_id", type=int)
+    query = select(Order.id).where(Order.buyer_id == current_user.id)
+    if requested:
+        query = query.where(Order.id.in_(requested))
+    else:
+        query = query.where(Order.status.in_(OPEN_STATUSES))
+    order_ids = set(db.session.scalars(query))
+    if requested and order_ids != set(requested):
+        return jsonify({"message": "Order not found"}), 404
+    if not order_ids:
+        return jsonify({"message": "No orders to follow"}), 404
+
+    config = current_app.config
+    broker = get_broker()
+    # Subscribe before reading the backlog so nothing falls in between
+    sub = broker.subscribe(order_ids, config["SSE_BUFFER_SIZE"])
+
+    last_event_id = request.headers.get(
+        "Last-Event-ID", request.args.get("last_event_id")
+    )
+    backlog: list[dict] = []
+    if last_event_id and last_event_id.isdigit():
+        rows = db.session.execute(
+            select(
+                OrderHistory.id,
+                OrderHistory.order_id,
+                OrderHistory.from_status,
+                OrderHistory.status,
+            )
+            .where(
+                OrderHistory.order_id.in_(order_ids),
+                OrderHistory.id > int(last_event_id),
+            )
+            .order_by(OrderHistory.id)
+            .limit(config["SSE_BUFFER_SIZE"])
+        )
+        backlog = [dict(row._mapping) for row in rows]
+    # Nothing below needs the database; give the connection back now
+    db.session.remove()
+
+    response = Response(
+        _stream(
+            broker,
+            sub,
+            backlog,
+            config["SSE_HEARTBEAT_SECONDS"],
+            config["SSE_MAX_STREAM_SECONDS"],
+        ),
+        mimetype="text/event-stream",
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
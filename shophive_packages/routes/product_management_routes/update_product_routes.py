@@ -17,6 +17,9 @@ from shophive_packages import db
 from shophive_packages.models.tags import Tag
 from shophive_packages.models.categories import Category
 from shophive_packages.db_utils import get_by_id
+from shophive_packages.services.outbox_service import (
+    PRODUCT_PRICE_CHANGED, PRODUCT_UPDATED, publish
+)
 
 
 update_product_bp = Blueprint("update_product", __name__)
@@ -65,6 +68,23 @@ def _validate_product_data(data: dict) -> tuple:
     return None, None
 
 
+def _publish_product_change(product: Product, old_price: object) -> None:
+    """Add outbox events for an edited product to the transaction."""
+    publish(PRODUCT_UPDATED, "product", product.id, {
+        "product_id": product.id,
+        "name": product.name,
+        "description": product.description,
+        "price": float(product.price),
+        "image_url": product.image_url,
+    })
+    if float(old_price) != float(product.price):  # type: ignore[arg-type]
+        publish(PRODUCT_PRICE_CHANGED, "product", product.id, {
+            "product_id": product.id,
+            "old_price": float(old_price),  # type: ignore[arg-type]
+            "new_price": float(product.price),
+        })
+
+
 def _update_product_fields(product: Product, data: dict) -> None:
     """Helper function to update product fields"""
     if data.get("name"):
@@ -99,12 +119,14 @@ def update_product_api(product_id: int) -> tuple:
         ), 404
 
     data = request.get_json()
-    validation_error = _validate_product_data(data)
-    if validation_error:
-        return validation_error
+    error, status_code = _validate_product_data(data)
+    if error:
+        return error, status_code
 
     try:
+        old_price = product.price
         _update_product_fields(product, data)
+        _publish_product_change(product, old_price)
         db.session.commit()
         return jsonify({
             "message": "Product updated successfully",
@@ -137,11 +159,13 @@ def update_product(product_id: int) -> WerkzeugResponse | str:
         return make_response(jsonify({"message": "Product not found"}), 404)
 
     if request.method == 'POST':
+        old_price = product.price
         product.name = request.form.get('name', product.name)
         product.description = request.form.get(
             'description', product.description
         )
         product.price = float(request.form.get('price', product.price))
+        _publish_product_change(product, old_price)
 
         db.session.commit()
         return render_template('product_detail.html', product=product)
@@ -160,10 +184,12 @@ def update_product_alt(product_id: int) -> WerkzeugResponse | str:
         return make_response(jsonify({"message": "Product not found"}), 404)
 
     if request.method == 'POST':
+        old_price = product.price
         product.name = request.form.get('name', product.name)
         product.description = request.form.get(
             'description', product.description)
         product.price = float(request.form.get('price', product.price))
+        _publish_product_change(product, old_price)
 
         db.session.commit()
         return redirect(
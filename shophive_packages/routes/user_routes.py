@@ -1,8 +1,9 @@
 from flask import Blueprint, make_response, request, jsonify, render_template, session, flash, Response  # noqa
 from flask import url_for, redirect
 from sqlalchemy import TypeDecorator
+from sqlalchemy.exc import IntegrityError
 from werkzeug.wrappers import Response as WerkzeugResponse
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_current_user
 from typing import Callable, TypeVar, cast, Union
 from flask_login import (  # type: ignore
     login_user as flask_login_user,
@@ -11,11 +12,19 @@ from flask_login import (  # type: ignore
     current_user
 )
 from shophive_packages.services.auth_service import register_user, login_user as auth_service_login  # noqa
-from shophive_packages.models.user import User, Seller
+from shophive_packages.services.auth_service import (
+    authenticate, duplicate_field
+)
+from shophive_packages.models.user import User
 from shophive_packages import db
-from shophive_packages.models.types import ModelProtocol
 from shophive_packages.models.types import RelationshipList
-from shophive_packages.services.auth_helpers import find_user, merge_guest_cart
+from shophive_packages.services.guest_cart import merge_guest_cart
+from shophive_packages.services.rate_limit import (
+    by_ip, by_username, rate_limited
+)
+from shophive_packages.services.identity_service import (
+    invalidate_identity, load_current_user
+)
 
 RT = TypeVar('RT')
 JWTDecorator = TypeDecorator[Callable[..., RT]]
@@ -26,6 +35,7 @@ user_bp = Blueprint("user_bp", __name__, url_prefix="/user")
 
 # User Registration
 @user_bp.route("/register", methods=["GET", "POST"])
+@rate_limited("register", by_ip)
 def register() -> str | tuple[dict, int] | Response | tuple[Response, int]:
     """
     Register a new user.
@@ -49,23 +59,22 @@ def register() -> str | tuple[dict, int] | Response | tuple[Response, int]:
                 {"message": "Username, email and password are required"}
             ), 400
 
-        register_user(
+        user = register_user(
             username,
             email,
             password,
             role,
         )
-        user = find_user(username)
-        if user is not None:
-            flask_login_user(user)
-            merge_guest_cart(user)
-            flash('Successfully registered!', 'success')
+        flask_login_user(user)
+        merge_guest_cart(user)
+        flash('Successfully registered!', 'success')
         return make_response(redirect(url_for("user_bp.login")))
     except ValueError as e:
         return jsonify({"message": str(e)}), 400
 
 
 @user_bp.route("/register", methods=["POST"])
+@rate_limited("register", by_ip)
 def register_post() -> Union[WerkzeugResponse, tuple[Response, int]]:
     try:
         username = request.form.get("username")
@@ -79,10 +88,7 @@ def register_post() -> Union[WerkzeugResponse, tuple[Response, int]]:
                 {"message": "Username, email and password are required"}
             ), 400
 
-        register_user(username, email, password, role)
-        user = find_user(username)
-        if user is None:
-            return jsonify({"message": "User registration failed"}), 400
+        user = register_user(username, email, password, role)
         flask_login_user(user)
         merge_guest_cart(user)
         flash('Successfully registered!', 'success')
@@ -93,6 +99,7 @@ def register_post() -> Union[WerkzeugResponse, tuple[Response, int]]:
 
 # User Login
 @user_bp.route('/login', methods=['GET', 'POST'])
+@rate_limited("login", by_ip, by_username)
 def login() -> Response:
     if current_user.is_authenticated:
         return make_response(redirect(url_for('home_bp.home')))
@@ -106,10 +113,9 @@ def login() -> Response:
             flash('Username and password are required.', 'error')
             return make_response(render_template('login.html'))
 
-        # Use find_user helper to check both User and Seller tables
-        user = find_user(username)
+        user = authenticate(username, password)
 
-        if user and user.check_password(password):
+        if user:
             flask_login_user(user)
             if hasattr(user, 'get_cart'):
                 merge_guest_cart(user)
@@ -131,8 +137,7 @@ def view_shop() -> tuple[Response | dict, int]:
     """
     Allows sellers to view and manage their products.
     """
-    current_user_id = get_jwt_identity()
-    user: User = User.query.get_or_404(current_user_id)
+    user: User = db.get_or_404(User, get_current_user().id)
 
     if user.role != "seller":
         return jsonify(
@@ -160,8 +165,7 @@ def view_orders() -> tuple[dict | Response, int]:
     """
     Allows buyers to view and manage their orders.
     """
-    current_user_id = get_jwt_identity()
-    user: User = User.query.get_or_404(current_user_id)
+    user: User = db.get_or_404(User, get_current_user().id)
 
     if user.role != "buyer":
         return jsonify(
@@ -193,35 +197,8 @@ def logout() -> WerkzeugResponse:
 @login_required  # type: ignore
 def view_profile() -> str | WerkzeugResponse:
     """Display user profile page"""
-    if not current_user.is_authenticated:
-        flash('Please login to view your profile.', 'error')
-        return redirect(url_for('user_bp.login'))
-
-    try:
-        user_id = current_user.get_id()
-        if not user_id:
-            flash('Invalid user session', 'error')
-            return redirect(url_for('user_bp.login'))
-
-        user_type, id_str = user_id.split('_')
-        user_id_int = int(id_str)
-
-        # Query the correct table based on user type
-        if user_type == 'seller':
-            user = db.session.query(Seller).get(user_id_int)
-        else:
-            user = db.session.query(User).get(user_id_int)
-
-        if not user:
-            flash('User not found', 'error')
-            logout_user()
-            return redirect(url_for('user_bp.login'))
-
-        return render_template('profile.html', user=user)
-
-    except Exception:
-        flash('Error loading profile', 'error')
-        return redirect(url_for('user_bp.login'))
+    # ``current_user`` was already loaded (or cached) by the user loader
+    return render_template('profile.html', user=current_user)
 
 
 @user_bp.route('/profile/update', methods=['POST'])
@@ -233,39 +210,26 @@ def update_profile() -> WerkzeugResponse:
         email = request.form.get('email')
         new_password = request.form.get('new_password')
 
-        if username and email:
-            # Get the correct model class based on current user type
-            model_class = type(current_user)
-            if not isinstance(model_class, ModelProtocol):
-                model_class = User  # fallback to User model
-
-            # Check if username is already taken by another user
-            existing_user = model_class.query.filter(
-                (model_class.username == username) &
-                (model_class.id != current_user.id)
-            ).first()
-            if existing_user:
-                flash('Username already taken.', 'error')
-                return redirect(url_for('user_bp.profile'))
-
-            # Check if email is already taken by another user
-            existing_email = model_class.query.filter(
-                (model_class.email == email) &
-                (model_class.id != current_user.id)
-            ).first()
-            if existing_email:
-                flash('Email already registered.', 'error')
-                return redirect(url_for('user_bp.profile'))
-
-            current_user.username = username
-            current_user.email = email
+        # ``current_user`` may be a detached cached copy; edit the real row
+        user = load_current_user()
+        if username and email and user:
+            user.username = username
+            user.email = email
 
             if new_password:
-                current_user.set_password(new_password)
+                user.set_password(new_password)
 
+            # The unique indexes decide; no lookups before the UPDATE
             try:
                 db.session.commit()
+                invalidate_identity(user.get_id())
                 flash('Profile updated successfully!', 'success')
+            except IntegrityError as e:
+                db.session.rollback()
+                if duplicate_field(e) == "email":
+                    flash('Email already registered.', 'error')
+                else:
+                    flash('Username already taken.', 'error')
             except Exception:
                 db.session.rollback()
                 flash(
@@ -0,0 +1,142 @@
+"""
+Hot/cold split of the order tables.
+
+``archive_orders`` moves delivered and cancelled orders that have not
+changed for ``ORDER_ARCHIVE_AFTER_DAYS`` into the ``archived_*`` tables.
+Each batch copies the orders, their lines and their history with
+``INSERT ... SELECT`` and deletes the originals in one transaction, so an
+interrupted run leaves every order in exactly one tier and simply picks up
+where it stopped when run again.
+
+Reads stay on the hot tables unless a caller asks for archived data.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, insert, select
+
+from shophive_packages import db
+from shophive_packages.db_utils import utcnow
+from shophive_packages.models.archive import (
+    ArchivedOrder, ArchivedOrderHistory, ArchivedOrderItem
+)
+from shophive_packages.models.orders import Order, OrderHistory, OrderItem
+
+ARCHIVABLE_STATUSES = ("Delivered", "Cancelled")
+
+# (hot model, archive model, column names copied, key joining to orders)
+_TIERS = (
+    (
+        Order, ArchivedOrder,
+        ("id", "total_amount", "status", "created_at", "updated_at",
+         "payment_reference", "buyer_id"),
+        "id",
+    ),
+    (
+        OrderItem, ArchivedOrderItem,
+        ("id", "quantity", "price", "address", "status", "order_id",
+         "product_id", "seller_id"),
+        "order_id",
+    ),
+    (
+        OrderHistory, ArchivedOrderHistory,
+        ("id", "order_id", "from_status", "status", "note", "created_at"),
+        "order_id",
+    ),
+)
+
+
+def archive_cutoff(now: Optional[datetime] = None) -> datetime:
+    days = current_app.config.get("ORDER_ARCHIVE_AFTER_DAYS", 365)
+    return (now or utcnow()) - timedelta(days=days)
+
+
+def archive_batch(cutoff: datetime, batch_size: int) -> int:
+    """Move one batch of finished orders last changed before ``cutoff``."""
+    order_ids = list(db.session.scalars(
+        select(Order.id)
+        .where(
+            Order.status.in_(ARCHIVABLE_STATUSES),
+            Order.updated_at < cutoff,
+        )
+        .order_by(Order.id)
+        .limit(batch_size)
+    ))
+    if not order_ids:
+        return 0
+
+    try:
+        for hot, cold, columns, key in _TIERS:
+            db.session.execute(
+                insert(cold).from_select(
+                    columns,
+                    select(*(getattr(hot, c) for c in columns))
+                    .where(getattr(hot, key).in_(order_ids)),
+                )
+            )
+        # Children first so the foreign keys hold at every statement
+        for hot, _, _, key in reversed(_TIERS):
+            db.session.execute(
+                delete(hot)
+                .where(getattr(hot, key).in_(order_ids))
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(order_ids)
+
+
+def archive_orders(
+    cutoff: Optional[datetime] = None,
+    batch_size: Optional[int] = None,
+    max_batches: Optional[int] = None,
+) -> int:
+    """Archive eligible orders batch by batch; returns orders moved."""
+    cutoff = cutoff or archive_cutoff()
+    batch_size = batch_size or current_app.config.get(
+        "ORDER_ARCHIVE_BATCH_SIZE", 1000
+    )
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(cutoff, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+    return moved
+
+
+def wants_archive(args: dict) -> bool:
+    """Whether a request opted in to archived orders."""
+    return str(args.get("include_archived", "")).lower() in (
+        "1", "true", "yes"
+    )
+
+
+archive_cli = AppGroup("archive", help="Order archive tier.")
+
+
+@archive_cli.command("run")
+@click.option("--older-than-days", type=int,
+              help="Defaults to ORDER_ARCHIVE_AFTER_DAYS.")
+@click.option("--batch-size", type=int,
+              help="Defaults to ORDER_ARCHIVE_BATCH_SIZE.")
+@click.option("--max-batches", type=int,
+              help="Stop after this many batches; rerun to continue.")
+def run_command(
+    older_than_days: Optional[int],
+    batch_size: Optional[int],
+    max_batches: Optional[int],
+) -> None:
+    """Move finished orders past the archive age to the archive tables."""
+    cutoff = (
+        utcnow() - timedelta(days=older_than_days)
+        if older_than_days is not None else archive_cutoff()
+    )
+    moved = archive_orders(cutoff, batch_size, max_batches)
+    click.echo(f"Archived {moved} orders last changed before {cutoff}")
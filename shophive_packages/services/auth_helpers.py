@@ -1,42 +1,29 @@
 from typing import Optional, TypeVar, Union, cast
-from flask import session
+from sqlalchemy import case, func, or_, select
+from sqlalchemy.orm import with_polymorphic
+from shophive_packages import db
 from shophive_packages.models.user import User, Seller
-from shophive_packages.models.product import Product
 
 UserType = TypeVar("UserType", User, Seller)
 
 
 def find_user(username: str) -> Optional[Union[User, Seller]]:
-    """Find user in either User or Seller table"""
-    # Try to find by username first
-    user = Seller.query.filter_by(username=username).first()
-    if user:
-        return cast(Seller, user)
-
-    user = User.query.filter_by(username=username).first()
-    if user:
-        return cast(User, user)
-
-    # Then try by email
-    user = Seller.query.filter_by(email=username).first()
-    if user:
-        return cast(Seller, user)
-
-    user = User.query.filter_by(email=username).first()
-    if user:
-        return cast(User, user)
-
-    return None
-
-
-def merge_guest_cart(user: User) -> None:
-    """Merge guest cart items into user's cart"""
-    guest_cart = session.get("cart_items", [])
-    if guest_cart:
-        for item in guest_cart:
-            product = Product.query.get(item["product_id"])
-            if product:
-                user.add_to_cart(product, item["quantity"])
-        # Clear guest cart
-        session.pop("cart_items", None)
-        session.pop("cart_total", None)
+    """Find a buyer or seller by username or email in one query.
+
+    Matching is case-insensitive and uses the ``lower()`` unique indexes
+    on ``user``.  Sellers are outer-joined in so they come back as
+    ``Seller`` without a second round trip; a username match wins over an
+    email match.
+    """
+    key = username.strip().lower()
+    if not key:
+        return None
+    account = with_polymorphic(User, [Seller])
+    by_username = func.lower(account.username) == key
+    user = db.session.scalars(
+        select(account)
+        .where(or_(by_username, func.lower(account.email) == key))
+        .order_by(case((by_username, 0), else_=1))
+        .limit(1)
+    ).first()
+    return cast(Optional[Union[User, Seller]], user)
@@ -1,18 +1,35 @@
-from flask_jwt_extended import create_access_token
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
 from shophive_packages.models import User, Seller
 from shophive_packages import db
+from shophive_packages.services.auth_helpers import find_user
+from shophive_packages.services.password_service import rehash_if_needed
+from shophive_packages.services.token_service import issue_tokens
+
+
+def duplicate_field(error: IntegrityError) -> Optional[str]:
+    """Which account field (``username`` or ``email``) a write collided on.
+
+    The constraint name is part of the driver's message on both SQLite
+    (``index 'uq_user_email_lower'``) and PostgreSQL.
+    """
+    message = str(error.orig).lower()
+    for field in ("email", "username"):
+        if field in message:
+            return field
+    return None
 
 
 # Register a new user
 def register_user(
     username: str, email: str, password: str, role: str = "buyer"
 ) -> User:
-    """Register a new user."""
-    if User.query.filter_by(username=username).first():
-        raise ValueError("Username already exists")
-    if User.query.filter_by(email=email).first():
-        raise ValueError("Email already exists")
+    """Register a new user.
 
+    Uniqueness is left to the database: one INSERT, and a collision on
+    the username or email index is reported as a ``ValueError``.
+    """
     user = User(
         username=username,
         email=email,
@@ -20,23 +37,41 @@ def register_user(
     )
     user.set_password(password)
     db.session.add(user)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if duplicate_field(e) == "email":
+            raise ValueError("Email already exists") from e
+        raise ValueError("Username already exists") from e
+    return user
+
+
+def authenticate(username: str, password: str) -> Optional[User]:
+    """
+    The buyer or seller with these credentials, or ``None``.
+
+    A password stored at an outdated bcrypt cost is re-hashed at the
+    configured one and committed while the plain text is at hand.
+    """
+    user = find_user(username)
+    if user is None or not user.check_password(password):
+        return None
+    if rehash_if_needed(user, password):
+        try:
+            db.session.commit()
+        except Exception:
+            # The old hash still works; try again next login
+            db.session.rollback()
     return user
 
 
 # User login: verify credentials and return user data with token
 def login_user(username: str, password: str) -> dict[str, User | Seller | str]:
     """Login a user and return the user object with access token"""
-    # Check User table first
-    user = User.query.filter_by(username=username).first()
-    if user and user.check_password(password):
-        access_token = create_access_token(identity=user.id)
+    user = authenticate(username, password)
+    if user:
+        access_token = issue_tokens(user)["access_token"]
         return {"user": user, "access_token": access_token}
 
-    # If not found in User table, check Seller table
-    seller = Seller.query.filter_by(username=username).first()
-    if seller and seller.check_password(password):
-        access_token = create_access_token(identity=seller.id)
-        return {"user": seller, "access_token": access_token}
-
     raise ValueError("Invalid username or password.")
@@ -0,0 +1,301 @@
+"""
+Set-based order status changes for fulfilment integrations.
+
+Orders are processed in chunks.  For each chunk the current statuses are
+read with one ``SELECT``, the transition rules are checked for the whole
+set, and the change is applied with one conditional ``UPDATE`` per source
+status, one ``UPDATE`` of the order lines and one multi-row ``INSERT``
+each for history and outbox events.  Each chunk commits on its own, so a
+large run can be resumed by simply running it again: orders already moved
+are no longer in a source status and are reported as rejected instead of
+changed twice.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Select, insert, select, update
+
+from shophive_packages import db
+from shophive_packages.db_utils import utcnow
+from shophive_packages.models.orders import Order, OrderHistory, OrderItem
+from shophive_packages.services.order_events import remember_events
+from shophive_packages.services.order_status_service import (
+    allowed_sources, validate_status
+)
+from shophive_packages.services.outbox_service import (
+    ORDER_STATUS_CHANGED, publish_many
+)
+from shophive_packages.services.rollup_service import reverse_orders
+
+MAX_REPORTED_REJECTIONS = 1000
+
+
+@dataclass
+class BulkStatusResult:
+    """Outcome of a bulk status change."""
+
+    status: str
+    updated: int = 0
+    rejected_count: int = 0
+    rejected: list[dict] = field(default_factory=list)
+
+    def reject(self, order_id: int, reason: str) -> None:
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REPORTED_REJECTIONS:
+            self.rejected.append({"order_id": order_id, "reason": reason})
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "updated": self.updated,
+            "rejected_count": self.rejected_count,
+            "rejected": self.rejected,
+        }
+
+
+@dataclass
+class OrderFilter:
+    """
+    Selects orders by seller, current status and creation time.
+
+    ``seller_id`` matches only orders whose every line is that seller's:
+    an order shared with other sellers would move their lines too.
+    """
+
+    seller_id: Optional[int] = None
+    status: Optional[str] = None
+    created_before: Optional[datetime] = None
+    created_after: Optional[datetime] = None
+
+    def apply(self, query: Select) -> Select:
+        if self.seller_id is not None:
+            query = query.where(
+                Order.id.in_(
+                    select(OrderItem.order_id).where(
+                        OrderItem.seller_id == self.seller_id
+                    )
+                ),
+                ~select(OrderItem.id).where(
+                    OrderItem.order_id == Order.id,
+                    OrderItem.seller_id != self.seller_id,
+                ).exists(),
+            )
+        if self.status is not None:
+            query = query.where(Order.status == validate_status(self.status))
+        if self.created_before is not None:
+            query = query.where(Order.created_at < self.created_before)
+        if self.created_after is not None:
+            query = query.where(Order.created_at >= self.created_after)
+        return query
+
+
+def _chunks(ids: Iterable[int], size: int) -> Iterator[list[int]]:
+    chunk: list[int] = []
+    for order_id in ids:
+        chunk.append(int(order_id))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _narrowed_chunks(
+    chunks: Iterator[list[int]], flt: OrderFilter, result: BulkStatusResult
+) -> Iterator[list[int]]:
+    """Keep the ids of each chunk that match; report the others."""
+    for chunk in chunks:
+        matching = set(db.session.scalars(
+            flt.apply(select(Order.id).where(Order.id.in_(chunk)))
+        ))
+        for order_id in dict.fromkeys(chunk):
+            if order_id not in matching:
+                result.reject(order_id, "not_found")
+        yield [order_id for order_id in chunk if order_id in matching]
+
+
+def _filtered_chunks(flt: OrderFilter, size: int) -> Iterator[list[int]]:
+    """Walk matching order ids in primary key order, one page at a time."""
+    last_id = 0
+    while True:
+        ids = list(db.session.scalars(
+            flt.apply(select(Order.id).where(Order.id > last_id))
+            .order_by(Order.id)
+            .limit(size)
+        ))
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def _apply_chunk(
+    order_ids: list[int],
+    requested: str,
+    sources: frozenset[str],
+    note: Optional[str],
+    result: BulkStatusResult,
+) -> None:
+    current = dict(db.session.execute(
+        select(Order.id, Order.status).where(Order.id.in_(order_ids))
+    ).all())
+
+    by_source: dict[str, list[int]] = {}
+    for order_id in dict.fromkeys(order_ids):
+        status = current.get(order_id)
+        if status is None:
+            result.reject(order_id, "not_found")
+        elif status not in sources:
+            result.reject(order_id, f"invalid_transition_from_{status}")
+        else:
+            by_source.setdefault(status, []).append(order_id)
+
+    now = utcnow()
+    moved: list[tuple[int, str]] = []
+    for source, ids in sorted(by_source.items()):
+        changed = set(db.session.scalars(
+            update(Order)
+            .where(Order.id.in_(ids), Order.status == source)
+            .values(status=requested, updated_at=now)
+            .returning(Order.id)
+            .execution_options(synchronize_session=False)
+        ))
+        for order_id in ids:
+            if order_id in changed:
+                moved.append((order_id, source))
+            else:
+                result.reject(order_id, "changed_concurrently")
+
+    if not moved:
+        db.session.commit()
+        return
+
+    moved_ids = [order_id for order_id, _ in moved]
+    db.session.execute(
+        update(OrderItem)
+        .where(OrderItem.order_id.in_(moved_ids))
+        .values(status=requested)
+        .execution_options(synchronize_session=False)
+    )
+    if requested == "Cancelled":
+        reverse_orders(moved_ids)
+
+    events = db.session.execute(
+        insert(OrderHistory).returning(
+            OrderHistory.id,
+            OrderHistory.order_id,
+            OrderHistory.from_status,
+            OrderHistory.status,
+        ),
+        [
+            {
+                "order_id": order_id,
+                "from_status": source,
+                "status": requested,
+                "note": note,
+                "created_at": now,
+            }
+            for order_id, source in moved
+        ],
+    )
+    remember_events(db.session(), (dict(row._mapping) for row in events))
+    publish_many(ORDER_STATUS_CHANGED, "order", (
+        (order_id, {
+            "order_id": order_id,
+            "from_status": source,
+            "status": requested,
+            "note": note,
+        })
+        for order_id, source in moved
+    ))
+    db.session.commit()
+    result.updated += len(moved)
+
+
+def bulk_transition(
+    requested: str,
+    order_ids: Optional[Iterable[int]] = None,
+    order_filter: Optional[OrderFilter] = None,
+    note: Optional[str] = None,
+    chunk_size: int = 1000,
+) -> BulkStatusResult:
+    """
+    Move every selected order to ``requested``.
+
+    Orders are selected by explicit ids, by ``order_filter``, or both
+    (ids narrowed by the filter; ids it excludes are reported as
+    ``not_found``).
+    """
+    requested = validate_status(requested)
+    sources = allowed_sources(requested)
+    result = BulkStatusResult(status=requested)
+
+    if order_ids is not None:
+        chunks: Iterator[list[int]] = _chunks(order_ids, chunk_size)
+        if order_filter is not None:
+            chunks = _narrowed_chunks(chunks, order_filter, result)
+    elif order_filter is not None:
+        chunks = _filtered_chunks(order_filter, chunk_size)
+    else:
+        raise ValueError("Provide order ids or a filter")
+
+    try:
+        for chunk in chunks:
+            if chunk:
+                _apply_chunk(chunk, requested, sources, note, result)
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
+
+
+orders_cli = AppGroup("orders", help="Order maintenance.")
+
+
+@orders_cli.command("set-status")
+@click.argument("status")
+@click.option("--id", "ids", multiple=True, type=int,
+              help="Order id; may be repeated.")
+@click.option("--ids-file", type=click.File("r"),
+              help="File with one order id per line ('-' for stdin).")
+@click.option("--seller-id", type=int)
+@click.option("--from-status")
+@click.option("--created-before", type=click.DateTime())
+@click.option("--note")
+@click.option("--chunk-size", default=1000, show_default=True)
+def set_status_command(
+    status: str,
+    ids: tuple[int, ...],
+    ids_file: Optional[click.File],
+    seller_id: Optional[int],
+    from_status: Optional[str],
+    created_before: Optional[datetime],
+    note: Optional[str],
+    chunk_size: int,
+) -> None:
+    """Move many orders to STATUS at once."""
+    order_ids: Optional[list[int]] = list(ids) or None
+    if ids_file is not None:
+        order_ids = (order_ids or []) + [
+            int(line) for line in ids_file if line.strip()  # type: ignore
+        ]
+    order_filter = None
+    if seller_id or from_status or created_before:
+        order_filter = OrderFilter(
+            seller_id=seller_id,
+            status=from_status,
+            created_before=created_before,
+        )
+    try:
+        result = bulk_transition(
+            status, order_ids, order_filter, note, chunk_size
+        )
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    click.echo(
+        f"{result.updated} orders moved to {result.status}, "
+        f"{result.rejected_count} rejected"
+    )
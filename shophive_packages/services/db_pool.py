@@ -0,0 +1,174 @@
+"""
+Database connection pool setup and the startup self-check.
+
+``ProductionConfig`` builds ``SQLALCHEMY_ENGINE_OPTIONS`` from the
+environment (``config.postgres_engine_options``): a bounded QueuePool
+with pre-ping and recycling, and server-side statement and lock
+timeouts.  Behind PgBouncer in transaction pooling mode
+(``DB_PGBOUNCER``) a server connection is shared between clients, so
+session-level settings would leak and startup ``options`` are refused;
+``init_db_pool`` instead issues ``SET LOCAL`` at the start of every
+transaction.  psycopg2 never uses server-side prepared statements, so
+nothing else needs changing for PgBouncer.
+
+Each process may open ``pool_size + max_overflow`` connections, and
+every process (web workers, ``jobs work``, ``outbox dispatch``) has its
+own pool.  With ``DB_STARTUP_CHECK`` on, startup connects once, reads
+the server's ``max_connections`` and logs that budget, warning when the
+processes together could exhaust it.  ``flask pool check`` prints the
+same report on demand.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import click
+from flask import Flask, current_app
+from flask.cli import AppGroup
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, Engine
+
+from shophive_packages import db
+
+logger = logging.getLogger(__name__)
+
+# Connections left for migrations, cron jobs and humans with psql
+RESERVED_CONNECTIONS = 5
+
+
+@dataclass
+class PoolReport:
+    dialect: str
+    pool_class: str
+    pool_size: Optional[int]
+    max_overflow: Optional[int]
+    pool_timeout: Optional[float]
+    pool_recycle: Optional[int]
+    pre_ping: bool
+    processes: int
+    statement_timeout: Optional[str] = None
+    max_connections: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def per_process(self) -> Optional[int]:
+        if self.pool_size is None:
+            return None
+        return self.pool_size + max(self.max_overflow or 0, 0)
+
+    def problems(self) -> list[str]:
+        found = []
+        if self.error:
+            found.append(f"could not connect: {self.error}")
+        if self.per_process is not None and self.max_connections:
+            wanted = self.per_process * self.processes
+            available = self.max_connections - RESERVED_CONNECTIONS
+            if wanted > available:
+                found.append(
+                    f"{self.processes} processes x {self.per_process} "
+                    f"connections = {wanted} exceeds max_connections "
+                    f"{self.max_connections} less {RESERVED_CONNECTIONS} "
+                    "reserved; lower DB_POOL_SIZE/DB_MAX_OVERFLOW or put "
+                    "PgBouncer in front"
+                )
+        return found
+
+    def lines(self) -> list[str]:
+        if self.per_process is None:
+            pool = f"{self.pool_class} (unbounded)"
+        else:
+            pool = (f"{self.pool_class} size={self.pool_size} "
+                    f"overflow={self.max_overflow} "
+                    f"timeout={self.pool_timeout:g}s "
+                    f"recycle={self.pool_recycle}s "
+                    f"pre_ping={self.pre_ping}")
+        lines = [f"database: {self.dialect}", f"pool: {pool}"]
+        if self.per_process is not None:
+            lines.append(
+                f"connections: {self.per_process} per process x "
+                f"{self.processes} processes = "
+                f"{self.per_process * self.processes}"
+                + (f" of max_connections {self.max_connections}"
+                   if self.max_connections else "")
+            )
+        if self.statement_timeout is not None:
+            lines.append(f"statement_timeout: {self.statement_timeout}")
+        return lines
+
+
+def _set_local_timeouts(statement_ms: int, lock_ms: int) -> Any:
+    def on_begin(conn: Connection) -> None:
+        conn.exec_driver_sql(
+            f"SET LOCAL statement_timeout = {int(statement_ms)}; "
+            f"SET LOCAL lock_timeout = {int(lock_ms)}"
+        )
+    return on_begin
+
+
+def init_db_pool(app: Flask) -> None:
+    """Per-transaction timeouts behind PgBouncer; the startup check."""
+    config = app.config
+    if config.get("DB_PGBOUNCER") and db.engine.dialect.name == "postgresql":
+        event.listen(db.engine, "begin", _set_local_timeouts(
+            config["DB_STATEMENT_TIMEOUT_MS"], config["DB_LOCK_TIMEOUT_MS"]
+        ))
+    if config.get("DB_STARTUP_CHECK"):
+        report = pool_report(db.engine, config.get("DB_CLIENT_PROCESSES", 1))
+        for line in report.lines():
+            logger.info("%s", line)
+        for problem in report.problems():
+            logger.warning("Database pool: %s", problem)
+
+
+def pool_report(engine: Engine, processes: int = 1) -> PoolReport:
+    """Effective pool settings, and what the server allows."""
+    pool: Any = engine.pool
+    size = pool.size() if hasattr(pool, "size") else None
+    report = PoolReport(
+        dialect=engine.dialect.name,
+        pool_class=type(pool).__name__,
+        pool_size=size,
+        max_overflow=getattr(pool, "_max_overflow", None),
+        pool_timeout=pool.timeout() if hasattr(pool, "timeout") else None,
+        pool_recycle=getattr(pool, "_recycle", None),
+        pre_ping=bool(getattr(pool, "_pre_ping", False)),
+        processes=processes,
+    )
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            if engine.dialect.name == "postgresql":
+                report.max_connections = int(
+                    conn.exec_driver_sql("SHOW max_connections").scalar()
+                )
+                report.statement_timeout = str(
+                    conn.exec_driver_sql("SHOW statement_timeout").scalar()
+                )
+    except Exception as exc:
+        report.error = str(exc).splitlines()[0]
+    finally:
+        # Forked workers must not inherit the connection opened here
+        engine.dispose()
+    return report
+
+
+pool_cli = AppGroup("pool", help="Database connection pool.")
+
+
+@pool_cli.command("check")
+@click.option("--processes", type=int,
+              help="Processes sharing the database; defaults to "
+                   "DB_CLIENT_PROCESSES.")
+def check_command(processes: Optional[int]) -> None:
+    """Print the effective pool settings and connection budget."""
+    report = pool_report(
+        db.engine,
+        processes or current_app.config.get("DB_CLIENT_PROCESSES", 1),
+    )
+    for line in report.lines():
+        click.echo(line)
+    problems = report.problems()
+    for problem in problems:
+        click.echo(f"WARNING: {problem}", err=True)
+    if problems:
+        raise SystemExit(1)
@@ -0,0 +1,194 @@
+"""
+Carts for shoppers who are not logged in.
+
+By default a guest cart lives in the server-side session as
+``session["cart_items"]``, which gives every window-shopper who adds one
+item a stored session.  With ``GUEST_CART_COOKIE`` on, the cart is kept
+by the browser instead: a signed cookie holding only product ids and
+quantities, e.g. ``12-2_7-1.<signature>``.  Nothing about a guest's cart
+is stored on the server, a tampered cookie reads as an empty cart, and
+``GUEST_CART_MAX_LINES`` / ``GUEST_CART_MAX_QUANTITY`` keep the cookie
+well under the browser limit.
+
+Prices are never taken from the client.  ``price_guest_cart`` resolves
+every line in one query, and lines whose product no longer exists are
+dropped.  ``merge_guest_cart`` folds the guest cart into the buyer's
+``cart`` rows on login with one query and one commit, then clears it.
+"""
+import re
+from decimal import Decimal
+from typing import Any
+
+from flask import (
+    Response, after_this_request, current_app, request, session
+)
+from itsdangerous import BadSignature, Signer
+from sqlalchemy import and_, select
+
+from shophive_packages import db
+from shophive_packages.models.cart import Cart
+from shophive_packages.models.product import Product
+
+SALT = "shophive.guest-cart"
+
+# Per-request copy of the cart, kept in the WSGI environ
+ENVIRON_KEY = "shophive.guest_cart"
+
+# Longest cookie value accepted; anything larger is not ours
+MAX_COOKIE_BYTES = 1024
+
+_LINE_RE = re.compile(r"^(\d{1,10})-(\d{1,4})$")
+
+
+def _cookie_mode() -> bool:
+    return bool(current_app.config.get("GUEST_CART_COOKIE", False))
+
+
+def in_cookie() -> bool:
+    """Whether guest carts live in the cookie rather than the session."""
+    return _cookie_mode()
+
+
+def _signer() -> Signer:
+    return Signer(current_app.secret_key, salt=SALT)
+
+
+def _bounded(items: list[dict]) -> list[dict]:
+    """Merge repeated products and clamp to the configured limits."""
+    max_lines = current_app.config.get("GUEST_CART_MAX_LINES", 50)
+    max_quantity = current_app.config.get("GUEST_CART_MAX_QUANTITY", 99)
+    lines: dict[int, int] = {}
+    for item in items:
+        product_id, quantity = int(item["product_id"]), int(item["quantity"])
+        if quantity <= 0:
+            continue
+        if product_id not in lines and len(lines) >= max_lines:
+            continue
+        lines[product_id] = min(lines.get(product_id, 0) + quantity,
+                                max_quantity)
+    return [{"product_id": p, "quantity": q} for p, q in lines.items()]
+
+
+def encode_cart(items: list[dict]) -> str:
+    payload = "_".join(
+        f"{item['product_id']}-{item['quantity']}" for item in items
+    )
+    return _signer().sign(payload).decode("ascii")
+
+
+def decode_cart(value: str) -> list[dict]:
+    """The lines in a cart cookie; empty if it is not one we signed."""
+    if not value or len(value) > MAX_COOKIE_BYTES:
+        return []
+    try:
+        payload = _signer().unsign(value).decode("ascii")
+    except BadSignature:
+        return []
+    items = []
+    for line in payload.split("_") if payload else ():
+        match = _LINE_RE.match(line)
+        if match is None:
+            return []
+        items.append({"product_id": int(match.group(1)),
+                      "quantity": int(match.group(2))})
+    return _bounded(items)
+
+
+def get_guest_cart() -> list[dict]:
+    """The guest's cart as ``[{"product_id": ..., "quantity": ...}]``."""
+    if not _cookie_mode():
+        return list(session.get("cart_items", []))
+    if ENVIRON_KEY not in request.environ:
+        name = current_app.config.get("GUEST_CART_COOKIE_NAME",
+                                      "shophive_cart")
+        request.environ[ENVIRON_KEY] = decode_cart(
+            request.cookies.get(name, "")
+        )
+    return list(request.environ[ENVIRON_KEY])
+
+
+def _write_cookie(response: Response) -> Response:
+    config = current_app.config
+    name = config.get("GUEST_CART_COOKIE_NAME", "shophive_cart")
+    items = request.environ[ENVIRON_KEY]
+    if not items:
+        response.delete_cookie(name, samesite="Lax")
+        return response
+    response.set_cookie(
+        name,
+        encode_cart(items),
+        max_age=int(config["GUEST_CART_COOKIE_MAX_AGE"].total_seconds()),
+        httponly=True,
+        secure=config.get("SESSION_COOKIE_SECURE", False),
+        samesite="Lax",
+    )
+    return response
+
+
+def save_guest_cart(items: list[dict]) -> None:
+    """Replace the guest's cart; sent as a cookie with this response."""
+    if not _cookie_mode():
+        session["cart_items"] = items
+        return
+    if ENVIRON_KEY + ".dirty" not in request.environ:
+        after_this_request(_write_cookie)
+        request.environ[ENVIRON_KEY + ".dirty"] = True
+    request.environ[ENVIRON_KEY] = _bounded(items)
+
+
+def clear_guest_cart() -> None:
+    if _cookie_mode():
+        save_guest_cart([])
+    else:
+        session.pop("cart_items", None)
+        session.pop("cart_total", None)
+
+
+def price_guest_cart(
+    items: list[dict]
+) -> tuple[list[tuple[Product, int]], Decimal]:
+    """The guest's lines with their products, and the total, in one query."""
+    wanted = {int(item["product_id"]): int(item["quantity"])
+              for item in items}
+    if not wanted:
+        return [], Decimal("0")
+    products = {
+        product.id: product
+        for product in db.session.scalars(
+            select(Product).where(Product.id.in_(wanted))
+        )
+    }
+    lines = [(products[product_id], quantity)
+             for product_id, quantity in wanted.items()
+             if product_id in products]
+    total = sum((Decimal(str(product.price)) * quantity
+                 for product, quantity in lines), Decimal("0"))
+    return lines, total
+
+
+def merge_guest_cart(user: Any) -> None:
+    """Fold the guest cart into ``user``'s cart rows and clear it."""
+    items = get_guest_cart()
+    if not items:
+        return
+    if getattr(user, "role", "buyer") == "seller":
+        clear_guest_cart()  # sellers have no cart
+        return
+    wanted: dict[int, int] = {}
+    for item in items:
+        product_id = int(item["product_id"])
+        wanted[product_id] = wanted.get(product_id, 0) + int(item["quantity"])
+    # Products that still exist, with the buyer's line for each if any
+    rows = db.session.execute(
+        select(Product.id, Cart)
+        .outerjoin(Cart, and_(Cart.product_id == Product.id,
+                              Cart.user_id == user.id))
+        .where(Product.id.in_(wanted))
+    ).all()
+    for product_id, line in rows:
+        if line is not None:
+            line.quantity += wanted[product_id]
+        else:
+            db.session.add(Cart(user.id, product_id, wanted[product_id]))
+    db.session.commit()
+    clear_guest_cart()
@@ -0,0 +1,247 @@
+"""
+Idempotency keys for endpoints that create orders.
+
+A client sends the same ``Idempotency-Key`` header (or ``idempotency_key``
+form field) on every retry of one logical request.  The first request
+claims the key through the unique index on ``idempotency_keys`` and its
+response is cached for ``IDEMPOTENCY_TTL`` seconds; retries replay the
+cached response, and retries that arrive while the first request is still
+running wait for it instead of placing a second order.
+
+A claimed key is leased for ``IDEMPOTENCY_LEASE_SECONDS`` until its
+response is stored (``expires_at`` holds the lease, then the replay
+window).  If the process handling the first request dies, a retry after
+the lease can claim the key again instead of getting 409 for a day.
+``flask idempotency purge`` deletes expired keys; run it from cron.
+"""
+import hashlib
+import time
+from datetime import timedelta
+from functools import wraps
+from typing import Any, Callable, Optional, TypeVar, cast
+
+import click
+from flask import Response, current_app, jsonify, make_response, request
+from flask.cli import AppGroup
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+from shophive_packages import db
+from shophive_packages.db_utils import utcnow
+from shophive_packages.models.idempotency import IdempotencyKey
+from shophive_packages.services.identity_service import request_identity
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_FIELD = "idempotency_key"
+REPLAY_HEADER = "Idempotent-Replayed"
+
+
+def _request_key() -> Optional[str]:
+    """Idempotency key sent with the current request, if any."""
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key and request.form:
+        key = request.form.get(IDEMPOTENCY_FIELD)
+    if key:
+        return key.strip()[:255] or None
+    return None
+
+
+def _fingerprint() -> str:
+    """Hash of who is asking and what they asked for."""
+    owner = request_identity() or ""
+    digest = hashlib.sha256()
+    for part in (request.method, request.path, owner):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    if request.form:
+        for name, value in sorted(request.form.items(multi=True)):
+            if name != IDEMPOTENCY_FIELD:
+                digest.update(f"{name}={value}\0".encode())
+    else:
+        digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def _find(scope: str, key: str) -> Optional[IdempotencyKey]:
+    return cast(
+        Optional[IdempotencyKey],
+        db.session.scalars(
+            select(IdempotencyKey)
+            .where(IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+            .execution_options(populate_existing=True)
+        ).first(),
+    )
+
+
+def _claim(scope: str, key: str, fingerprint: str) -> bool:
+    """Insert the key; ``False`` if another request already holds it."""
+    lease = current_app.config.get("IDEMPOTENCY_LEASE_SECONDS", 120)
+    db.session.add(
+        IdempotencyKey(
+            scope=scope,
+            key=key,
+            fingerprint=fingerprint,
+            status="in_progress",
+            expires_at=utcnow() + timedelta(seconds=lease),
+        )
+    )
+    try:
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+
+def _release(scope: str, key: str, expired_only: bool = False) -> None:
+    """
+    Forget a key whose request failed so the client can retry it.
+
+    With ``expired_only`` a key another retry has just claimed again is
+    left alone.
+    """
+    db.session.rollback()
+    query = delete(IdempotencyKey).where(
+        IdempotencyKey.scope == scope, IdempotencyKey.key == key
+    )
+    if expired_only:
+        query = query.where(IdempotencyKey.expires_at <= utcnow())
+    db.session.execute(query.execution_options(synchronize_session="fetch"))
+    db.session.commit()
+
+
+def _store(scope: str, key: str, response: Response) -> None:
+    record = _find(scope, key)
+    if record is None:
+        return
+    ttl = current_app.config.get("IDEMPOTENCY_TTL", 86400)
+    record.status = "completed"
+    record.expires_at = utcnow() + timedelta(seconds=ttl)
+    record.response_status = response.status_code
+    record.response_body = response.get_data(as_text=True)
+    record.response_mimetype = response.mimetype
+    record.response_location = response.headers.get("Location")
+    db.session.commit()
+
+
+def _replay(record: IdempotencyKey) -> Response:
+    response = make_response(
+        record.response_body or "", record.response_status or 200
+    )
+    if record.response_mimetype:
+        response.mimetype = record.response_mimetype
+    if record.response_location:
+        response.headers["Location"] = record.response_location
+    response.headers[REPLAY_HEADER] = "true"
+    return response
+
+
+def _conflict(message: str, status: int) -> Response:
+    return make_response(jsonify({"status": "error", "message": message}),
+                         status)
+
+
+def _wait_for(scope: str, key: str) -> Optional[IdempotencyKey]:
+    """Poll until the first request finishes or the wait budget runs out."""
+    deadline = time.monotonic() + current_app.config.get(
+        "IDEMPOTENCY_WAIT_SECONDS", 10
+    )
+    delay = 0.01
+    while True:
+        record = _find(scope, key)
+        if record is not None:
+            db.session.expunge(record)  # keep its values past the rollback
+        # End this poll's transaction before sleeping, so no connection or
+        # write lock is held while the first request finishes
+        db.session.rollback()
+        if record is None or record.status == "completed":
+            return record
+        if time.monotonic() >= deadline:
+            return record
+        time.sleep(delay)
+        delay = min(delay * 2, 0.25)
+
+
+def purge_expired_keys() -> int:
+    """Delete idempotency keys past their replay window."""
+    result = db.session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.expires_at <= utcnow())
+    )
+    db.session.commit()
+    return int(result.rowcount or 0)
+
+
+def _claim_or_answer(
+    scope: str, key: str, fingerprint: str
+) -> Optional[Response]:
+    """
+    Claim ``key`` for this request, or return the response to send instead
+    (a replay of the first request, or a conflict).
+    """
+    for _ in range(2):
+        if _claim(scope, key, fingerprint):
+            return None
+        record = _wait_for(scope, key)
+        if record is None:
+            continue  # first attempt failed and released the key
+        if record.expires_at <= utcnow():
+            # Replay window over, or the first request's lease ran out
+            # without a response
+            _release(scope, key, expired_only=True)
+            continue
+        if record.fingerprint != fingerprint:
+            return _conflict(
+                "Idempotency-Key was reused with a different request", 422
+            )
+        if record.status != "completed":
+            return _conflict(
+                "A request with this Idempotency-Key is still being "
+                "processed", 409
+            )
+        return _replay(record)
+    return _conflict("Could not acquire Idempotency-Key", 409)
+
+
+def idempotent(scope: str) -> Callable[[F], F]:
+    """
+    Make a POST view safe to retry with an idempotency key.
+
+    Requests without a key, and non-POST requests, run unchanged.
+    """
+
+    def decorator(view: F) -> F:
+        @wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            key = _request_key()
+            if request.method != "POST" or not key:
+                return view(*args, **kwargs)
+
+            answer = _claim_or_answer(scope, key, _fingerprint())
+            if answer is not None:
+                return answer
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                _release(scope, key)
+                raise
+            if response.status_code >= 500:
+                _release(scope, key)
+            else:
+                _store(scope, key, response)
+            return response
+
+        return cast(F, wrapper)
+
+    return decorator
+
+
+idempotency_cli = AppGroup("idempotency", help="Idempotency keys.")
+
+
+@idempotency_cli.command("purge")
+def purge_command() -> None:
+    """Delete idempotency keys past their replay window or lease."""
+    click.echo(f"Purged {purge_expired_keys()} expired idempotency keys")
@@ -0,0 +1,178 @@
+"""
+Cached identities for Flask-Login.
+
+``load_user`` runs on every authenticated request.  Instead of an ORM
+``User`` it returns a ``CachedIdentity``: a small detached copy of the
+columns request code reads from ``current_user``, kept per process for
+``IDENTITY_CACHE_TTL`` seconds under the session token (``user_<id>`` or
+``seller_<id>``).  Because the copy belongs to no session, one request's
+session state can never leak into another.  Expired entries are dropped
+as new ones arrive and at most ``IDENTITY_CACHE_MAX_ENTRIES`` are kept.
+
+Code that changes a user's profile or password calls
+``invalidate_identity`` after committing.  Other processes pick up the
+change when their entry expires, so the TTL bounds how stale an identity
+can be.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from flask import Flask, current_app
+from flask_jwt_extended import get_jwt
+from flask_login import UserMixin, current_user  # type: ignore
+
+from shophive_packages import db
+from shophive_packages.models.user import Seller, User
+
+
+@dataclass(frozen=True)
+class CachedIdentity(UserMixin):
+    """The logged-in user as seen by request code."""
+
+    id: int
+    username: str
+    email: str
+    role: str
+    created_at: Optional[datetime]
+    is_seller: bool
+
+    # Cart helpers only need ``self.id``
+    get_cart = User.get_cart
+    get_cart_total = User.get_cart_total
+    add_to_cart = User.add_to_cart
+
+    @classmethod
+    def from_user(cls, user: User) -> "CachedIdentity":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            role=user.role,
+            created_at=user.created_at,
+            is_seller=isinstance(user, Seller),
+        )
+
+    def get_id(self) -> str:
+        return f"{'seller' if self.is_seller else 'user'}_{self.id}"
+
+
+class IdentityCache:
+    """
+    Thread-safe token -> identity map with a fixed time to live.
+
+    Entries are kept in the order they were stored, which with one TTL is
+    also the order they expire in, so ``put`` drops expired entries from
+    the front.  At most ``max_entries`` are kept; the oldest go first.
+    """
+
+    def __init__(self, max_entries: int = 10000) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, CachedIdentity]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[CachedIdentity]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[token]
+                return None
+            return entry[1]
+
+    def put(self, token: str, identity: CachedIdentity, ttl: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._entries.pop(token, None)
+            self._entries[token] = (now + ttl, identity)
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or next(iter(self._entries.values()))[0] <= now
+            ):
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def invalidate(self, token: str) -> None:
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+EXTENSION_KEY = "identity_cache"
+
+
+def init_identity_cache(app: Flask) -> None:
+    app.extensions[EXTENSION_KEY] = IdentityCache(
+        app.config.get("IDENTITY_CACHE_MAX_ENTRIES", 10000)
+    )
+
+
+def get_identity_cache() -> IdentityCache:
+    cache = current_app.extensions[EXTENSION_KEY]
+    return cache  # type: ignore[no-any-return]
+
+
+def _load(token: str) -> Optional[CachedIdentity]:
+    kind, _, id_str = token.partition("_")
+    if kind not in ("user", "seller"):
+        return None
+    try:
+        user_id = int(id_str)
+    except ValueError:
+        return None
+    user = db.session.get(User, user_id)
+    if user is None or isinstance(user, Seller) != (kind == "seller"):
+        return None
+    return CachedIdentity.from_user(user)
+
+
+def load_identity(token: str) -> Optional[CachedIdentity]:
+    """Resolve a Flask-Login session token, from cache when possible."""
+    cache = get_identity_cache()
+    identity = cache.get(token)
+    if identity is not None:
+        return identity
+    identity = _load(token)
+    ttl = current_app.config.get("IDENTITY_CACHE_TTL", 30)
+    if identity is not None and ttl > 0:
+        cache.put(token, identity, ttl)
+    return identity
+
+
+def load_current_user() -> Optional[User]:
+    """The logged-in user's ORM row, for code that needs to change it."""
+    # Polymorphic load: sellers come back as ``Seller``
+    return db.session.get(User, current_user.id)
+
+
+def request_identity() -> Optional[str]:
+    """
+    The caller's ``user_<id>``/``seller_<id>`` token, from a verified API
+    token or else the login session; None for anonymous requests.
+    """
+    try:
+        subject = get_jwt().get("sub")
+    except RuntimeError:  # no token was verified for this request
+        subject = None
+    if subject:
+        return str(subject)
+    if current_user and current_user.is_authenticated:
+        return str(current_user.get_id())
+    return None
+
+
+def invalidate_identity(token: str) -> None:
+    """Forget a cached identity after its user row changed."""
+    get_identity_cache().invalidate(token)
@@ -0,0 +1,221 @@
+"""
+Stock accounting for checkout.
+
+Stock is only ever taken with a conditional ``UPDATE`` of the form
+``SET quantity = quantity - n WHERE quantity >= n`` so the database, not
+the application, decides whether enough units are left.  None of the
+helpers here commit: callers add their order rows to the same session and
+commit once, or roll back to undo every line of the order together.
+
+Checkout holds are handed back by the job worker: ``hold_stock`` makes
+sure an ``inventory.release_expired`` job is queued for when the hold
+runs out, in the same transaction as the hold.  There is at most one such
+job at a time: it sweeps every expired row by the indexed ``expires_at``
+and then queues itself again for the next hold to expire.  Holds survive
+restarts and are released whichever process took them.
+"""
+from datetime import datetime, timedelta
+from typing import Iterable, Mapping, Optional
+
+from sqlalchemy import delete, func, select, update
+
+from shophive_packages import db
+from shophive_packages.db_utils import utcnow
+from shophive_packages.models.inventory import StockReservation
+from shophive_packages.models.orders import OrderItem
+from shophive_packages.models.product import Product
+from shophive_packages.services.task_queue import ensure_queued, task
+
+RELEASE_EXPIRED = "inventory.release_expired"
+
+
+class InsufficientStockError(ValueError):
+    """Raised when a product does not have enough units left."""
+
+    def __init__(self, product_id: int, requested: int) -> None:
+        super().__init__(
+            f"Not enough stock for product {product_id} "
+            f"(requested {requested})"
+        )
+        self.product_id = product_id
+        self.requested = requested
+
+
+def _merge_lines(lines: Iterable[tuple[int, int]]) -> dict[int, int]:
+    """Sum quantities per product and drop non-positive lines."""
+    merged: dict[int, int] = {}
+    for product_id, quantity in lines:
+        merged[int(product_id)] = merged.get(int(product_id), 0) + quantity
+    return {pid: qty for pid, qty in merged.items() if qty > 0}
+
+
+def _take(product_id: int, quantity: int) -> None:
+    """Atomically take ``quantity`` units of a product or raise."""
+    result = db.session.execute(
+        update(Product)
+        .where(Product.id == product_id, Product.quantity >= quantity)
+        .values(quantity=Product.quantity - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        raise InsufficientStockError(product_id, quantity)
+
+
+def _give_back(product_id: int, quantity: int) -> None:
+    """Return ``quantity`` units of a product to stock."""
+    db.session.execute(
+        update(Product)
+        .where(Product.id == product_id)
+        .values(quantity=Product.quantity + quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reserve_stock(lines: Mapping[int, int]) -> None:
+    """
+    Take stock for every ``{product_id: quantity}`` line of an order.
+
+    Products are locked in id order so two concurrent orders over the same
+    products cannot deadlock.  If any line cannot be satisfied
+    ``InsufficientStockError`` is raised and the caller must roll back the
+    session to restore the lines that were already taken.
+    """
+    for product_id, quantity in sorted(_merge_lines(lines.items()).items()):
+        _take(product_id, quantity)
+
+
+def record_sales(lines: Mapping[int, int]) -> None:
+    """Add sold quantities to ``Product.sales`` for the given lines."""
+    for product_id, quantity in sorted(_merge_lines(lines.items()).items()):
+        db.session.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(sales=db.func.coalesce(Product.sales, 0) + quantity)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _release_rows(rows: Iterable[StockReservation]) -> dict[int, int]:
+    """
+    Delete reservation rows one by one and return the units each held.
+
+    A row only counts if this call actually deleted it, so a checkout and
+    an expiry sweep racing for the same hold cannot both use its stock.
+    """
+    released: dict[int, int] = {}
+    for row in rows:
+        result = db.session.execute(
+            delete(StockReservation)
+            .where(StockReservation.id == row.id)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            released[row.product_id] = (
+                released.get(row.product_id, 0) + row.quantity
+            )
+    return released
+
+
+def _user_reservations(user_id: int) -> list[StockReservation]:
+    return list(
+        db.session.scalars(
+            select(StockReservation).where(
+                StockReservation.user_id == user_id
+            )
+        )
+    )
+
+
+def hold_stock(
+    user_id: int, lines: Mapping[int, int], ttl_seconds: int
+) -> datetime:
+    """
+    Hold stock for a buyer's cart for ``ttl_seconds``.
+
+    Any earlier holds of the same buyer are replaced, and the job that
+    hands stock back is made due by the new expiry.  Raises
+    ``InsufficientStockError`` if the cart cannot be held in full.
+    Returns the expiry time of the new holds.
+    """
+    released = _release_rows(_user_reservations(user_id))
+    for product_id, quantity in sorted(released.items()):
+        _give_back(product_id, quantity)
+
+    expires_at = utcnow() + timedelta(seconds=ttl_seconds)
+    merged = _merge_lines(lines.items())
+    reserve_stock(merged)
+    db.session.add_all(
+        StockReservation(
+            user_id=user_id,
+            product_id=product_id,
+            quantity=quantity,
+            expires_at=expires_at,
+        )
+        for product_id, quantity in merged.items()
+    )
+    ensure_queued(RELEASE_EXPIRED, expires_at)
+    return expires_at
+
+
+def claim_stock(user_id: int, lines: Mapping[int, int]) -> None:
+    """
+    Take stock for an order, using the buyer's holds first.
+
+    Held units are converted into the order, any shortfall is taken with
+    a conditional update and any surplus hold is returned to stock.
+    """
+    held = _release_rows(_user_reservations(user_id))
+    wanted = _merge_lines(lines.items())
+    for product_id in sorted(set(held) | set(wanted)):
+        delta = wanted.get(product_id, 0) - held.get(product_id, 0)
+        if delta > 0:
+            _take(product_id, delta)
+        elif delta < 0:
+            _give_back(product_id, -delta)
+
+
+def restock_order(order_id: int) -> None:
+    """Return the units of an order that will not be fulfilled to stock."""
+    rows = db.session.execute(
+        select(OrderItem.product_id, func.sum(OrderItem.quantity))
+        .where(OrderItem.order_id == order_id)
+        .group_by(OrderItem.product_id)
+    ).all()
+    for product_id, quantity in sorted(rows):
+        _give_back(product_id, int(quantity))
+
+
+def release_expired_reservations(now: Optional[datetime] = None) -> int:
+    """
+    Return the stock of every expired hold and commit.
+
+    Returns the number of expired reservations that were found.
+    """
+    now = now or utcnow()
+    expired = list(
+        db.session.scalars(
+            select(StockReservation).where(StockReservation.expires_at <= now)
+        )
+    )
+    if not expired:
+        return 0
+    try:
+        released = _release_rows(expired)
+        for product_id, quantity in sorted(released.items()):
+            _give_back(product_id, quantity)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(expired)
+
+
+@task(RELEASE_EXPIRED)
+def release_expired_task(payload: dict) -> None:
+    release_expired_reservations()
+    next_expiry = db.session.scalar(
+        select(func.min(StockReservation.expires_at))
+    )
+    if next_expiry is not None:
+        ensure_queued(RELEASE_EXPIRED, next_expiry)
+        db.session.commit()
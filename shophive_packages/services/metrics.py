@@ -0,0 +1,233 @@
+"""
+Prometheus metrics, served at ``/metrics``.
+
+Recorded per request, in an ``after_request`` hook:
+
+* ``shophive_http_request_duration_seconds``: latency by blueprint,
+  endpoint, method and status.  The histogram's ``_count`` is the
+  request count.
+* ``shophive_db_seconds`` and ``shophive_db_queries``: time in the
+  database and statements run by the same request, from
+  ``services.sql_instrumentation``.
+
+Recorded where it happens:
+
+* ``shophive_db_pool_in_use`` / ``shophive_db_pool_capacity``:
+  connections checked out of each engine's pool and how many it may
+  hold, per engine (``primary``, ``replica1``, ...).
+* ``shophive_cache_lookups_total``: identity cache lookups by result;
+  hits over all lookups is the hit ratio.
+* ``shophive_session_store_seconds``: session backend latency by
+  backend and operation.
+
+Every gunicorn worker has its own memory.  Set
+``PROMETHEUS_MULTIPROC_DIR`` to an empty directory in the environment of
+the server (``gunicorn.conf.py`` clears it at startup and drops the
+gauges of dead workers).  Each worker then writes its values to
+memory-mapped files there, and a scrape of any worker adds up all of
+them.  Without it the numbers are this process's own.
+
+Recording costs a few label lookups and counter updates per request,
+microseconds either way.
+
+Endpoint names and pool sizes are not for the public: scrapes must send
+``METRICS_TOKEN`` as a bearer token.  Without a token ``/metrics``
+answers 404, unless ``METRICS_PUBLIC`` says the app is only reachable by
+the scraper (an internal port).  Metrics are only on by default when one
+of the two is set.
+"""
+import hmac
+import os
+import time
+from typing import Any, Optional
+
+from flask import Flask, Response, abort, current_app, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+    Histogram, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from shophive_packages import db
+from shophive_packages.services.sql_instrumentation import current_stats
+
+# request.environ key holding the request's start time
+STARTED_KEY = "shophive.request_started"
+
+REQUEST_SECONDS = Histogram(
+    "shophive_http_request_duration_seconds",
+    "Time to handle a request, until the response is returned.",
+    ["blueprint", "endpoint", "method", "status"],
+)
+DB_SECONDS = Histogram(
+    "shophive_db_seconds",
+    "Time one request spent waiting on the database.",
+    ["blueprint", "endpoint"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+             2.5),
+)
+DB_QUERIES = Histogram(
+    "shophive_db_queries",
+    "SQL statements run by one request.",
+    ["blueprint", "endpoint"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200),
+)
+POOL_IN_USE = Gauge(
+    "shophive_db_pool_in_use",
+    "Database connections checked out of the pool.",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+POOL_CAPACITY = Gauge(
+    "shophive_db_pool_capacity",
+    "Connections the pool may hold (pool_size + max_overflow).",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+CACHE_LOOKUPS = Counter(
+    "shophive_cache_lookups",
+    "Cache lookups by cache and result (hit or miss).",
+    ["cache", "result"],
+)
+SESSION_STORE_SECONDS = Histogram(
+    "shophive_session_store_seconds",
+    "Latency of session backend calls.",
+    ["backend", "operation"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+             0.05, 0.1),
+)
+
+
+class TimedStore:
+    """Wraps a session store and times every call to it."""
+
+    def __init__(self, inner: Any, backend: str) -> None:
+        self.inner = inner
+        self._load = SESSION_STORE_SECONDS.labels(backend, "load")
+        self._save = SESSION_STORE_SECONDS.labels(backend, "save")
+        self._delete = SESSION_STORE_SECONDS.labels(backend, "delete")
+
+    def get(self, sid: str) -> Optional[bytes]:
+        started = time.perf_counter()
+        try:
+            return self.inner.get(sid)  # type: ignore[no-any-return]
+        finally:
+            self._load.observe(time.perf_counter() - started)
+
+    def set(self, sid: str, data: bytes, ttl: int) -> None:
+        started = time.perf_counter()
+        try:
+            self.inner.set(sid, data, ttl)
+        finally:
+            self._save.observe(time.perf_counter() - started)
+
+    def delete(self, sid: str) -> None:
+        started = time.perf_counter()
+        try:
+            self.inner.delete(sid)
+        finally:
+            self._delete.observe(time.perf_counter() - started)
+
+
+class CountedCache:
+    """Wraps a cache and counts hits and misses of ``get``."""
+
+    def __init__(self, inner: Any, name: str) -> None:
+        self.inner = inner
+        self._hits = CACHE_LOOKUPS.labels(name, "hit")
+        self._misses = CACHE_LOOKUPS.labels(name, "miss")
+
+    def get(self, key: str) -> Any:
+        value = self.inner.get(key)
+        (self._misses if value is None else self._hits).inc()
+        return value
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.inner, name)
+
+
+def _watch_pool(engine: Engine, name: str) -> None:
+    pool: Any = engine.pool
+    if hasattr(pool, "size"):
+        POOL_CAPACITY.labels(name).set(
+            pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+        )
+    in_use = POOL_IN_USE.labels(name)
+    event.listen(engine, "checkout", lambda *args: in_use.inc())
+    event.listen(engine, "checkin", lambda *args: in_use.dec())
+
+
+def _start_timer(wsgi_app: Any) -> Any:
+    def timed(environ: dict, start_response: Any) -> Any:
+        environ[STARTED_KEY] = time.perf_counter()
+        return wsgi_app(environ, start_response)
+    return timed
+
+
+# Label children by (blueprint, endpoint, method, status); labels() takes
+# a lock and validates its arguments on every call
+_children: dict[tuple[str, str, str, str], tuple[Any, Any, Any]] = {}
+
+
+def _record(response: Response) -> Response:
+    started = request.environ.get(STARTED_KEY)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    key = (request.blueprint or "app", request.endpoint or "unmatched",
+           request.method, str(response.status_code))
+    children = _children.get(key)
+    if children is None:
+        children = _children[key] = (
+            REQUEST_SECONDS.labels(*key),
+            DB_SECONDS.labels(*key[:2]),
+            DB_QUERIES.labels(*key[:2]),
+        )
+    request_seconds, db_seconds, db_queries = children
+    request_seconds.observe(elapsed)
+    stats = current_stats()
+    db_seconds.observe(stats.seconds if stats else 0.0)
+    db_queries.observe(stats.count if stats else 0)
+    return response
+
+
+def render_metrics() -> bytes:
+    """The exposition text, for all workers in multiprocess mode."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def metrics_view() -> Response:
+    token = current_app.config.get("METRICS_TOKEN")
+    if not token and not current_app.config.get("METRICS_PUBLIC"):
+        abort(404)
+    if token and not hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return Response("Unauthorized\n", 401,
+                        {"WWW-Authenticate": "Bearer"})
+    return Response(render_metrics(), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app: Flask) -> None:
+    if not app.config.get("METRICS_ENABLED"):
+        return
+    for key, engine in db.engines.items():
+        _watch_pool(engine, key or "primary")
+    interface = getattr(app.session_interface, "inner",
+                        app.session_interface)
+    if hasattr(interface, "store"):
+        interface.store = TimedStore(
+            interface.store, app.config.get("SESSION_BACKEND", "sql")
+        )
+    if "identity_cache" in app.extensions:
+        app.extensions["identity_cache"] = CountedCache(
+            app.extensions["identity_cache"], "identity"
+        )
+    app.wsgi_app = _start_timer(app.wsgi_app)  # type: ignore[method-assign]
+    app.after_request(_record)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
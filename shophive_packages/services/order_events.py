@@ -0,0 +1,238 @@
+"""
+Fan-out of order status changes to Server-Sent Events subscribers.
+
+Every committed ``OrderHistory`` row is published to a broker.  The
+in-process broker delivers straight to local subscribers; the Redis
+broker publishes to a channel and runs one listener thread per process
+that fans messages out to that process's subscribers, so thousands of
+open streams share a single Redis connection.  If that connection drops
+the listener reconnects with backoff and tells every stream to resync,
+since events published meanwhile are lost.
+
+Subscribers only hold a bounded buffer and a condition variable.  Under
+an async gunicorn worker (``-k gevent``) waiting on that condition is a
+greenlet switch, so an idle stream does not pin an OS thread.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Iterable, Optional
+
+from flask import Flask, current_app, has_app_context
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from shophive_packages.models.orders import OrderHistory
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_KEY = "order_events"
+PENDING_KEY = "pending_order_events"
+
+
+class Subscription:
+    """A bounded buffer of events for one stream connection."""
+
+    def __init__(self, order_ids: Iterable[int], maxsize: int = 100) -> None:
+        self.order_ids = frozenset(order_ids)
+        self.maxsize = maxsize
+        self.overflowed = False
+        self._buffer: deque[dict] = deque()
+        self._cond = threading.Condition()
+
+    def push(self, payload: dict) -> None:
+        with self._cond:
+            if len(self._buffer) >= self.maxsize:
+                # A slow reader loses the oldest events and is told to
+                # resync instead of growing memory without bound.
+                self._buffer.popleft()
+                self.overflowed = True
+            self._buffer.append(payload)
+            self._cond.notify()
+
+    def resync(self) -> None:
+        """Tell the reader it may have missed events."""
+        with self._cond:
+            self.overflowed = True
+            self._cond.notify()
+
+    def drain(self, timeout: float) -> list[dict]:
+        """Wait up to ``timeout`` seconds and return buffered events."""
+        with self._cond:
+            if not self._buffer:
+                self._cond.wait(timeout)
+            events = list(self._buffer)
+            self._buffer.clear()
+            return events
+
+
+class InProcessBroker:
+    """Delivers events to subscribers in the current process only."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._by_order: dict[int, set[Subscription]] = {}
+
+    def subscribe(
+        self, order_ids: Iterable[int], maxsize: int = 100
+    ) -> Subscription:
+        sub = Subscription(order_ids, maxsize)
+        with self._lock:
+            for order_id in sub.order_ids:
+                self._by_order.setdefault(order_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            for order_id in sub.order_ids:
+                subs = self._by_order.get(order_id)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._by_order[order_id]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len({s for subs in self._by_order.values() for s in subs})
+
+    def resync_all(self) -> None:
+        with self._lock:
+            subs = {s for subs in self._by_order.values() for s in subs}
+        for sub in subs:
+            sub.resync()
+
+    def deliver(self, payload: dict) -> None:
+        with self._lock:
+            subs = list(self._by_order.get(payload["order_id"], ()))
+        for sub in subs:
+            sub.push(payload)
+
+    def publish(self, payload: dict) -> None:
+        self.deliver(payload)
+
+
+class RedisBroker(InProcessBroker):
+    """Publishes through a Redis channel shared by every worker."""
+
+    # Seconds between reconnect attempts, doubling up to the maximum
+    RECONNECT_DELAY = 0.5
+    RECONNECT_MAX_DELAY = 30.0
+
+    def __init__(self, url: str, channel: str = "shophive:orders") -> None:
+        import redis  # type: ignore
+
+        super().__init__()
+        self.channel = channel
+        self._redis = redis.Redis.from_url(url)
+        self._listener: Optional[threading.Thread] = None
+        self._listener_lock = threading.Lock()
+
+    def _listen_once(self, reconnected: bool) -> None:
+        """Deliver messages until the connection fails."""
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(self.channel)
+            if reconnected:
+                # Anything published while we were away is lost
+                self.resync_all()
+            for message in pubsub.listen():
+                try:
+                    self.deliver(json.loads(message["data"]))
+                except (ValueError, KeyError, TypeError):
+                    logger.warning("Dropping malformed order event %r",
+                                   message)
+        finally:
+            pubsub.close()
+
+    def _listen(self) -> None:
+        delay = self.RECONNECT_DELAY
+        reconnected = False
+        while True:
+            started = time.monotonic()
+            try:
+                self._listen_once(reconnected)
+            except Exception as e:
+                logger.warning("Order event listener lost Redis (%s); "
+                               "reconnecting in %.1fs", e, delay)
+            if time.monotonic() - started > self.RECONNECT_MAX_DELAY:
+                delay = self.RECONNECT_DELAY  # it was up for a while
+            time.sleep(delay)
+            delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+            reconnected = True
+
+    def subscribe(
+        self, order_ids: Iterable[int], maxsize: int = 100
+    ) -> Subscription:
+        with self._listener_lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen, name="order-events", daemon=True
+                )
+                self._listener.start()
+        return super().subscribe(order_ids, maxsize)
+
+    def publish(self, payload: dict) -> None:
+        self._redis.publish(self.channel, json.dumps(payload))
+
+
+def init_order_events(app: Flask) -> None:
+    """Attach the configured broker to ``app``."""
+    url = app.config.get("ORDER_EVENTS_REDIS_URL")
+    app.extensions[EXTENSION_KEY] = (
+        RedisBroker(url) if url else InProcessBroker()
+    )
+
+
+def get_broker(app: Optional[Flask] = None) -> InProcessBroker:
+    app = app or current_app
+    return app.extensions[EXTENSION_KEY]  # type: ignore[no-any-return]
+
+
+def event_payload(history: OrderHistory) -> dict:
+    return {
+        "id": history.id,
+        "order_id": history.order_id,
+        "from_status": history.from_status,
+        "status": history.status,
+    }
+
+
+def remember_events(session: Session, payloads: Iterable[dict]) -> None:
+    """
+    Queue events to publish when ``session`` commits.
+
+    Needed for history rows written with bulk ``INSERT`` statements,
+    which skip the ORM ``after_insert`` hook below.
+    """
+    session.info.setdefault(PENDING_KEY, []).extend(payloads)
+
+
+@event.listens_for(OrderHistory, "after_insert")
+def _remember_event(_: Any, __: Any, target: OrderHistory) -> None:
+    session = object_session(target)
+    if session is not None:
+        remember_events(session, [event_payload(target)])
+
+
+@event.listens_for(FlaskSession, "after_commit")
+def _publish_committed(session: FlaskSession) -> None:
+    pending = session.info.pop(PENDING_KEY, None)
+    if not pending or not has_app_context():
+        return
+    broker = current_app.extensions.get(EXTENSION_KEY)
+    if broker is None:
+        return
+    for payload in pending:
+        try:
+            broker.publish(payload)
+        except Exception:
+            logger.exception("Could not publish order event %s", payload)
+
+
+@event.listens_for(FlaskSession, "after_soft_rollback")
+def _discard_rolled_back(session: FlaskSession, previous: Any) -> None:
+    if not previous.nested:
+        session.info.pop(PENDING_KEY, None)
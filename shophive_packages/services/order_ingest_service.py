@@ -0,0 +1,316 @@
+"""
+Set-based order creation.
+
+``ingest_orders`` places many orders with a fixed number of statements:
+one ``SELECT`` each of every referenced buyer and product, one
+conditional ``UPDATE`` taking stock and counting sales for all of them, one
+multi-row ``INSERT`` each for orders, lines, history, queued jobs and
+outbox events, plus the rollup upserts.  Sellers and prices always come
+from the product rows; prices sent by the client are ignored.
+
+Orders are checked one by one against the stock read up front, so an
+order that cannot be filled is rejected without affecting the others.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Optional
+
+from sqlalchemy import case, insert, select, update
+
+from shophive_packages import db
+from shophive_packages.db_utils import utcnow
+from shophive_packages.models.orders import Order, OrderHistory, OrderItem
+from shophive_packages.models.product import Product
+from shophive_packages.models.user import User
+from shophive_packages.services.order_events import remember_events
+from shophive_packages.services.order_status_service import (
+    created_payload
+)
+from shophive_packages.services.order_tasks import ORDER_PLACED
+from shophive_packages.services.outbox_service import (
+    ORDER_CREATED, publish_many
+)
+from shophive_packages.services.rollup_service import SaleLine, apply_sales
+from shophive_packages.services.task_queue import enqueue_many
+
+# Attempts when another transaction takes stock between our read and write
+STOCK_RETRIES = 3
+
+
+class OrderRejected(ValueError):
+    """Raised for an order that cannot be placed."""
+
+    def __init__(
+        self, message: str, code: str, product_id: Optional[int] = None
+    ) -> None:
+        super().__init__(message)
+        self.code = code
+        self.product_id = product_id
+
+
+class _StockChanged(Exception):
+    """Stock moved under a batch; plan it again."""
+
+
+@dataclass
+class _Plan:
+    index: int
+    buyer_id: int
+    address: str
+    lines: list[tuple[int, int]]
+
+
+def _is_int(value: Any) -> bool:
+    # JSON true/false arrive as bool, which is an int subclass
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _parse(index: int, data: Any) -> _Plan:
+    """Check the shape of one submitted order."""
+    if not isinstance(data, dict):
+        raise OrderRejected("Order must be an object", "invalid")
+    user_id = data.get("user_id")
+    items = data.get("items")
+    if not _is_int(user_id):
+        raise OrderRejected("user_id must be an integer", "invalid")
+    if not isinstance(items, list) or not items:
+        raise OrderRejected("items must be a non-empty list", "invalid")
+    lines = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise OrderRejected("Each item must be an object", "invalid")
+        product_id = item.get("product_id")
+        quantity = item.get("quantity")
+        if not _is_int(product_id) or not _is_int(quantity):
+            raise OrderRejected(
+                "product_id and quantity must be integers", "invalid"
+            )
+        if quantity <= 0:
+            raise OrderRejected("quantity must be positive", "invalid")
+        lines.append((product_id, quantity))
+    return _Plan(index, user_id, str(data.get("address") or ""), lines)
+
+
+def _check_line(
+    product: Any, product_id: int, quantity: int, left: dict[int, int]
+) -> None:
+    """Raise ``OrderRejected`` unless ``quantity`` of the product is free."""
+    if product is None:
+        raise OrderRejected(
+            f"Product {product_id} not found",
+            "product_not_found", product_id,
+        )
+    if product.seller_id is None:
+        raise OrderRejected(
+            f"Product {product_id} has no seller",
+            "product_unavailable", product_id,
+        )
+    if left[product_id] < quantity:
+        raise OrderRejected(
+            f"Not enough stock for product {product_id} "
+            f"(requested {quantity})",
+            "insufficient_stock", product_id,
+        )
+
+
+def _allocate(
+    plans: list[_Plan],
+    buyers: set[int],
+    products: dict[int, Any],
+    results: list[dict],
+) -> tuple[list[_Plan], dict[int, int]]:
+    """Accept orders in submission order while stock lasts."""
+    left = {pid: row.quantity or 0 for pid, row in products.items()}
+    taken: dict[int, int] = {}
+    accepted = []
+    for plan in plans:
+        wanted: dict[int, int] = {}
+        for product_id, quantity in plan.lines:
+            wanted[product_id] = wanted.get(product_id, 0) + quantity
+        try:
+            if plan.buyer_id not in buyers:
+                raise OrderRejected(
+                    f"User {plan.buyer_id} not found", "buyer_not_found"
+                )
+            for product_id, quantity in sorted(wanted.items()):
+                _check_line(products.get(product_id), product_id, quantity,
+                            left)
+        except OrderRejected as e:
+            results[plan.index] = _rejection(plan.index, e)
+            continue
+        for product_id, quantity in wanted.items():
+            left[product_id] -= quantity
+            taken[product_id] = taken.get(product_id, 0) + quantity
+        accepted.append(plan)
+    return accepted, taken
+
+
+def _take_all(taken: dict[int, int]) -> None:
+    """Take stock and count sales for every product in one statement."""
+    if not taken:
+        return
+    amount = case(taken, value=Product.id, else_=0)
+    result = db.session.execute(
+        update(Product)
+        .where(Product.id.in_(list(taken)), Product.quantity >= amount)
+        .values(
+            quantity=Product.quantity - amount,
+            sales=db.func.coalesce(Product.sales, 0) + amount,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(taken):
+        raise _StockChanged()
+
+
+def _cents(amount: Any) -> Decimal:
+    return Decimal(str(amount)).quantize(Decimal("0.01"))
+
+
+def _rejection(index: int, error: OrderRejected) -> dict:
+    result = {
+        "index": index,
+        "status": "rejected",
+        "error": error.code,
+        "message": str(error),
+    }
+    if error.product_id is not None:
+        result["product_id"] = error.product_id
+    return result
+
+
+def _place(plans: list[_Plan], results: list[dict]) -> None:
+    """Write every accepted order of one attempt; nothing commits."""
+    buyers = set(db.session.scalars(
+        select(User.id).where(User.id.in_({plan.buyer_id for plan in plans}))
+    ))
+    product_ids = {pid for plan in plans for pid, _ in plan.lines}
+    products = {
+        row.id: row
+        for row in db.session.execute(
+            select(
+                Product.id, Product.price, Product.seller_id,
+                Product.quantity,
+            )
+            .where(Product.id.in_(product_ids))
+            .order_by(Product.id)
+            .with_for_update()
+        )
+    }
+    accepted, taken = _allocate(plans, buyers, products, results)
+    _take_all(taken)
+    if not accepted:
+        return
+
+    now = utcnow()
+    totals = [
+        sum(
+            (Decimal(products[pid].price) * qty for pid, qty in plan.lines),
+            Decimal("0"),
+        )
+        for plan in accepted
+    ]
+    # Not every backend can keep RETURNING in parameter order for a
+    # multi-row INSERT, so rows are matched back by content instead.  Rows
+    # with equal content are interchangeable: nothing else refers to them
+    # yet, so any pairing with their plans is the same set of orders.
+    inserted: dict[tuple[int, Decimal], list[int]] = {}
+    for row in db.session.execute(
+        insert(Order).returning(Order.id, Order.buyer_id, Order.total_amount),
+        [
+            {
+                "buyer_id": plan.buyer_id,
+                "total_amount": total,
+                "status": "Pending",
+                "created_at": now,
+            }
+            for plan, total in zip(accepted, totals)
+        ],
+    ):
+        key = (row.buyer_id, _cents(row.total_amount))
+        inserted.setdefault(key, []).append(row.id)
+    order_ids = [
+        inserted[(plan.buyer_id, _cents(total))].pop()
+        for plan, total in zip(accepted, totals)
+    ]
+
+    item_rows = [
+        {
+            "order_id": order_id,
+            "product_id": product_id,
+            "quantity": quantity,
+            "price": products[product_id].price,
+            "address": plan.address,
+            "seller_id": products[product_id].seller_id,
+            "status": "Pending",
+        }
+        for plan, order_id in zip(accepted, order_ids)
+        for product_id, quantity in plan.lines
+    ]
+    db.session.execute(insert(OrderItem), item_rows)
+    apply_sales(
+        (
+            SaleLine(r["seller_id"], r["product_id"], r["price"],
+                     r["quantity"])
+            for r in item_rows
+        ),
+        now,
+    )
+
+    events = db.session.execute(
+        insert(OrderHistory).returning(
+            OrderHistory.id,
+            OrderHistory.order_id,
+            OrderHistory.from_status,
+            OrderHistory.status,
+        ),
+        [
+            {"order_id": order_id, "from_status": None,
+             "status": "Pending", "created_at": now}
+            for order_id in order_ids
+        ],
+    )
+    remember_events(db.session(), (dict(row._mapping) for row in events))
+    enqueue_many(ORDER_PLACED, [{"order_id": i} for i in order_ids])
+    publish_many(ORDER_CREATED, "order", (
+        (order_id, created_payload(order_id, plan.buyer_id, total, "Pending"))
+        for plan, order_id, total in zip(accepted, order_ids, totals)
+    ))
+
+    for plan, order_id, total in zip(accepted, order_ids, totals):
+        results[plan.index] = {
+            "index": plan.index,
+            "status": "created",
+            "order_id": order_id,
+            "total_amount": float(total),
+        }
+
+
+def ingest_orders(orders: list) -> list[dict]:
+    """
+    Place ``orders`` and commit; returns one result per submitted order.
+
+    Each result has ``index`` and ``status`` (``created`` with
+    ``order_id``/``total_amount``, or ``rejected`` with ``error``).
+    """
+    results: list[dict] = [{} for _ in orders]
+    plans = []
+    for index, data in enumerate(orders):
+        try:
+            plans.append(_parse(index, data))
+        except OrderRejected as e:
+            results[index] = _rejection(index, e)
+
+    for attempt in range(1, STOCK_RETRIES + 1):
+        try:
+            _place(plans, results)
+            db.session.commit()
+            return results
+        except _StockChanged:
+            db.session.rollback()
+            if attempt == STOCK_RETRIES:
+                raise RuntimeError("Stock kept changing; retry the batch")
+        except Exception:
+            db.session.rollback()
+            raise
+    return results
@@ -0,0 +1,131 @@
+"""
+Order status transitions.
+
+Every change appends an ``OrderHistory`` row and an outbox event and
+updates the denormalized ``Order.status`` (and the status of the order's
+lines) in the same transaction.  The update is conditional on the status
+the change was validated against, so two concurrent changes cannot both
+apply to the same starting status.  Nothing here commits.
+"""
+from typing import Optional
+
+from sqlalchemy import update
+
+from shophive_packages import db
+from shophive_packages.models.orders import (
+    ORDER_STATUSES, ORDER_TRANSITIONS, Order, OrderHistory, OrderItem
+)
+from shophive_packages.services.outbox_service import (
+    ORDER_CREATED, ORDER_STATUS_CHANGED, publish
+)
+from shophive_packages.services.rollup_service import reverse_order
+
+
+class InvalidTransitionError(ValueError):
+    """Raised when an order cannot move to the requested status."""
+
+    def __init__(self, current: Optional[str], requested: str) -> None:
+        super().__init__(
+            f"Cannot change order status from {current} to {requested}"
+        )
+        self.current = current
+        self.requested = requested
+
+
+def validate_status(status: object) -> str:
+    """Return ``status`` if it is a known order status or raise."""
+    if status not in ORDER_STATUSES:
+        raise ValueError(
+            f"Invalid status; expected one of {', '.join(ORDER_STATUSES)}"
+        )
+    return str(status)
+
+
+def can_transition(current: Optional[str], requested: str) -> bool:
+    return requested in ORDER_TRANSITIONS.get(current or "Pending", ())
+
+
+def allowed_sources(requested: str) -> frozenset[str]:
+    """Every status an order may be in to move to ``requested``."""
+    return frozenset(
+        status for status, targets in ORDER_TRANSITIONS.items()
+        if requested in targets
+    )
+
+
+def created_payload(
+    order_id: int, buyer_id: int, total_amount: object, status: str
+) -> dict:
+    return {
+        "order_id": order_id,
+        "buyer_id": buyer_id,
+        "total_amount": float(total_amount or 0),  # type: ignore[arg-type]
+        "status": status,
+    }
+
+
+def record_created(order: Order, note: Optional[str] = None) -> None:
+    """Append the first history event of a newly flushed order."""
+    status = order.status or "Pending"
+    db.session.add(
+        OrderHistory(
+            order_id=order.id,
+            from_status=None,
+            status=status,
+            note=note,
+        )
+    )
+    publish(
+        ORDER_CREATED, "order", order.id,
+        created_payload(order.id, order.buyer_id, order.total_amount, status),
+    )
+
+
+def transition_order(
+    order: Order, requested: str, note: Optional[str] = None
+) -> OrderHistory:
+    """
+    Move ``order`` to ``requested`` and append the history event.
+
+    Raises ``InvalidTransitionError`` if the transition is not allowed or
+    the order was changed concurrently.
+    """
+    requested = validate_status(requested)
+    current = order.status
+    if not can_transition(current, requested):
+        raise InvalidTransitionError(current, requested)
+
+    result = db.session.execute(
+        update(Order)
+        .where(Order.id == order.id, Order.status == current)
+        .values(status=requested, updated_at=db.func.now())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.refresh(order)
+        raise InvalidTransitionError(order.status, requested)
+
+    db.session.execute(
+        update(OrderItem)
+        .where(OrderItem.order_id == order.id)
+        .values(status=requested)
+        .execution_options(synchronize_session=False)
+    )
+    if requested == "Cancelled":
+        reverse_order(order)
+
+    event = OrderHistory(
+        order_id=order.id,
+        from_status=current,
+        status=requested,
+        note=note,
+    )
+    db.session.add(event)
+    publish(ORDER_STATUS_CHANGED, "order", order.id, {
+        "order_id": order.id,
+        "from_status": current,
+        "status": requested,
+        "note": note,
+    })
+    db.session.expire(order, ["status", "updated_at"])
+    return event
@@ -0,0 +1,126 @@
+"""
+Side effects of placing an order, run by the background worker.
+
+The request path enqueues a single ``order.placed`` job; its handler fans
+out into one job per side effect so a failing notification is retried on
+its own without repeating the others.
+"""
+import logging
+
+from sqlalchemy import select
+
+from shophive_packages import db
+from shophive_packages.models.orders import Order, OrderItem
+from shophive_packages.services.inventory_service import restock_order
+from shophive_packages.services.order_status_service import (
+    InvalidTransitionError, transition_order
+)
+from shophive_packages.services.payment_service import (
+    PaymentDeclined, get_payments
+)
+from shophive_packages.services.task_queue import enqueue, task
+
+logger = logging.getLogger(__name__)
+
+ORDER_PLACED = "order.placed"
+PAYMENT_CAPTURE = "payment.capture"
+ORDER_SIDE_EFFECTS = (
+    "order.notify_buyer",
+    "order.notify_sellers",
+    "order.update_leaderboard",
+    "order.track_analytics",
+)
+
+
+def enqueue_order_placed(order: Order) -> None:
+    """Queue post-order work in the caller's transaction."""
+    enqueue(ORDER_PLACED, {"order_id": order.id})
+
+
+def enqueue_payment_capture(order: Order) -> None:
+    """Queue capture of the order's authorization with the order."""
+    enqueue(PAYMENT_CAPTURE, {
+        "order_id": order.id,
+        "authorization_id": order.payment_reference,
+    })
+
+
+@task(ORDER_PLACED)
+def fan_out_order_placed(payload: dict) -> None:
+    for name in ORDER_SIDE_EFFECTS:
+        enqueue(name, payload)
+    db.session.commit()
+
+
+@task("order.notify_buyer")
+def notify_buyer(payload: dict) -> None:
+    """Send the buyer their order confirmation."""
+    order = db.session.get(Order, payload["order_id"])
+    if order is None:
+        return
+    logger.info("Order %s confirmed for buyer %s (total %s)",
+                order.id, order.buyer_id, order.total_amount)
+
+
+@task("order.notify_sellers")
+def notify_sellers(payload: dict) -> None:
+    """Tell every seller on the order that they have something to ship."""
+    seller_ids = db.session.scalars(
+        select(OrderItem.seller_id)
+        .where(OrderItem.order_id == payload["order_id"])
+        .distinct()
+    ).all()
+    for seller_id in seller_ids:
+        logger.info("Seller %s has new items on order %s",
+                    seller_id, payload["order_id"])
+
+
+@task("order.update_leaderboard")
+def update_leaderboard(payload: dict) -> None:
+    """Refresh best-seller standings for the products on the order."""
+    rows = db.session.execute(
+        select(OrderItem.product_id, OrderItem.quantity)
+        .where(OrderItem.order_id == payload["order_id"])
+    ).all()
+    for product_id, quantity in rows:
+        logger.info("Leaderboard: product %s sold %s", product_id, quantity)
+
+
+@task("order.track_analytics")
+def track_analytics(payload: dict) -> None:
+    """Emit the order analytics event."""
+    logger.info("analytics event=order_placed order_id=%s",
+                payload["order_id"])
+
+
+def _cancel_unpaid(order_id: int, reason: str) -> None:
+    """Cancel an order whose payment was refused and restock its items."""
+    order = db.session.get(Order, order_id)
+    if order is None:
+        return
+    try:
+        transition_order(order, "Cancelled",
+                         note=f"Payment capture declined: {reason}")
+    except InvalidTransitionError:
+        # Already shipped or cancelled; left for a person to sort out
+        logger.error("Order %s is %s and was not cancelled",
+                     order_id, order.status)
+        return
+    restock_order(order_id)
+    db.session.commit()
+
+
+@task(PAYMENT_CAPTURE)
+def capture_payment(payload: dict) -> None:
+    """
+    Capture a checkout authorization.
+
+    ``PaymentUnavailable`` propagates so the queue retries with backoff.
+    A declined capture cancels the order and returns its stock.
+    """
+    try:
+        get_payments().capture(payload["authorization_id"])
+    except PaymentDeclined as e:
+        logger.error("Capture refused for order %s: %s",
+                     payload["order_id"], e)
+        _cancel_unpaid(payload["order_id"], str(e))
@@ -0,0 +1,316 @@
+"""
+Transactional outbox for domain events.
+
+Code that changes orders or products calls ``publish`` (or
+``publish_many``) in the same transaction, adding an ``OutboxEvent`` row
+that commits or rolls back with the change.  A dispatcher
+(``flask outbox dispatch``) reads undelivered events in id order, hands
+each batch to every configured sink and then marks the batch delivered.
+A crash between delivery and marking sends the batch again, so delivery
+is at-least-once and consumers should de-duplicate on the event ``id``.
+
+Sinks are configured with ``OUTBOX_SINKS`` (comma separated names);
+``log``, ``file`` and ``memory`` are built in and ``register_sink_type``
+adds more.
+"""
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional, Protocol
+
+import click
+from flask import Flask, current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, insert, select, update
+
+from shophive_packages import db
+from shophive_packages.db_utils import utcnow
+from shophive_packages.models.outbox import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+ORDER_CREATED = "order.created"
+ORDER_STATUS_CHANGED = "order.status_changed"
+PRODUCT_UPDATED = "product.updated"
+PRODUCT_PRICE_CHANGED = "product.price_changed"
+
+EXTENSION_KEY = "outbox"
+
+
+class Sink(Protocol):
+    """Receives batches of events; raising means none were delivered."""
+
+    def send(self, events: list[dict]) -> None:
+        ...
+
+
+class LogSink:
+    """Writes each event to the application log."""
+
+    def send(self, events: list[dict]) -> None:
+        for event in events:
+            logger.info("Outbox event %s %s %s", event["id"],
+                        event["topic"], event["payload"])
+
+
+class FileSink:
+    """Appends events as JSON lines to a local file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def send(self, events: list[dict]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(event, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class MemorySink:
+    """Keeps events in a list; an in-process stand-in for tests."""
+
+    def __init__(self) -> None:
+        self.events: list[dict] = []
+        self._lock = threading.Lock()
+
+    def send(self, events: list[dict]) -> None:
+        with self._lock:
+            self.events.extend(events)
+
+
+_sink_types: dict[str, Callable[[Flask], Sink]] = {
+    "log": lambda app: LogSink(),
+    "file": lambda app: FileSink(
+        app.config.get("OUTBOX_FILE_PATH", "outbox.jsonl")
+    ),
+    "memory": lambda app: MemorySink(),
+}
+
+
+def register_sink_type(name: str, factory: Callable[[Flask], Sink]) -> None:
+    """Make ``name`` usable in ``OUTBOX_SINKS``."""
+    _sink_types[name] = factory
+
+
+@dataclass
+class DispatchStats:
+    """What the last dispatched batch looked like."""
+
+    dispatched: int = 0
+    failures: int = 0
+    last_batch_size: int = 0
+    last_lag_seconds: float = 0.0
+    last_dispatch_at: Optional[datetime] = None
+
+
+class Outbox:
+    def __init__(self, sinks: list[Sink]) -> None:
+        self.sinks = sinks
+        self.stats = DispatchStats()
+
+
+def init_outbox(app: Flask) -> None:
+    """Build the configured sinks for ``app``."""
+    names = [
+        name.strip()
+        for name in app.config.get("OUTBOX_SINKS", "log").split(",")
+        if name.strip()
+    ]
+    unknown = [name for name in names if name not in _sink_types]
+    if unknown:
+        raise ValueError(f"Unknown outbox sinks: {', '.join(unknown)}")
+    app.extensions[EXTENSION_KEY] = Outbox(
+        [_sink_types[name](app) for name in names]
+    )
+
+
+def get_outbox(app: Optional[Flask] = None) -> Outbox:
+    app = app or current_app
+    return app.extensions[EXTENSION_KEY]  # type: ignore[no-any-return]
+
+
+def publish(
+    topic: str, aggregate_type: str, aggregate_id: int, payload: dict
+) -> None:
+    """Add an event to the current transaction without committing it."""
+    db.session.add(
+        OutboxEvent(
+            topic=topic,
+            aggregate_type=aggregate_type,
+            aggregate_id=aggregate_id,
+            payload=payload,
+            created_at=utcnow(),
+        )
+    )
+
+
+def publish_many(
+    topic: str, aggregate_type: str, payloads: Iterable[tuple[int, dict]]
+) -> None:
+    """Add one event per ``(aggregate_id, payload)`` with one ``INSERT``."""
+    now = utcnow()
+    rows = [
+        {
+            "topic": topic,
+            "aggregate_type": aggregate_type,
+            "aggregate_id": aggregate_id,
+            "payload": payload,
+            "created_at": now,
+            "attempts": 0,
+        }
+        for aggregate_id, payload in payloads
+    ]
+    if rows:
+        db.session.execute(insert(OutboxEvent), rows)
+
+
+def dispatch_batch(
+    limit: Optional[int] = None, app: Optional[Flask] = None
+) -> int:
+    """
+    Deliver the oldest undelivered events; returns how many were sent.
+
+    A failing sink leaves the whole batch undelivered (with its error
+    recorded) so the next call retries it in the same order.
+    """
+    app = app or current_app._get_current_object()  # type: ignore
+    outbox = get_outbox(app)
+    limit = limit or app.config.get("OUTBOX_BATCH_SIZE", 500)
+    events = db.session.scalars(
+        select(OutboxEvent)
+        .where(OutboxEvent.dispatched_at.is_(None))
+        .order_by(OutboxEvent.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not events:
+        db.session.commit()
+        return 0
+
+    ids = [event.id for event in events]
+    batch = [event.to_dict() for event in events]
+    oldest = events[0].created_at
+    try:
+        for sink in outbox.sinks:
+            sink.send(batch)
+    except Exception as e:
+        db.session.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.id.in_(ids))
+            .values(
+                attempts=OutboxEvent.attempts + 1,
+                last_error=f"{type(e).__name__}: {e}",
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        outbox.stats.failures += 1
+        logger.warning("Outbox batch of %s events failed: %s",
+                       len(ids), e)
+        return 0
+
+    now = utcnow()
+    db.session.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.id.in_(ids))
+        .values(dispatched_at=now, attempts=OutboxEvent.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    stats = outbox.stats
+    stats.dispatched += len(ids)
+    stats.last_batch_size = len(ids)
+    stats.last_lag_seconds = (now - oldest).total_seconds()
+    stats.last_dispatch_at = now
+    return len(ids)
+
+
+def outbox_lag(now: Optional[datetime] = None) -> dict:
+    """Undelivered event count and age of the oldest one, in seconds."""
+    pending, oldest = db.session.execute(
+        select(func.count(OutboxEvent.id), func.min(OutboxEvent.created_at))
+        .where(OutboxEvent.dispatched_at.is_(None))
+    ).one()
+    stats = get_outbox().stats
+    return {
+        "pending": int(pending),
+        "oldest_pending_seconds": (
+            ((now or utcnow()) - oldest).total_seconds() if oldest else 0.0
+        ),
+        "dispatched": stats.dispatched,
+        "failures": stats.failures,
+        "last_batch_size": stats.last_batch_size,
+        "last_lag_seconds": stats.last_lag_seconds,
+    }
+
+
+def purge_dispatched(older_than: timedelta) -> int:
+    """Delete delivered events older than ``older_than``."""
+    result = db.session.execute(
+        delete(OutboxEvent).where(
+            OutboxEvent.dispatched_at < utcnow() - older_than
+        )
+    )
+    db.session.commit()
+    return int(result.rowcount or 0)
+
+
+class Dispatcher:
+    """Delivers outbox batches until stopped."""
+
+    def __init__(self, app: Flask) -> None:
+        self.app = app
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run_forever(self) -> None:
+        poll = self.app.config.get("OUTBOX_POLL_INTERVAL", 1.0)
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    sent = dispatch_batch(app=self.app)
+                    db.session.remove()
+            except Exception:
+                logger.exception("Outbox dispatcher crashed")
+                sent = 0
+            if not sent:
+                self._stop.wait(poll)
+
+
+outbox_cli = AppGroup("outbox", help="Domain event outbox.")
+
+
+@outbox_cli.command("dispatch")
+def dispatch_command() -> None:
+    """Deliver outbox events until interrupted."""
+    dispatcher = Dispatcher(current_app._get_current_object())  # type: ignore
+    click.echo("Outbox dispatcher started")
+    try:
+        dispatcher.run_forever()
+    except KeyboardInterrupt:
+        dispatcher.stop()
+
+
+@outbox_cli.command("status")
+def status_command() -> None:
+    """Show how far delivery is behind."""
+    lag = outbox_lag()
+    click.echo(
+        f"{lag['pending']} pending, oldest "
+        f"{lag['oldest_pending_seconds']:.1f}s old"
+    )
+
+
+@outbox_cli.command("purge")
+@click.option("--older-than-days", default=7, show_default=True)
+def purge_command(older_than_days: int) -> None:
+    """Delete delivered events."""
+    count = purge_dispatched(timedelta(days=older_than_days))
+    click.echo(f"Deleted {count} delivered events")
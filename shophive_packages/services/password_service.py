@@ -0,0 +1,208 @@
+"""
+Password hashing off the request thread.
+
+bcrypt is deliberately slow: at the default cost of 12 one hash or check
+takes a few hundred milliseconds of CPU.  ``PasswordHasher`` runs that
+work on a small pool of OS threads (bcrypt releases the GIL, so they run
+in parallel) and bounds how much of it can pile up:
+
+* at most ``PASSWORD_HASH_WORKERS`` hashes run at once per process, so a
+  burst of logins cannot take every core from the requests around it;
+* at most ``PASSWORD_HASH_QUEUE_DEPTH`` more wait for a worker.  Beyond
+  that ``HasherBusy`` is raised at once and answered with a 503, rather
+  than letting requests queue behind minutes of hashing.
+
+Under the gevent worker the pool uses gevent's real-thread executor, so a
+hash never blocks the event loop.
+
+The cost comes from ``BCRYPT_LOG_ROUNDS``.  Hashes carry their own cost,
+so raising or lowering it needs no migration: ``rehash_if_needed``
+re-hashes a password at the new cost the next time its owner logs in.
+``flask passwords bench`` measures what a cost means for login throughput
+on the machine at hand.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Callable, Optional
+
+import bcrypt
+import click
+from flask import Flask, current_app, has_app_context
+from flask.cli import AppGroup
+
+EXTENSION_KEY = "password_hasher"
+
+DEFAULT_ROUNDS = 12
+
+
+class HasherBusy(Exception):
+    """Too many password hashes are queued; retry shortly."""
+
+
+def hash_cost(hashed: str) -> Optional[int]:
+    """The cost factor recorded in a ``$2b$<cost>$...`` hash."""
+    parts = hashed.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(
+        password.encode("utf-8"), bcrypt.gensalt(rounds)
+    ).decode("utf-8")
+
+
+def _verify(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+    except ValueError:
+        # Not a bcrypt hash
+        return False
+
+
+def _thread_executor(max_workers: int) -> Executor:
+    try:
+        from gevent import monkey  # type: ignore
+    except ImportError:
+        monkey = None
+    if monkey is not None and monkey.is_module_patched("threading"):
+        from gevent.threadpool import ThreadPoolExecutor as GeventExecutor
+        return GeventExecutor(max_workers)  # type: ignore[no-any-return]
+    return ThreadPoolExecutor(max_workers, thread_name_prefix="bcrypt")
+
+
+class PasswordHasher:
+    """Bounded bcrypt pool; see the module docstring."""
+
+    def __init__(
+        self,
+        rounds: int = DEFAULT_ROUNDS,
+        max_workers: int = 2,
+        max_queue: int = 16,
+        timeout: float = 10.0,
+    ) -> None:
+        self.rounds = rounds
+        self.timeout = timeout
+        self._executor = _thread_executor(max_workers)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+    def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy("password hashing queue is full")
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            raise HasherBusy("password hashing timed out") from None
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.rounds)  # type: ignore
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return bool(self._run(_verify, password, hashed))
+
+    def needs_rehash(self, hashed: str) -> bool:
+        return hash_cost(hashed) != self.rounds
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+def init_passwords(app: Flask) -> None:
+    app.extensions[EXTENSION_KEY] = PasswordHasher(
+        rounds=app.config.get("BCRYPT_LOG_ROUNDS", DEFAULT_ROUNDS),
+        max_workers=app.config.get("PASSWORD_HASH_WORKERS", 2),
+        max_queue=app.config.get("PASSWORD_HASH_QUEUE_DEPTH", 16),
+        timeout=app.config.get("PASSWORD_HASH_TIMEOUT", 10.0),
+    )
+
+    @app.errorhandler(HasherBusy)
+    def hasher_busy(error: HasherBusy) -> tuple[dict, int, dict]:
+        return (
+            {"error": "Too many sign-in attempts right now, try again"},
+            503,
+            {"Retry-After": "1"},
+        )
+
+
+def get_hasher() -> PasswordHasher:
+    hasher = current_app.extensions[EXTENSION_KEY]
+    return hasher  # type: ignore[no-any-return]
+
+
+def hash_password(password: str) -> str:
+    """Hash on the app's pool; inline at the default cost outside an app."""
+    if has_app_context() and EXTENSION_KEY in current_app.extensions:
+        return get_hasher().hash(password)
+    return _hash(password, DEFAULT_ROUNDS)
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    if has_app_context() and EXTENSION_KEY in current_app.extensions:
+        return get_hasher().verify(password, hashed)
+    return _verify(password, hashed)
+
+
+def rehash_if_needed(user: Any, password: str) -> bool:
+    """
+    Re-hash a just-verified password whose cost is out of date.
+
+    Changes ``user.password`` only; the caller commits.
+    """
+    if not get_hasher().needs_rehash(user.password):
+        return False
+    user.set_password(password)
+    return True
+
+
+passwords_cli = AppGroup("passwords", help="Password hashing.")
+
+
+@passwords_cli.command("bench")
+@click.option("--costs", default="10,11,12,13", show_default=True,
+              help="Comma separated bcrypt cost factors to measure.")
+@click.option("--seconds", type=float, default=3.0, show_default=True,
+              help="How long to run each cost.")
+@click.option("--workers", type=int,
+              help="Concurrent verifications; defaults to the CPU count.")
+def bench_command(costs: str, seconds: float, workers: Optional[int]) -> None:
+    """Report login (password check) throughput per core for each cost."""
+    cores = os.cpu_count() or 1
+    workers = workers or cores
+    click.echo(f"{workers} workers on {cores} cores, {seconds:g}s per cost")
+    click.echo(f"{'cost':>4}  {'ms/check':>9}  {'logins/s':>9}  "
+               f"{'per core':>9}")
+    for cost in (int(c) for c in costs.split(",")):
+        hashed = _hash("benchmark-password", cost)
+        count = [0] * workers
+        deadline = time.perf_counter() + seconds
+
+        def run(slot: int) -> None:
+            while time.perf_counter() < deadline:
+                _verify("benchmark-password", hashed)
+                count[slot] += 1
+
+        threads = [threading.Thread(target=run, args=(i,))
+                   for i in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        rate = sum(count) / elapsed
+        click.echo(
+            f"{cost:>4}  {1000 * workers / rate:>9.1f}  {rate:>9.1f}  "
+            f"{rate / min(workers, cores):>9.1f}"
+        )
+    click.echo(f"Current BCRYPT_LOG_ROUNDS: "
+               f"{current_app.config.get('BCRYPT_LOG_ROUNDS', DEFAULT_ROUNDS)}")
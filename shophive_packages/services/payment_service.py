@@ -0,0 +1,377 @@
+"""
+Payment gateway client.
+
+``PaymentClient`` wraps a gateway with the protections a request thread
+needs when it talks to a processor over the network:
+
+* a bounded number of concurrent calls per process, so a slow processor
+  can only tie up that many workers and the rest fail fast;
+* a circuit breaker that stops calling a failing processor for a while;
+* strict connect and read timeouts on pooled keep-alive connections
+  (``HttpGateway``).
+
+Callers authorize before opening their database transaction and void the
+authorization if the transaction fails, so no row locks are held while
+waiting on the network.  ``FakeGateway`` is an in-process stand-in used by
+tests and local development.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from decimal import Decimal
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from typing import Optional, Protocol
+from urllib.parse import urlsplit
+
+from flask import Flask, current_app
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_KEY = "payments"
+
+
+class PaymentError(Exception):
+    """Base class for payment failures."""
+
+
+class PaymentDeclined(PaymentError):
+    """The processor refused the payment."""
+
+
+class PaymentUnavailable(PaymentError):
+    """The processor could not be reached in time; safe to retry later."""
+
+
+@dataclass
+class Authorization:
+    id: str
+    amount: Decimal
+    currency: str
+    reference: str
+
+
+class PaymentGateway(Protocol):
+    def authorize(
+        self, amount: Decimal, currency: str, reference: str, token: str
+    ) -> Authorization:
+        ...
+
+    def capture(self, authorization_id: str) -> None:
+        ...
+
+    def void(self, authorization_id: str) -> None:
+        ...
+
+
+class FakeGateway:
+    """
+    Approves every payment except the ``tok_declined`` token.
+
+    ``latency`` adds a delay to each call and ``fail_next`` makes the next
+    calls raise ``PaymentUnavailable``, for exercising timeouts and the
+    circuit breaker.
+    """
+
+    DECLINED_TOKEN = "tok_declined"
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.fail_next = 0
+        self.authorizations: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _call(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if self.fail_next:
+                self.fail_next -= 1
+                raise PaymentUnavailable("Fake gateway unavailable")
+
+    def authorize(
+        self, amount: Decimal, currency: str, reference: str, token: str
+    ) -> Authorization:
+        self._call()
+        if token == self.DECLINED_TOKEN:
+            raise PaymentDeclined("Card declined")
+        with self._lock:
+            # Same reference, same authorization, like a real processor's
+            # idempotency key
+            for auth_id, auth in self.authorizations.items():
+                if auth["reference"] == reference:
+                    return Authorization(auth_id, amount, currency, reference)
+            auth_id = f"auth_{uuid.uuid4().hex}"
+            self.authorizations[auth_id] = {
+                "reference": reference,
+                "amount": amount,
+                "status": "authorized",
+            }
+        return Authorization(auth_id, amount, currency, reference)
+
+    def _set_status(self, authorization_id: str, status: str) -> None:
+        self._call()
+        with self._lock:
+            self.authorizations[authorization_id]["status"] = status
+
+    def capture(self, authorization_id: str) -> None:
+        self._set_status(authorization_id, "captured")
+
+    def void(self, authorization_id: str) -> None:
+        self._set_status(authorization_id, "voided")
+
+
+class _ConnectionPool:
+    """Keep-alive connections to one host, reused LIFO."""
+
+    def __init__(
+        self,
+        url: str,
+        size: int,
+        connect_timeout: float,
+        read_timeout: float,
+    ) -> None:
+        parts = urlsplit(url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname or ""
+        self.port = parts.port
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue(maxsize=size)
+
+    def _connect(self) -> HTTPConnection:
+        cls = HTTPSConnection if self.https else HTTPConnection
+        conn = cls(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        return conn
+
+    def request(
+        self, method: str, path: str, body: bytes, headers: dict
+    ) -> tuple[int, bytes]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except Exception:
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+        return response.status, data
+
+
+class HttpGateway:
+    """JSON-over-HTTP processor client using pooled connections."""
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        pool_size: int = 10,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 5.0,
+    ) -> None:
+        self.base_path = urlsplit(base_url).path.rstrip("/")
+        self.api_key = api_key
+        self._pool = _ConnectionPool(
+            base_url, pool_size, connect_timeout, read_timeout
+        )
+
+    def _post(self, path: str, payload: dict, key: str) -> dict:
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Idempotency-Key": key,
+        }
+        try:
+            status, body = self._pool.request(
+                "POST", self.base_path + path,
+                json.dumps(payload).encode(), headers,
+            )
+        except (OSError, HTTPException) as e:
+            raise PaymentUnavailable(f"Payment gateway unreachable: {e}")
+        if status >= 500 or status == 429:
+            raise PaymentUnavailable(f"Payment gateway returned {status}")
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            raise PaymentUnavailable(
+                f"Payment gateway returned an unreadable body ({status})"
+            )
+        if status >= 400 or data.get("status") == "declined":
+            raise PaymentDeclined(
+                data.get("decline_reason") or f"Declined ({status})"
+            )
+        return data  # type: ignore[no-any-return]
+
+    def authorize(
+        self, amount: Decimal, currency: str, reference: str, token: str
+    ) -> Authorization:
+        data = self._post("/authorizations", {
+            "amount": int(amount * 100),
+            "currency": currency,
+            "reference": reference,
+            "payment_token": token,
+        }, key=reference)
+        try:
+            return Authorization(data["id"], amount, currency, reference)
+        except (KeyError, TypeError):
+            raise PaymentUnavailable("Payment gateway returned no id")
+
+    def capture(self, authorization_id: str) -> None:
+        self._post(f"/authorizations/{authorization_id}/capture", {},
+                   key=f"capture-{authorization_id}")
+
+    def void(self, authorization_id: str) -> None:
+        self._post(f"/authorizations/{authorization_id}/void", {},
+                   key=f"void-{authorization_id}")
+
+
+class CircuitBreaker:
+    """
+    Opens after ``threshold`` consecutive failures.
+
+    While open, calls fail immediately; after ``reset_seconds`` one trial
+    call is let through and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold: int = 5, reset_seconds: float = 30.0):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_seconds:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if (
+                not self._trial
+                and time.monotonic() - self.opened_at >= self.reset_seconds
+            ):
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class PaymentClient:
+    """A gateway behind a concurrency limit and a circuit breaker."""
+
+    def __init__(
+        self,
+        gateway: PaymentGateway,
+        breaker: Optional[CircuitBreaker] = None,
+        max_concurrency: int = 10,
+        acquire_timeout: float = 0.5,
+    ) -> None:
+        self.gateway = gateway
+        self.breaker = breaker or CircuitBreaker()
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def _guarded(self, call, *args):  # type: ignore[no-untyped-def]
+        # Take a slot first so a granted half-open trial always gets to
+        # run and report back; otherwise the circuit would stay open
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PaymentUnavailable("Too many payments in progress")
+        try:
+            if not self.breaker.allow():
+                raise PaymentUnavailable("Payment gateway circuit is open")
+            try:
+                result = call(*args)
+            except PaymentDeclined:
+                self.breaker.record_success()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                raise
+        finally:
+            self._slots.release()
+        self.breaker.record_success()
+        return result
+
+    def authorize(
+        self, amount: Decimal, currency: str, reference: str, token: str
+    ) -> Authorization:
+        return self._guarded(  # type: ignore[no-any-return]
+            self.gateway.authorize, amount, currency, reference, token
+        )
+
+    def capture(self, authorization_id: str) -> None:
+        self._guarded(self.gateway.capture, authorization_id)
+
+    def void(self, authorization_id: str) -> None:
+        self._guarded(self.gateway.void, authorization_id)
+
+
+def init_payments(app: Flask) -> None:
+    """Build the configured gateway client for ``app``."""
+    name = app.config.get("PAYMENT_GATEWAY")
+    if name == "http":
+        gateway: PaymentGateway = HttpGateway(
+            app.config["PAYMENT_GATEWAY_URL"],
+            app.config["PAYMENT_API_KEY"],
+            pool_size=app.config.get("PAYMENT_MAX_CONCURRENCY", 10),
+            connect_timeout=app.config.get("PAYMENT_CONNECT_TIMEOUT", 2.0),
+            read_timeout=app.config.get("PAYMENT_READ_TIMEOUT", 5.0),
+        )
+    elif name == "fake" and app.config.get("PAYMENT_ALLOW_FAKE", True):
+        gateway = FakeGateway()
+    elif name == "fake":
+        raise ValueError(
+            "PAYMENT_GATEWAY=fake approves every payment and is not "
+            "allowed in this configuration"
+        )
+    else:
+        raise ValueError(f"Unknown PAYMENT_GATEWAY {name!r}")
+    app.extensions[EXTENSION_KEY] = PaymentClient(
+        gateway,
+        CircuitBreaker(
+            app.config.get("PAYMENT_BREAKER_THRESHOLD", 5),
+            app.config.get("PAYMENT_BREAKER_RESET_SECONDS", 30.0),
+        ),
+        max_concurrency=app.config.get("PAYMENT_MAX_CONCURRENCY", 10),
+        acquire_timeout=app.config.get("PAYMENT_ACQUIRE_TIMEOUT", 0.5),
+    )
+
+
+def get_payments(app: Optional[Flask] = None) -> PaymentClient:
+    app = app or current_app
+    return app.extensions[EXTENSION_KEY]  # type: ignore[no-any-return]
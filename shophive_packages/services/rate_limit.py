@@ -0,0 +1,253 @@
+"""
+Token-bucket rate limiting for expensive endpoints.
+
+``@rate_limited(scope, *keys)`` charges one token per request to a bucket
+for each key (client IP, submitted username, logged-in user, ...) and
+answers 429 with ``Retry-After`` when any bucket is empty.  The check
+runs before the view body, so a rejected login costs no query and no
+bcrypt work.
+
+Limits come from ``RATE_LIMITS``, a mapping of ``"<scope>:<key>"`` to
+``"<count>/<second|minute|hour|day>"``: ``count`` is the burst size and
+the bucket refills at ``count`` tokens per period.  Keys without a limit
+are not checked.
+
+Buckets live in Redis when ``RATE_LIMIT_REDIS_URL`` is set, so every
+gunicorn worker draws from the same ones; all of a request's buckets are
+checked and charged atomically in one script call.  Without Redis the
+buckets are per process, which is fine for development and tests.  If
+Redis cannot be reached requests are let through rather than locking
+everybody out.
+
+Behind a reverse proxy, wrap the app in ``werkzeug``'s ``ProxyFix`` so
+``request.remote_addr`` is the client and not the proxy.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Callable, Optional, Sequence, TypeVar, cast
+
+from flask import Flask, current_app, jsonify, make_response, request
+
+from shophive_packages.services.identity_service import request_identity
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+EXTENSION_KEY = "rate_limiter"
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@dataclass(frozen=True)
+class Limit:
+    capacity: int
+    per_second: float
+
+    @classmethod
+    def parse(cls, spec: str) -> "Limit":
+        """``"10/minute"`` -> bursts of 10, refilling 10 per minute."""
+        count, _, period = spec.partition("/")
+        seconds = _PERIODS[period.strip().rstrip("s") or "second"]
+        capacity = int(count)
+        return cls(capacity, capacity / seconds)
+
+
+# (bucket key, limit)
+Charge = tuple[str, Limit]
+
+
+class MemoryBuckets:
+    """Per-process buckets."""
+
+    max_entries = 100_000
+
+    def __init__(self) -> None:
+        # key -> (tokens, updated, time the bucket is full again)
+        self._buckets: dict[str, tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _level(self, key: str, limit: Limit, now: float) -> float:
+        tokens, updated, _ = self._buckets.get(
+            key, (limit.capacity, now, now)
+        )
+        return min(limit.capacity, tokens + (now - updated) * limit.per_second)
+
+    def _evict(self, now: float) -> None:
+        """Drop buckets that have refilled; they behave as if absent."""
+        for key in [k for k, v in self._buckets.items() if v[2] <= now]:
+            del self._buckets[key]
+
+    def take(self, charges: Sequence[Charge]) -> float:
+        """Charge every bucket or none; seconds to wait, 0 if allowed."""
+        now = time.monotonic()
+        with self._lock:
+            levels = [self._level(key, lim, now) for key, lim in charges]
+            wait = max(
+                ((1 - level) / lim.per_second
+                 for level, (_, lim) in zip(levels, charges) if level < 1),
+                default=0.0,
+            )
+            if wait:
+                return wait
+            if len(self._buckets) >= self.max_entries:
+                self._evict(now)
+            for level, (key, lim) in zip(levels, charges):
+                full_at = now + (lim.capacity - level + 1) / lim.per_second
+                self._buckets[key] = (level - 1, now, full_at)
+        return 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+# KEYS: bucket keys.  ARGV: capacity, per-second rate for each key.
+# Buckets are hashes {tokens, ts}; time is Redis server time so workers
+# on different hosts agree.  Returns 0 when charged, else the wait in ms.
+_TAKE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[2 * i - 1])
+  local rate = tonumber(ARGV[2 * i])
+  local state = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(state[1]) or capacity
+  local ts = tonumber(state[2]) or now
+  tokens = math.min(capacity, tokens + (now - ts) * rate)
+  levels[i] = tokens
+  if tokens < 1 then
+    wait = math.max(wait, (1 - tokens) / rate)
+  end
+end
+if wait > 0 then
+  return math.ceil(wait * 1000)
+end
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[2 * i - 1])
+  local rate = tonumber(ARGV[2 * i])
+  redis.call('HSET', key, 'tokens', levels[i] - 1, 'ts', now)
+  redis.call('PEXPIRE', key,
+             math.ceil((capacity - levels[i] + 1) / rate * 1000))
+end
+return 0
+"""
+
+
+class RedisBuckets:
+    """Buckets shared by every process through Redis."""
+
+    def __init__(self, url: str) -> None:
+        import redis  # type: ignore
+
+        self._redis = redis.Redis.from_url(
+            url, socket_timeout=0.25, socket_connect_timeout=0.25
+        )
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+
+    def take(self, charges: Sequence[Charge]) -> float:
+        args: list[float] = []
+        for _, limit in charges:
+            args += [limit.capacity, limit.per_second]
+        waited = self._take(keys=[key for key, _ in charges], args=args)
+        return int(waited) / 1000
+
+    def clear(self) -> None:
+        pass
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        buckets: Any,
+        limits: dict[str, str],
+        prefix: str = "shophive:rl:",
+    ) -> None:
+        self.buckets = buckets
+        self.limits = {name: Limit.parse(s) for name, s in limits.items()}
+        self.prefix = prefix
+
+    def check(self, scope: str, keys: Sequence["RateKey"]) -> float:
+        """Charge the request's buckets; seconds to wait, 0 if allowed."""
+        charges = []
+        for key in keys:
+            limit = self.limits.get(f"{scope}:{key.name}")
+            if limit is None:
+                continue
+            value = key.value()
+            if value:
+                charges.append(
+                    (f"{self.prefix}{scope}:{key.name}:{value}", limit)
+                )
+        if not charges:
+            return 0.0
+        try:
+            return float(self.buckets.take(charges))
+        except Exception:
+            logger.warning("Rate limiter unavailable; allowing request",
+                           exc_info=True)
+            return 0.0
+
+
+def init_rate_limiter(app: Flask) -> None:
+    url = app.config.get("RATE_LIMIT_REDIS_URL")
+    app.extensions[EXTENSION_KEY] = RateLimiter(
+        RedisBuckets(url) if url else MemoryBuckets(),
+        app.config.get("RATE_LIMITS", {}),
+    )
+
+
+def get_rate_limiter() -> RateLimiter:
+    limiter = current_app.extensions[EXTENSION_KEY]
+    return limiter  # type: ignore[no-any-return]
+
+
+@dataclass(frozen=True)
+class RateKey:
+    """What a bucket is keyed by; ``value`` returns None to skip it."""
+
+    name: str
+    value: Callable[[], Optional[str]]
+
+
+def _submitted_username() -> Optional[str]:
+    value = request.form.get("username")
+    if value is None and request.is_json:
+        body = request.get_json(silent=True)
+        value = body.get("username") if isinstance(body, dict) else None
+    if not isinstance(value, str):
+        return None
+    return value.strip().lower()[:120] or None
+
+
+by_ip = RateKey("ip", lambda: request.remote_addr)
+by_username = RateKey("username", _submitted_username)
+by_user = RateKey("user", request_identity)
+
+
+def rate_limited(
+    scope: str, *keys: RateKey, methods: Sequence[str] = ("POST",)
+) -> Callable[[F], F]:
+    """Reject ``methods`` requests to the view once a bucket runs dry."""
+
+    def decorator(view: F) -> F:
+        @wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if request.method in methods:
+                wait = get_rate_limiter().check(scope, keys)
+                if wait:
+                    response = make_response(jsonify(
+                        {"error": "Too many requests, try again later"}
+                    ), 429)
+                    response.headers["Retry-After"] = str(int(wait) + 1)
+                    return response
+            return view(*args, **kwargs)
+
+        return cast(F, wrapper)
+
+    return decorator
@@ -0,0 +1,246 @@
+"""
+Read replicas for catalog and order reads.
+
+Every URL in ``DB_REPLICA_URLS`` becomes a Flask-SQLAlchemy bind named
+``replica1``, ``replica2``, ...  No model is bound to them.  Instead the
+session class (``db_routing.RoutingSession``) asks the router which
+engine should serve each query on the primary's tables:
+
+* Only GET/HEAD requests to the blueprints in ``DB_REPLICA_BLUEPRINTS``
+  (product reads, pagination and orders) are candidates.  Everything
+  else, including job workers and CLI commands, stays on the primary.
+* Flushes, INSERT/UPDATE/DELETE statements and ``SELECT ... FOR UPDATE``
+  always go to the primary.  Once a request has written, the rest of it
+  reads from the primary too.
+* Read-your-writes: a response to a request that wrote carries a
+  ``DB_REPLICA_COOKIE_NAME`` cookie for ``DB_REPLICA_STICKY_SECONDS``.
+  The same browser reads from the primary until the cookie expires, so
+  a buyer sees the order they just placed.  API clients that do not
+  keep cookies get no such guarantee.
+* A request keeps the replica it was first given.  Replicas take turns
+  between requests.
+
+Health is checked at most every ``DB_REPLICA_CHECK_INTERVAL`` seconds,
+by whichever request finds the check due.  The check writes a
+heartbeat (``replica_heartbeat``) to the primary and reads it back from
+each replica.  A replica holding the previous heartbeat has caught up.
+Otherwise its lag is the age of the newest heartbeat it holds.  Replicas
+that cannot be reached or lag more than ``DB_REPLICA_MAX_LAG`` get no
+reads until a later check passes.  With no healthy replica every read
+goes to the primary.  ``flask replicas status`` runs the check and
+prints the result.
+"""
+import itertools
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional, cast
+
+import click
+from flask import Flask, Response, current_app, has_request_context, request
+from flask.cli import AppGroup
+from sqlalchemy import insert, select, update
+from sqlalchemy.engine import Engine
+
+from shophive_packages import db
+from shophive_packages.db_routing import ROUTER_KEY, WROTE_KEY
+from shophive_packages.models.replicas import ReplicaHeartbeat
+
+logger = logging.getLogger(__name__)
+
+BIND_PREFIX = "replica"
+
+SAFE_METHODS = frozenset({"GET", "HEAD"})
+
+# request.environ key holding the engine chosen for this request
+ENVIRON_KEY = "shophive.db_replica"
+
+_heartbeat = ReplicaHeartbeat.__table__
+
+
+@dataclass
+class ReplicaState:
+    name: str
+    engine: Engine
+    healthy: bool = False  # until the first check passes
+    lag: Optional[float] = None
+    error: Optional[str] = None
+
+
+class ReplicaRouter:
+    """Picks a healthy replica for read-only requests."""
+
+    def __init__(
+        self,
+        primary: Engine,
+        replicas: dict[str, Engine],
+        max_lag: float = 10.0,
+        check_interval: float = 2.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.primary = primary
+        self.replicas = [ReplicaState(name, engine)
+                         for name, engine in sorted(replicas.items())]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.clock = clock
+        self._next_check = 0.0
+        self._checking = threading.Lock()
+        self._turn = itertools.count()
+
+    def _beat(self) -> Optional[float]:
+        """Write a new heartbeat; return the previous one."""
+        with self.primary.begin() as conn:
+            previous = conn.execute(
+                select(_heartbeat.c.beat_at).where(_heartbeat.c.id == 1)
+            ).scalar()
+            now = self.clock()
+            if previous is None:
+                conn.execute(insert(_heartbeat).values(id=1, beat_at=now))
+            else:
+                conn.execute(update(_heartbeat)
+                             .where(_heartbeat.c.id == 1)
+                             .values(beat_at=max(now, previous)))
+        return cast(Optional[float], previous)
+
+    def check(self) -> list[ReplicaState]:
+        """Measure every replica's lag against the primary."""
+        try:
+            previous = self._beat()
+        except Exception as exc:
+            # Without the primary lag cannot be measured; keep the last
+            # verdicts, reads on a replica are better than none
+            logger.warning("Replica check: primary unavailable: %s", exc)
+            return self.replicas
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as conn:
+                    seen = conn.execute(
+                        select(_heartbeat.c.beat_at)
+                        .where(_heartbeat.c.id == 1)
+                    ).scalar()
+            except Exception as exc:
+                replica.healthy, replica.lag = False, None
+                replica.error = str(exc).splitlines()[0]
+            else:
+                if previous is None or (seen is not None
+                                        and seen >= previous):
+                    replica.lag = 0.0
+                elif seen is None:
+                    replica.lag = math.inf
+                else:
+                    replica.lag = self.clock() - seen
+                replica.healthy = replica.lag <= self.max_lag
+                replica.error = None
+            if not replica.healthy:
+                logger.warning("Replica %s out of rotation: %s",
+                               replica.name, replica.error
+                               or f"{replica.lag:.1f}s behind")
+        return self.replicas
+
+    def pick(self) -> Optional[Engine]:
+        """A healthy replica, in turn; None when there is none."""
+        if self.clock() >= self._next_check \
+                and self._checking.acquire(blocking=False):
+            try:
+                self._next_check = self.clock() + self.check_interval
+                self.check()
+            finally:
+                self._checking.release()
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)].engine
+
+    def sticky_until(self) -> float:
+        name = current_app.config.get("DB_REPLICA_COOKIE_NAME",
+                                      "shophive_primary")
+        try:
+            return float(request.cookies.get(name, 0))
+        except ValueError:
+            return 0.0
+
+    def replica_allowed(self) -> bool:
+        if not has_request_context() or request.method not in SAFE_METHODS:
+            return False
+        if request.environ.get(WROTE_KEY):
+            return False
+        if request.blueprint not in current_app.config.get(
+            "DB_REPLICA_BLUEPRINTS", ()
+        ):
+            return False
+        return self.sticky_until() <= self.clock()
+
+    def engine_for_request(self) -> Optional[Engine]:
+        """The replica serving this request's reads, if any."""
+        if not self.replica_allowed():
+            return None
+        if ENVIRON_KEY not in request.environ:
+            request.environ[ENVIRON_KEY] = self.pick()
+        return cast(Optional[Engine], request.environ[ENVIRON_KEY])
+
+
+def _stick_to_primary(response: Response) -> Response:
+    if not request.environ.get(WROTE_KEY):
+        return response
+    config = current_app.config
+    router: ReplicaRouter = current_app.extensions[ROUTER_KEY]
+    seconds = config.get("DB_REPLICA_STICKY_SECONDS", 5.0)
+    response.set_cookie(
+        config.get("DB_REPLICA_COOKIE_NAME", "shophive_primary"),
+        f"{router.clock() + seconds:.3f}",
+        max_age=math.ceil(seconds),
+        httponly=True,
+        secure=config.get("SESSION_COOKIE_SECURE", False),
+        samesite="Lax",
+    )
+    return response
+
+
+def init_replicas(app: Flask) -> None:
+    replicas = {
+        key: engine for key, engine in db.engines.items()
+        if isinstance(key, str) and key.startswith(BIND_PREFIX)
+    }
+    if not replicas:
+        return
+    for key in replicas:
+        # Replicas get their schema by replication; keep db.create_all()
+        # and db.drop_all() off them
+        db.metadatas.pop(key, None)
+    app.extensions[ROUTER_KEY] = ReplicaRouter(
+        db.engine,
+        replicas,
+        max_lag=app.config.get("DB_REPLICA_MAX_LAG", 10.0),
+        check_interval=app.config.get("DB_REPLICA_CHECK_INTERVAL", 2.0),
+    )
+    app.after_request(_stick_to_primary)
+
+
+replicas_cli = AppGroup("replicas", help="Read replicas.")
+
+
+@replicas_cli.command("status")
+def status_command() -> None:
+    """Check every replica's health and lag."""
+    router = current_app.extensions.get(ROUTER_KEY)
+    if router is None:
+        click.echo("No replicas configured (DB_REPLICA_URLS).")
+        return
+    replicas = router.check()
+    for replica in replicas:
+        if replica.error:
+            state = f"down: {replica.error}"
+        else:
+            state = f"lag {replica.lag:.1f}s"
+        click.echo(f"{replica.name:<10} "
+                   f"{'ok' if replica.healthy else 'OUT':<4} {state}")
+    if not any(replica.healthy for replica in replicas):
+        raise SystemExit(1)
+
+
+def get_replica_router() -> Optional[ReplicaRouter]:
+    return cast(Optional[ReplicaRouter],
+                current_app.extensions.get(ROUTER_KEY))
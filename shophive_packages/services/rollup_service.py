@@ -0,0 +1,249 @@
+"""
+Incrementally maintained seller sales rollups.
+
+Placing an order adds its lines to the daily and hourly buckets of the
+order's creation time; cancelling it subtracts them again.  Both happen in
+the caller's transaction with one multi-row upsert per table, so the
+dashboard reads a few rollup rows instead of scanning ``order_items``.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, NamedTuple, Optional, Type, Union
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Select, delete, func, select, update
+
+from shophive_packages import db
+from shophive_packages.models.archive import ArchivedOrder, ArchivedOrderItem
+from shophive_packages.models.orders import Order, OrderItem
+from shophive_packages.models.rollups import (
+    SellerSalesDaily, SellerSalesHourly
+)
+
+RollupModel = Type[Union[SellerSalesDaily, SellerSalesHourly]]
+
+
+class SaleLine(NamedTuple):
+    seller_id: int
+    product_id: int
+    price: Decimal
+    quantity: int
+
+
+def day_bucket(moment: datetime) -> date:
+    return moment.date()
+
+
+def hour_bucket(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _aggregate(
+    lines: Iterable[SaleLine], sign: int
+) -> dict[tuple[int, int], dict]:
+    totals: dict[tuple[int, int], dict] = defaultdict(
+        lambda: {"revenue": Decimal("0"), "units": 0, "order_lines": 0}
+    )
+    for line in lines:
+        entry = totals[(line.seller_id, line.product_id)]
+        entry["revenue"] += sign * Decimal(str(line.price)) * line.quantity
+        entry["units"] += sign * line.quantity
+        entry["order_lines"] += sign
+    return totals
+
+
+def _upsert(model: RollupModel, rows: list[dict]) -> None:
+    """Add ``rows`` onto existing buckets, creating missing ones."""
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(model).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["seller_id", "bucket", "product_id"],
+            set_={
+                "revenue": model.revenue + stmt.excluded.revenue,
+                "units": model.units + stmt.excluded.units,
+                "order_lines": (
+                    model.order_lines + stmt.excluded.order_lines
+                ),
+            },
+        )
+        db.session.execute(stmt)
+        return
+
+    for row in rows:
+        result = db.session.execute(
+            update(model)
+            .where(
+                model.seller_id == row["seller_id"],
+                model.bucket == row["bucket"],
+                model.product_id == row["product_id"],
+            )
+            .values(
+                revenue=model.revenue + row["revenue"],
+                units=model.units + row["units"],
+                order_lines=model.order_lines + row["order_lines"],
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.session.add(model(**row))
+
+
+def apply_sales(
+    lines: Iterable[SaleLine], placed_at: datetime, sign: int = 1
+) -> None:
+    """Add (``sign=1``) or remove (``sign=-1``) sales from the rollups."""
+    totals = _aggregate(lines, sign)
+    for model, bucket in (
+        (SellerSalesDaily, day_bucket(placed_at)),
+        (SellerSalesHourly, hour_bucket(placed_at)),
+    ):
+        _upsert(model, [
+            {
+                "seller_id": seller_id,
+                "product_id": product_id,
+                "bucket": bucket,
+                **values,
+            }
+            for (seller_id, product_id), values in sorted(totals.items())
+        ])
+
+
+def record_order_items(
+    items: Iterable[OrderItem], placed_at: datetime
+) -> None:
+    """Count the lines of a newly placed order."""
+    apply_sales(
+        (
+            SaleLine(i.seller_id, i.product_id, i.price, i.quantity)
+            for i in items
+        ),
+        placed_at,
+    )
+
+
+def _apply_timed_lines(
+    rows: Iterable[tuple[int, int, Decimal, int, datetime]], sign: int
+) -> int:
+    """Apply ``(seller, product, price, qty, placed_at)`` rows by hour."""
+    by_hour: dict[datetime, list[SaleLine]] = defaultdict(list)
+    for seller_id, product_id, price, quantity, placed_at in rows:
+        by_hour[hour_bucket(placed_at)].append(
+            SaleLine(seller_id, product_id, price, quantity)
+        )
+    for moment, lines in sorted(by_hour.items()):
+        apply_sales(lines, moment, sign)
+    return sum(len(lines) for lines in by_hour.values())
+
+
+def _timed_lines_query(
+    items: type = OrderItem, orders: type = Order
+) -> Select:
+    return select(
+        items.seller_id,
+        items.product_id,
+        items.price,
+        items.quantity,
+        orders.created_at,
+    ).join(orders, orders.id == items.order_id)
+
+
+def reverse_orders(order_ids: Iterable[int]) -> None:
+    """Take cancelled orders' lines back out of the rollups."""
+    ids = list(order_ids)
+    if ids:
+        rows = db.session.execute(
+            _timed_lines_query().where(OrderItem.order_id.in_(ids))
+        )
+        _apply_timed_lines(rows, sign=-1)
+
+
+def reverse_order(order: Order) -> None:
+    """Take a cancelled order's lines back out of the rollups."""
+    reverse_orders([order.id])
+
+
+def seller_dashboard(
+    seller_id: int,
+    granularity: str = "daily",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    product_id: Optional[int] = None,
+) -> list[dict]:
+    """Revenue, units and order lines per bucket, oldest first."""
+    model: RollupModel = (
+        SellerSalesHourly if granularity == "hourly" else SellerSalesDaily
+    )
+    query = select(
+        model.bucket,
+        func.sum(model.revenue),
+        func.sum(model.units),
+        func.sum(model.order_lines),
+    ).where(model.seller_id == seller_id)
+    if product_id is not None:
+        query = query.where(model.product_id == product_id)
+    if since is not None:
+        query = query.where(
+            model.bucket >= (
+                since if model is SellerSalesHourly else since.date()
+            )
+        )
+    if until is not None:
+        query = query.where(
+            model.bucket < (
+                until if model is SellerSalesHourly else until.date()
+            )
+        )
+    rows = db.session.execute(
+        query.group_by(model.bucket).order_by(model.bucket)
+    )
+    return [
+        {
+            "bucket": bucket.isoformat(),
+            "revenue": float(revenue or 0),
+            "units": int(units or 0),
+            "order_lines": int(order_lines or 0),
+        }
+        for bucket, revenue, units, order_lines in rows
+    ]
+
+
+def rebuild_rollups(batch_size: int = 5000) -> int:
+    """
+    Recompute every rollup from the hot and archived order lines; returns
+    lines read.
+    """
+    db.session.execute(delete(SellerSalesDaily))
+    db.session.execute(delete(SellerSalesHourly))
+
+    seen = 0
+    for items, orders in (
+        (OrderItem, Order), (ArchivedOrderItem, ArchivedOrder)
+    ):
+        rows = db.session.execute(
+            _timed_lines_query(items, orders)
+            .where(orders.status != "Cancelled")
+            .execution_options(yield_per=batch_size)
+        )
+        for chunk in rows.partitions():
+            seen += _apply_timed_lines(chunk, sign=1)
+    db.session.commit()
+    return seen
+
+
+rollups_cli = AppGroup("rollups", help="Seller sales rollups.")
+
+
+@rollups_cli.command("rebuild")
+@click.option("--batch-size", default=5000, show_default=True)
+def rebuild_command(batch_size: int) -> None:
+    """Recompute seller rollups from existing orders."""
+    click.echo(f"Rebuilt rollups from {rebuild_rollups(batch_size)} lines")
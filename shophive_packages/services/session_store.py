@@ -0,0 +1,637 @@
+"""
+Server-side sessions shared by every worker and node.
+
+``StoreSessionInterface`` keeps the session id in the cookie and the
+session itself in a ``SessionStore`` chosen by ``SESSION_BACKEND``:
+
+* ``redis``: ``SESSION_REDIS_URL``, through a bounded blocking connection
+  pool.  Each key carries the session lifetime as its TTL, so Redis
+  expires abandoned sessions itself.
+* ``sql``: the ``sessions`` table, on the application's engine and its
+  pool.  Expired rows are never read and ``flask sessions purge`` deletes
+  them by the ``expires_at`` index.
+* ``memory``: the Redis store over ``FakeRedis``, an in-process stand-in
+  for tests and single-process development.
+* ``filesystem``: the old Flask-Session files, kept as a fallback.
+
+Sessions are stored as Flask's tagged JSON (the same format as its cookie
+sessions, which round-trips tuples, bytes and datetimes) and compressed
+with zlib above ``SESSION_COMPRESS_MIN_BYTES``.
+
+A session is only written when its contents change or its expiry is due
+for a refresh.  Each stored session records when it was last written;
+unchanged sessions are left alone until ``SESSION_REFRESH_INTERVAL``
+(an hour) has passed, and then the store TTL and the cookie expiry are
+pushed forward once.  Assigning a value a session already holds is not
+a change: a modified session is serialized and compared with what was
+loaded before anything is written.  Requests under
+``STATELESS_PATH_PREFIXES`` (static files, health checks) never open a
+session at all.  ``flask sessions bench`` replays a request mix and
+reports the writes each policy makes.
+
+Pages with a form put a CSRF token in the session, so every anonymous
+visitor would otherwise get a stored session on their first page view.
+A new session holding nothing but that token is not stored: the token
+goes to a signed ``CSRF_COOKIE_NAME`` cookie, as Flask's own cookie
+sessions would keep it, and is put back in ``session`` on the next
+request.  Once the session holds anything else (a login, a flash
+message) it is stored as usual, token included, and the cookie is
+dropped.
+
+``flask sessions migrate-files`` copies live Flask-Session files into the
+store.  Those files are named after a hash of the session id, not the id
+itself, so they are copied under ``legacy:<hash>`` and adopted under the
+real id the first time their owner's cookie is seen.
+"""
+import hashlib
+import os
+import random
+import re
+import secrets
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Optional, Protocol
+
+import click
+from flask import Flask, Request, Response, current_app
+from flask.cli import AppGroup
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import CallbackDict
+from werkzeug.test import EnvironBuilder
+
+from shophive_packages import db
+from shophive_packages.db_utils import utcnow
+from shophive_packages.models.sessions import ServerSession
+
+EXTENSION_KEY = "session_store"
+
+LEGACY_PREFIX = "legacy:"
+
+# Stored alongside the session data; never visible in ``session``
+REFRESHED_KEY = "_refreshed_at"
+
+_SID_RE = re.compile(r"^[A-Za-z0-9_-]{20,64}$")
+
+CSRF_SALT = "shophive.csrf"
+
+_serializer = TaggedJSONSerializer()
+
+
+def dumps(data: dict, compress_min_bytes: int = 512) -> bytes:
+    raw = _serializer.dumps(data).encode("utf-8")
+    if len(raw) >= compress_min_bytes:
+        return b"z" + zlib.compress(raw)
+    return b"j" + raw
+
+
+def loads(blob: bytes) -> Optional[dict]:
+    """The session stored in ``blob``, or None if it cannot be read."""
+    try:
+        body = blob[1:]
+        if blob[:1] == b"z":
+            body = zlib.decompress(body)
+        data = _serializer.loads(body.decode("utf-8"))
+    except (ValueError, zlib.error):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class SessionStore(Protocol):
+    def get(self, sid: str) -> Optional[bytes]:
+        ...
+
+    def set(self, sid: str, data: bytes, ttl: int) -> None:
+        ...
+
+    def delete(self, sid: str) -> None:
+        ...
+
+
+class FakeRedis:
+    """The few Redis commands the session store uses, in process."""
+
+    def __init__(self) -> None:
+        self._data: dict[str, tuple[Optional[float], bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] <= time.monotonic():
+                del self._data[name]
+                return None
+            return entry[1]
+
+    def set(self, name: str, value: bytes, ex: Optional[int] = None) -> bool:
+        expires = time.monotonic() + ex if ex else None
+        with self._lock:
+            self._data[name] = (expires, value)
+        return True
+
+    def expire(self, name: str, seconds: int) -> bool:
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return False
+            self._data[name] = (time.monotonic() + seconds, entry[1])
+        return True
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            return sum(
+                1 for name in names if self._data.pop(name, None) is not None
+            )
+
+
+class RedisSessionStore:
+    def __init__(self, client: Any, prefix: str = "shophive:session:") -> None:
+        self._redis = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(
+        cls, url: str, max_connections: int = 20, pool_timeout: float = 1.0
+    ) -> "RedisSessionStore":
+        import redis  # type: ignore
+
+        pool = redis.BlockingConnectionPool.from_url(
+            url,
+            max_connections=max_connections,
+            timeout=pool_timeout,
+            socket_timeout=1.0,
+            socket_connect_timeout=1.0,
+        )
+        return cls(redis.Redis(connection_pool=pool))
+
+    def get(self, sid: str) -> Optional[bytes]:
+        value = self._redis.get(self.prefix + sid)
+        return bytes(value) if value is not None else None
+
+    def set(self, sid: str, data: bytes, ttl: int) -> None:
+        self._redis.set(self.prefix + sid, data, ex=max(ttl, 1))
+
+    def delete(self, sid: str) -> None:
+        self._redis.delete(self.prefix + sid)
+
+
+class SqlSessionStore:
+    """
+    Sessions in the ``sessions`` table.
+
+    Uses its own short transactions on the engine rather than
+    ``db.session``, so saving a session never commits request work.
+    """
+
+    table = ServerSession.__table__
+
+    def get(self, sid: str) -> Optional[bytes]:
+        with db.engine.connect() as conn:
+            value = conn.scalar(
+                select(self.table.c.data).where(
+                    self.table.c.sid == sid,
+                    self.table.c.expires_at > utcnow(),
+                )
+            )
+        return bytes(value) if value is not None else None
+
+    def set(self, sid: str, data: bytes, ttl: int) -> None:
+        values = {"data": data,
+                  "expires_at": utcnow() + timedelta(seconds=ttl)}
+        for _ in range(2):
+            try:
+                with db.engine.begin() as conn:
+                    updated = conn.execute(
+                        update(self.table)
+                        .where(self.table.c.sid == sid)
+                        .values(**values)
+                    ).rowcount
+                    if not updated:
+                        conn.execute(
+                            insert(self.table).values(sid=sid, **values)
+                        )
+                return
+            except IntegrityError:
+                continue  # created concurrently; update it instead
+
+    def delete(self, sid: str) -> None:
+        with db.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.sid == sid))
+
+    def purge(self) -> int:
+        with db.engine.begin() as conn:
+            result = conn.execute(
+                delete(self.table).where(self.table.c.expires_at <= utcnow())
+            )
+        return int(result.rowcount or 0)
+
+
+class StoredSession(CallbackDict, SessionMixin):  # type: ignore[misc]
+    def __init__(
+        self, initial: Optional[dict] = None, sid: str = "", new: bool = False
+    ) -> None:
+        def on_update(session: "StoredSession") -> None:
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        # When the stored copy was written, and its serialized form
+        self.refreshed_at = 0.0
+        self.loaded: Optional[bytes] = None
+        # CSRF token read from the cookie of an unstored session
+        self.csrf_cookie: Optional[str] = None
+
+
+class StoreSessionInterface(SessionInterface):
+    """Session id in the cookie, session data in a ``SessionStore``."""
+
+    def __init__(
+        self,
+        store: SessionStore,
+        permanent: bool = True,
+        compress_min_bytes: int = 512,
+        legacy_key_prefix: Optional[str] = None,
+        refresh_interval: float = 3600,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.store = store
+        self.permanent = permanent
+        self.compress_min_bytes = compress_min_bytes
+        self.legacy_key_prefix = legacy_key_prefix
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+
+    def _dumps(self, session: StoredSession, refreshed_at: float) -> bytes:
+        return dumps({**session, REFRESHED_KEY: refreshed_at},
+                     self.compress_min_bytes)
+
+    def _adopt_legacy(self, sid: str) -> Optional[dict]:
+        """A session copied from Flask-Session files, if there is one."""
+        if self.legacy_key_prefix is None:
+            return None
+        key = LEGACY_PREFIX + legacy_file_name(self.legacy_key_prefix, sid)
+        blob = self.store.get(key)
+        if blob is None:
+            return None
+        self.store.delete(key)
+        return loads(blob)
+
+    def open_session(self, app: Flask, request: Request) -> StoredSession:
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and _SID_RE.match(sid):
+            blob = self.store.get(sid)
+            if blob is not None:
+                data = loads(blob)
+                if data is not None:
+                    refreshed_at = data.pop(REFRESHED_KEY, 0)
+                    session = StoredSession(data, sid=sid)
+                    session.refreshed_at = float(refreshed_at or 0)
+                    session.loaded = blob
+                    return session
+            data = self._adopt_legacy(sid)
+            if data is not None:
+                session = StoredSession(data, sid=sid)
+                session.modified = True  # re-save under the real id
+                return session
+        session = StoredSession(sid=secrets.token_urlsafe(32), new=True)
+        token = self._csrf_from_cookie(app, request)
+        if token is not None:
+            session[_csrf_key(app)] = session.csrf_cookie = token
+            session.modified = False
+        return session
+
+    def _csrf_from_cookie(self, app: Flask, request: Request) -> Optional[str]:
+        value = request.cookies.get(
+            app.config.get("CSRF_COOKIE_NAME", "shophive_csrf")
+        )
+        if not value:
+            return None
+        try:
+            return _csrf_signer(app).unsign(value).decode("utf-8")
+        except (BadSignature, UnicodeDecodeError):
+            return None
+
+    def _save_csrf_cookie(
+        self, app: Flask, session: StoredSession, response: Response
+    ) -> None:
+        """Hand an anonymous visitor's CSRF token to the browser."""
+        token = session[_csrf_key(app)]
+        if token == session.csrf_cookie:
+            return
+        response.vary.add("Cookie")
+        response.set_cookie(
+            app.config.get("CSRF_COOKIE_NAME", "shophive_csrf"),
+            _csrf_signer(app).sign(str(token)).decode("utf-8"),
+            expires=self.get_expiration_time(app, session),
+            httponly=True,
+            domain=self.get_cookie_domain(app),
+            path=self.get_cookie_path(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def get_expiration_time(
+        self, app: Flask, session: SessionMixin
+    ) -> Optional[datetime]:
+        if self.permanent or session.permanent:
+            now = datetime.fromtimestamp(self.clock(), timezone.utc)
+            return now + app.permanent_session_lifetime
+        return None
+
+    def refresh_due(self, app: Flask, session: StoredSession) -> bool:
+        """Whether an unchanged session's expiry should be pushed forward."""
+        return bool(
+            app.config["SESSION_REFRESH_EACH_REQUEST"]
+            and self.clock() - session.refreshed_at >= self.refresh_interval
+        )
+
+    def should_set_cookie(self, app: Flask, session: SessionMixin) -> bool:
+        assert isinstance(session, StoredSession)
+        if session.new or self.refresh_due(app, session):
+            return True
+        # Unchanged contents are not worth a write
+        return bool(session.modified) and (
+            self._dumps(session, session.refreshed_at) != session.loaded
+        )
+
+    def save_session(
+        self, app: Flask, session: SessionMixin, response: Response
+    ) -> None:
+        assert isinstance(session, StoredSession)
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(
+                    name, domain=domain, path=path,
+                    secure=self.get_cookie_secure(app),
+                    httponly=self.get_cookie_httponly(app),
+                    samesite=self.get_cookie_samesite(app),
+                )
+            return
+        if session.new and set(session) == {_csrf_key(app)}:
+            self._save_csrf_cookie(app, session, response)
+            return
+        if not self.should_set_cookie(app, session):
+            return
+
+        response.vary.add("Cookie")
+        if session.csrf_cookie is not None:
+            # The token now lives in the stored session
+            response.delete_cookie(
+                app.config.get("CSRF_COOKIE_NAME", "shophive_csrf"),
+                domain=domain, path=path,
+                secure=self.get_cookie_secure(app),
+                httponly=True,
+                samesite=self.get_cookie_samesite(app),
+            )
+        ttl = int(app.permanent_session_lifetime.total_seconds())
+        self.store.set(session.sid, self._dumps(session, self.clock()), ttl)
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def _csrf_key(app: Flask) -> str:
+    return str(app.config.get("WTF_CSRF_FIELD_NAME", "csrf_token"))
+
+
+def _csrf_signer(app: Flask) -> Signer:
+    return Signer(app.secret_key, salt=CSRF_SALT)  # type: ignore[arg-type]
+
+
+def legacy_file_name(key_prefix: str, sid: str) -> str:
+    """Name of the Flask-Session file that held session ``sid``."""
+    return hashlib.sha256((key_prefix + sid).encode("utf-8")).hexdigest()
+
+
+def _make_store(app: Flask) -> Optional[SessionStore]:
+    backend = app.config.get("SESSION_BACKEND", "filesystem")
+    if backend == "redis":
+        return RedisSessionStore.from_url(
+            app.config["SESSION_REDIS_URL"],
+            max_connections=app.config.get(
+                "SESSION_REDIS_MAX_CONNECTIONS", 20
+            ),
+            pool_timeout=app.config.get("SESSION_REDIS_POOL_TIMEOUT", 1.0),
+        )
+    if backend == "sql":
+        return SqlSessionStore()
+    if backend == "memory":
+        return RedisSessionStore(FakeRedis())
+    if backend == "filesystem":
+        return None
+    raise ValueError(f"Unknown SESSION_BACKEND {backend!r}")
+
+
+def init_session_store(app: Flask) -> None:
+    """Install the configured backend; ``filesystem`` keeps Flask-Session."""
+    store = _make_store(app)
+    app.extensions[EXTENSION_KEY] = store
+    if store is None:
+        return
+    app.session_interface = StoreSessionInterface(
+        store,
+        permanent=app.config.get("SESSION_PERMANENT", True),
+        compress_min_bytes=app.config.get("SESSION_COMPRESS_MIN_BYTES", 512),
+        legacy_key_prefix=app.config.get("SESSION_KEY_PREFIX", "session:"),
+        refresh_interval=app.config.get("SESSION_REFRESH_INTERVAL", 3600),
+    )
+
+
+def get_session_store() -> Optional[SessionStore]:
+    return current_app.extensions.get(EXTENSION_KEY)  # type: ignore
+
+
+def migrate_file_sessions(
+    store: SessionStore, directory: str, compress_min_bytes: int = 512
+) -> tuple[int, int]:
+    """Copy live Flask-Session files into ``store``; (copied, skipped)."""
+    from cachelib.file import FileSystemCache
+
+    cache = FileSystemCache(directory)
+    copied = skipped = 0
+    now = time.time()
+    for name in os.listdir(directory):
+        if not re.fullmatch(r"[0-9a-f]{64}", name):
+            continue  # count file, temporary files
+        try:
+            with open(os.path.join(directory, name), "rb") as f:
+                expires = struct.unpack("I", f.read(4))[0]
+                data = cache.serializer.load(f)
+        except Exception:
+            skipped += 1
+            continue
+        if not isinstance(data, dict):
+            continue  # cachelib's own bookkeeping entry
+        if expires and expires <= now:
+            skipped += 1
+            continue
+        ttl = int(expires - now) if expires else int(
+            current_app.permanent_session_lifetime.total_seconds()
+        )
+        store.set(LEGACY_PREFIX + name, dumps(data, compress_min_bytes), ttl)
+        copied += 1
+    return copied, skipped
+
+
+sessions_cli = AppGroup("sessions", help="Server-side sessions.")
+
+
+@sessions_cli.command("migrate-files")
+@click.option("--dir", "directory",
+              help="Flask-Session directory; defaults to SESSION_FILE_DIR.")
+def migrate_files_command(directory: Optional[str]) -> None:
+    """Copy sessions from Flask-Session files into SESSION_BACKEND."""
+    store = get_session_store()
+    if store is None:
+        raise click.ClickException(
+            "SESSION_BACKEND is filesystem; choose redis or sql first"
+        )
+    directory = directory or current_app.config["SESSION_FILE_DIR"]
+    copied, skipped = migrate_file_sessions(
+        store, directory,
+        current_app.config.get("SESSION_COMPRESS_MIN_BYTES", 512),
+    )
+    click.echo(f"Copied {copied} sessions, skipped {skipped}")
+
+
+@sessions_cli.command("purge")
+def purge_command() -> None:
+    """Delete expired sessions from the SQL backend."""
+    store = get_session_store()
+    removed = store.purge() if isinstance(store, SqlSessionStore) else 0
+    click.echo(f"Purged {removed} expired sessions")
+
+
+class CountingStore:
+    """Wraps a store and counts what is written to it."""
+
+    def __init__(self, inner: SessionStore) -> None:
+        self.inner = inner
+        self.reads = self.writes = self.bytes_written = 0
+
+    def get(self, sid: str) -> Optional[bytes]:
+        self.reads += 1
+        return self.inner.get(sid)
+
+    def set(self, sid: str, data: bytes, ttl: int) -> None:
+        self.writes += 1
+        self.bytes_written += len(data)
+        self.inner.set(sid, data, ttl)
+
+    def delete(self, sid: str) -> None:
+        self.writes += 1
+        self.inner.delete(sid)
+
+
+# (path, what the request does with the session, share of traffic)
+BENCH_MIX = (
+    ("/static/css/styles.css", None, 0.40),
+    ("/health", None, 0.05),
+    ("/products", "read", 0.45),
+    ("/cart", "reassign", 0.05),
+    ("/cart/add/1", "change", 0.05),
+)
+
+
+def replay_sessions(
+    app: Flask,
+    requests: int,
+    sessions: int,
+    hours: float,
+    refresh_interval: float,
+    stateless_prefixes: tuple[str, ...],
+    seed: int = 0,
+) -> CountingStore:
+    """
+    Replay ``BENCH_MIX`` from ``sessions`` logged-in visitors spread over
+    ``hours`` through a fresh in-memory store; returns its counters.
+    """
+    from shophive_packages.session_config import (
+        StatelessPathSessionInterface
+    )
+
+    rng = random.Random(seed)
+    now = [time.time()]
+    store = CountingStore(RedisSessionStore(FakeRedis()))
+    interface = StatelessPathSessionInterface(
+        StoreSessionInterface(store, refresh_interval=refresh_interval,
+                              clock=lambda: now[0]),
+        stateless_prefixes,
+    )
+    lifetime = int(app.permanent_session_lifetime.total_seconds())
+    sids = [secrets.token_urlsafe(32) for _ in range(sessions)]
+    for i, sid in enumerate(sids):
+        data = {"_user_id": f"user_{i}", "_fresh": True, "_id": "0" * 128,
+                "cart_items": [{"product_id": 1, "quantity": 1}],
+                REFRESHED_KEY: now[0] - rng.uniform(0, refresh_interval)}
+        store.inner.set(sid, dumps(data), lifetime)
+    store.reads = store.writes = store.bytes_written = 0
+
+    cookie = app.config["SESSION_COOKIE_NAME"]
+    paths, actions, weights = zip(*BENCH_MIX)
+    step = hours * 3600 / max(requests, 1)
+    for _ in range(requests):
+        now[0] += step
+        index = rng.choices(range(len(paths)), weights)[0]
+        headers = {"Cookie": f"{cookie}={rng.choice(sids)}"}
+        environ = EnvironBuilder(paths[index], headers=headers).get_environ()
+        session = interface.open_session(app, app.request_class(environ))
+        assert session is not None
+        action = actions[index]
+        if action is not None:
+            cart = session.get("cart_items", [])
+            if action == "reassign":
+                session["cart_items"] = cart
+            elif action == "change":
+                session["cart_items"] = cart + [
+                    {"product_id": rng.randint(1, 50), "quantity": 1}
+                ]
+        interface.save_session(app, session, Response())
+    return store
+
+
+@sessions_cli.command("bench")
+@click.option("--requests", "count", type=int, default=20000,
+              show_default=True, help="Requests to replay.")
+@click.option("--sessions", type=int, default=500, show_default=True,
+              help="Distinct logged-in visitors.")
+@click.option("--hours", type=float, default=8.0, show_default=True,
+              help="Period the requests are spread over.")
+def bench_command(count: int, sessions: int, hours: float) -> None:
+    """Compare session store writes with and without write skipping."""
+    prefixes = tuple(current_app.config.get("STATELESS_PATH_PREFIXES", ()))
+    interval = current_app.config.get("SESSION_REFRESH_INTERVAL", 3600)
+    policies = (
+        ("every request", 0, ("/api/v1/",)),
+        ("changes only", interval, prefixes),
+    )
+    click.echo(f"{count} requests from {sessions} sessions over {hours:g}h")
+    click.echo(f"{'policy':<14}  {'reads':>7}  {'writes':>7}  "
+               f"{'KiB written':>11}  {'writes/req':>10}")
+    for label, refresh_interval, stateless in policies:
+        store = replay_sessions(current_app, count, sessions, hours,
+                                refresh_interval, stateless)
+        click.echo(f"{label:<14}  {store.reads:>7}  {store.writes:>7}  "
+                   f"{store.bytes_written / 1024:>11.1f}  "
+                   f"{store.writes / max(count, 1):>10.3f}")
@@ -0,0 +1,170 @@
+"""
+Per-request SQL statistics and an N+1 query detector.
+
+With ``SQL_INSTRUMENTATION`` on, every engine (the primary and any
+replicas) reports each statement it runs to the current request:
+
+* how many statements ran, and the time spent waiting on the database;
+* how often each statement *shape* ran.  The shape is the SQL with
+  literals and ``IN``/``VALUES`` lists folded, so a serializer that
+  loads ``product.tags`` once per product shows up as one shape with a
+  large count, the signature of an N+1 query.
+
+When a shape runs more than ``SQL_REPEAT_THRESHOLD`` times in one
+request, ``SQL_REPEAT_ACTION`` decides what happens: ``warn`` logs the
+shape and the endpoint once, ``raise`` raises ``RepeatedQueryError``
+from the offending statement (for development and test runs).
+
+Responses carry ``Server-Timing: db;dur=<ms>;desc="<n> queries"``,
+which browser developer tools show next to the request, and each
+request logs the same numbers with its most repeated shape.
+
+Statements outside a request (job workers, CLI commands) are not
+recorded.  The listeners are attached when this setting or
+``METRICS_ENABLED`` is on; the metrics only read the totals, without
+the header, the log line or the repeat check.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Optional, cast
+
+from flask import Flask, Response, current_app, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+
+from shophive_packages import db
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_KEY = "sql_instrumentation"
+
+# request.environ key holding the request's QueryStats
+ENVIRON_KEY = "shophive.query_stats"
+
+# Execution context attribute holding a statement's start time
+_STARTED = "_shophive_started"
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+class RepeatedQueryError(Exception):
+    """One statement shape ran too many times in a request (N+1)."""
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement: str) -> str:
+    """The statement with literals and parameter lists folded."""
+    shape = _STRING_RE.sub("?", statement)
+    shape = _NUMBER_RE.sub("?", shape)
+    shape = _SPACE_RE.sub(" ", shape).strip()
+    return _LIST_RE.sub("(?)", shape)
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    seconds: float = 0.0
+    shapes: Counter = field(default_factory=Counter)
+
+    def add(self, shape: str, seconds: float) -> int:
+        """Record one statement; return how often its shape has run."""
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[shape] += 1
+        return cast(int, self.shapes[shape])
+
+    def most_repeated(self) -> Optional[tuple[str, int]]:
+        common = self.shapes.most_common(1)
+        return common[0] if common else None
+
+    def server_timing(self) -> str:
+        return (f'db;dur={self.seconds * 1000:.1f};'
+                f'desc="{self.count} queries"')
+
+
+def current_stats() -> Optional[QueryStats]:
+    """The statistics of the current request, if it is being recorded."""
+    if not has_request_context():
+        return None
+    return cast(Optional[QueryStats], request.environ.get(ENVIRON_KEY))
+
+
+class SqlInstrumentation:
+    """Engine listeners feeding each request's ``QueryStats``."""
+
+    def __init__(self, repeat_threshold: int = 10,
+                 repeat_action: Optional[str] = "warn") -> None:
+        if repeat_action not in ("warn", "raise", None):
+            raise ValueError(f"Unknown SQL_REPEAT_ACTION {repeat_action!r}")
+        self.repeat_threshold = repeat_threshold
+        self.repeat_action = repeat_action
+
+    def attach(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn: Connection, cursor: Any, statement: str,
+                parameters: Any, context: Any, executemany: bool) -> None:
+        setattr(context, _STARTED, time.perf_counter())
+
+    def _after(self, conn: Connection, cursor: Any, statement: str,
+               parameters: Any, context: Any, executemany: bool) -> None:
+        elapsed = time.perf_counter() - getattr(context, _STARTED)
+        if not has_request_context():
+            return
+        stats = request.environ.get(ENVIRON_KEY)
+        if stats is None:
+            stats = request.environ[ENVIRON_KEY] = QueryStats()
+        shape = statement_shape(statement)
+        if stats.add(shape, elapsed) == self.repeat_threshold + 1 \
+                and self.repeat_action is not None:
+            self._repeated(shape)
+
+    def _repeated(self, shape: str) -> None:
+        message = (f"{request.method} {request.path} ({request.endpoint}) "
+                   f"ran this statement more than {self.repeat_threshold} "
+                   f"times, likely an N+1 query: {shape[:300]}")
+        if self.repeat_action == "raise":
+            raise RepeatedQueryError(message)
+        logger.warning("%s", message)
+
+
+def _report(response: Response) -> Response:
+    stats = current_stats() or QueryStats()
+    response.headers.add("Server-Timing", stats.server_timing())
+    repeated = stats.most_repeated()
+    logger.info(
+        "%s %s %s: %d queries, %.1f ms in the database%s",
+        request.method, request.path, response.status_code, stats.count,
+        stats.seconds * 1000,
+        f"; most repeated ({repeated[1]}x): {repeated[0][:120]}"
+        if repeated and repeated[1] > 1 else "",
+    )
+    return response
+
+
+def init_sql_instrumentation(app: Flask) -> None:
+    reporting = bool(app.config.get("SQL_INSTRUMENTATION"))
+    if not reporting and not app.config.get("METRICS_ENABLED"):
+        return
+    instrumentation = SqlInstrumentation(
+        app.config.get("SQL_REPEAT_THRESHOLD", 10),
+        app.config.get("SQL_REPEAT_ACTION", "warn") if reporting else None,
+    )
+    for engine in db.engines.values():
+        instrumentation.attach(engine)
+    app.extensions[EXTENSION_KEY] = instrumentation
+    if reporting:
+        app.after_request(_report)
+
+
+def get_sql_instrumentation() -> Optional[SqlInstrumentation]:
+    return cast(Optional[SqlInstrumentation],
+                current_app.extensions.get(EXTENSION_KEY))
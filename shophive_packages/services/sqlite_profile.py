@@ -0,0 +1,407 @@
+"""
+Running on one SQLite file with several worker processes.
+
+SQLite allows any number of readers but one writer at a time.  The
+default setup fails under a checkout spike for two reasons.  First,
+the rollback journal blocks readers while a write commits.  Second, a
+transaction that reads first and then writes takes the write lock
+late.  If another process committed in between, SQLite answers
+"database is locked" at once instead of waiting.
+
+With ``SQLITE_HIGH_CONCURRENCY`` (and an SQLite URI) every connection
+gets ``SQLITE_PRAGMAS``: WAL (readers never block the writer or each
+other), ``synchronous=NORMAL`` (no fsync per commit in WAL mode, still
+crash safe), a memory map, a larger page cache and ``busy_timeout``.
+
+Write transactions then take a single serialized path:
+
+* Requests with an unsafe method (POST, PUT, PATCH, DELETE), and work
+  outside a request such as job workers and CLI commands, begin their
+  transactions with ``BEGIN IMMEDIATE``.  The write lock is taken
+  up-front, so a transaction can never be refused half way.
+* Before that they queue for the writer: first on a lock within the
+  process, then on an ``flock`` of ``<database>-writer.lock`` shared
+  by all processes.  The next writer goes in as soon as the previous
+  one commits, without waiting out SQLite's busy-handler sleeps (which
+  back off to 100 ms).  A buyer who waits longer than
+  ``SQLITE_WRITE_QUEUE_TIMEOUT`` gets a 503 with ``Retry-After``.
+* The request's transaction is ended as soon as the view returns, so
+  the write lock is not held while the response is sent.
+
+Safe requests (GET, HEAD) and views marked ``@read_mostly`` (the token
+and JSON logins, which spend their time in bcrypt and rarely write) keep
+ordinary deferred transactions and run in parallel.  The browser login
+merges the guest cart, so it stays on the writer path.  Views that write
+on a safe method are marked ``@writes`` and take the writer path too:
+the checkout page, which takes stock holds on GET.
+
+``flask sqlite bench`` runs concurrent writer processes against a
+scratch database with and without the profile.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Optional, TypeVar, cast
+
+import click
+from flask import Flask, current_app, has_request_context, request
+from flask.cli import AppGroup
+from sqlalchemy import (
+    Column, Integer, MetaData, String, Table, create_engine, event, select,
+    update
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+
+from shophive_packages import db
+
+try:
+    import fcntl
+except ImportError:  # Windows: each process queues on SQLite alone
+    fcntl = None  # type: ignore[assignment]
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+EXTENSION_KEY = "sqlite_writer"
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "TRACE"})
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -64000,  # KiB, i.e. 64 MiB
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+# conn.info key marking a transaction that holds the writer lock
+_HOLDS_LOCK = "shophive.sqlite_writer"
+_DRIVER_ISOLATION = "shophive.sqlite_isolation"
+
+
+class WriterBusy(Exception):
+    """The serialized writer path is saturated; retry shortly."""
+
+
+def read_mostly(view: F) -> F:
+    """
+    Keep deferred transactions for a view that rarely writes, so it does
+    not queue behind writers (e.g. login, which spends its time in
+    bcrypt and only writes to upgrade a hash).
+    """
+    view._sqlite_read_mostly = True  # type: ignore[attr-defined]
+    return view
+
+
+def writes(view: F) -> F:
+    """
+    Put a view on the writer path even for GET and HEAD, because it
+    writes on them (e.g. the checkout page, which holds stock).
+    """
+    view._sqlite_writes = True  # type: ignore[attr-defined]
+    return view
+
+
+def _write_intent() -> bool:
+    if not has_request_context():
+        return True
+    view = current_app.view_functions.get(request.endpoint or "")
+    if request.method in SAFE_METHODS:
+        return getattr(view, "_sqlite_writes", False)
+    return not getattr(view, "_sqlite_read_mostly", False)
+
+
+class SqliteWriter:
+    """Applies the pragmas and serializes write transactions on an engine."""
+
+    def __init__(
+        self, engine: Engine, pragmas: dict[str, Any],
+        queue_timeout: float = 30.0,
+    ) -> None:
+        self.engine = engine
+        self.pragmas = dict(pragmas)
+        self.timeout = queue_timeout
+        self.intent: Callable[[], bool] = _write_intent
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._lock_path = (
+            f"{engine.url.database}-writer.lock"
+            if fcntl is not None and is_sqlite_file(engine) else None
+        )
+        self._fd: Optional[int] = None
+        self._fd_pid = 0
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "begin", self._on_begin)
+        event.listen(engine, "commit", self._on_commit)
+        event.listen(engine, "rollback", self._on_rollback)
+        event.listen(engine, "reset", self._on_reset)
+
+    def _lock_file(self) -> int:
+        # A descriptor per process: flock is shared across fork()
+        if self._fd is None or self._fd_pid != os.getpid():
+            assert self._lock_path is not None
+            self._fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._fd_pid = os.getpid()
+        return self._fd
+
+    def _acquire(self) -> bool:
+        """Take the process lock, then the lock shared with other processes."""
+        deadline = time.monotonic() + self.timeout
+        if not self._lock.acquire(timeout=self.timeout):
+            return False
+        self._depth += 1
+        if self._depth > 1 or self._lock_path is None:
+            return True
+        fd, delay = self._lock_file(), 0.0002
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    self._depth -= 1
+                    self._lock.release()
+                    return False
+                time.sleep(delay)
+                delay = min(delay * 2, 0.002)
+
+    def _release(self, info: dict) -> None:
+        if not info.pop(_HOLDS_LOCK, False):
+            return
+        self._depth -= 1
+        if self._depth == 0 and self._lock_path is not None:
+            fcntl.flock(self._lock_file(), fcntl.LOCK_UN)
+        self._lock.release()
+
+    def _on_connect(self, dbapi_connection: Any, record: Any) -> None:
+        record.info[_DRIVER_ISOLATION] = dbapi_connection.isolation_level
+        cursor = dbapi_connection.cursor()
+        for name, value in self.pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    def _on_begin(self, conn: Connection) -> None:
+        dbapi_connection: Any = conn.connection.dbapi_connection
+        if not self.intent():
+            # The driver's own deferred BEGIN, issued before the first
+            # write, exactly as without the profile
+            dbapi_connection.isolation_level = conn.info.get(
+                _DRIVER_ISOLATION, ""
+            )
+            return
+        if not self._acquire():
+            raise WriterBusy("timed out waiting for the database writer")
+        conn.info[_HOLDS_LOCK] = True
+        try:
+            dbapi_connection.isolation_level = None
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        except BaseException:
+            self._release(conn.info)
+            raise
+
+    # These run just before SQLAlchemy ends the transaction.  Ending it
+    # here first lets the next writer in as soon as it is over; the
+    # driver call that follows is then a no-op.
+    def _on_commit(self, conn: Connection) -> None:
+        if conn.info.get(_HOLDS_LOCK):
+            try:
+                conn.connection.dbapi_connection.commit()  # type: ignore
+            finally:
+                self._release(conn.info)
+
+    def _on_rollback(self, conn: Connection) -> None:
+        if conn.info.get(_HOLDS_LOCK):
+            try:
+                conn.connection.dbapi_connection.rollback()  # type: ignore
+            finally:
+                self._release(conn.info)
+
+    def _on_reset(self, dbapi_connection: Any, record: Any,
+                  reset_state: Any) -> None:
+        # Returned to the pool without a commit or rollback event
+        if record.info.get(_HOLDS_LOCK):
+            try:
+                dbapi_connection.rollback()
+            finally:
+                self._release(record.info)
+
+
+def is_sqlite_file(engine: Engine) -> bool:
+    return (engine.dialect.name == "sqlite"
+            and engine.url.database not in (None, "", ":memory:"))
+
+
+def init_sqlite_profile(app: Flask) -> None:
+    engine = db.engine
+    if not app.config.get("SQLITE_HIGH_CONCURRENCY") \
+            or not is_sqlite_file(engine):
+        return
+    # Connections opened before the hooks existed miss the pragmas
+    engine.dispose()
+    app.extensions[EXTENSION_KEY] = SqliteWriter(
+        engine,
+        app.config.get("SQLITE_PRAGMAS", DEFAULT_PRAGMAS),
+        app.config.get("SQLITE_WRITE_QUEUE_TIMEOUT", 30.0),
+    )
+
+    @app.after_request
+    def end_write_transaction(response: Any) -> Any:
+        # Release the write lock before the response goes out; teardown
+        # would roll this transaction back anyway
+        if _write_intent() and db.session().in_transaction():
+            db.session.rollback()
+        return response
+
+    @app.errorhandler(WriterBusy)
+    def writer_busy(error: WriterBusy) -> tuple[dict, int, dict]:
+        return (
+            {"error": "The shop is busy right now, try again"},
+            503,
+            {"Retry-After": "1"},
+        )
+
+
+# Benchmark
+
+_bench_metadata = MetaData()
+_bench_stock = Table(
+    "bench_stock", _bench_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("quantity", Integer, nullable=False),
+)
+_bench_orders = Table(
+    "bench_orders", _bench_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("product_id", Integer, nullable=False),
+    Column("note", String(100)),
+)
+
+
+def _bench_engine(path: str, profile: bool, writes: bool = True) -> Engine:
+    engine = create_engine(f"sqlite:///{path}")
+    if profile:
+        writer = SqliteWriter(engine, DEFAULT_PRAGMAS)
+        writer.intent = lambda: writes
+    return engine
+
+
+def _bench_worker(
+    path: str, profile: bool, writer: bool, seconds: float, work: float,
+    seed: int, ready: Any, results: Any,
+) -> None:
+    """
+    A writer runs checkout-shaped transactions (read stock, insert an
+    order, ``work`` seconds of application code, update stock); a reader
+    lists recent orders.  Puts
+    (writer, completed, failed) on ``results``.
+    """
+    import random
+
+    rng = random.Random(seed)
+    engine = _bench_engine(path, profile, writes=writer)
+    done = failed = 0
+    ready.wait()
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        product_id = rng.randint(1, 20)
+        try:
+            if writer:
+                with engine.begin() as conn:
+                    stock = conn.scalar(
+                        select(_bench_stock.c.quantity)
+                        .where(_bench_stock.c.id == product_id)
+                    )
+                    conn.execute(_bench_orders.insert().values(
+                        product_id=product_id, note=f"stock was {stock}"
+                    ))
+                    time.sleep(work)
+                    conn.execute(
+                        update(_bench_stock)
+                        .where(_bench_stock.c.id == product_id)
+                        .values(quantity=_bench_stock.c.quantity - 1)
+                    )
+            else:
+                with engine.connect() as conn:
+                    conn.execute(
+                        select(_bench_orders)
+                        .order_by(_bench_orders.c.id.desc()).limit(50)
+                    ).all()
+            done += 1
+        except (OperationalError, WriterBusy):
+            failed += 1
+    engine.dispose()
+    results.put((writer, done, failed))
+
+
+def run_write_bench(
+    writers: int, readers: int, seconds: float, profile: bool,
+    work: float = 0.001, directory: Optional[str] = None,
+) -> dict[str, int]:
+    """Run ``writers`` and ``readers`` processes on a scratch database."""
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        path = os.path.join(tmp, "bench.db")
+        engine = _bench_engine(path, profile)
+        _bench_metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(_bench_stock.insert(), [
+                {"id": i, "quantity": 10**6} for i in range(1, 21)
+            ])
+        engine.dispose()
+        roles = [True] * writers + [False] * readers
+        context = multiprocessing.get_context("spawn")
+        ready = context.Barrier(len(roles))
+        results = context.Queue()
+        workers = [
+            context.Process(target=_bench_worker, args=(
+                path, profile, writer, seconds, work, i, ready, results
+            ))
+            for i, writer in enumerate(roles)
+        ]
+        for worker in workers:
+            worker.start()
+        totals = {"commits": 0, "write_errors": 0,
+                  "reads": 0, "read_errors": 0}
+        for _ in workers:
+            writer, done, failed = results.get()
+            totals["commits" if writer else "reads"] += done
+            totals["write_errors" if writer else "read_errors"] += failed
+        for worker in workers:
+            worker.join()
+    return totals
+
+
+sqlite_cli = AppGroup("sqlite", help="SQLite deployment profile.")
+
+
+@sqlite_cli.command("bench")
+@click.option("--writers", type=int, default=4, show_default=True,
+              help="Concurrent writer processes.")
+@click.option("--readers", type=int, default=2, show_default=True,
+              help="Concurrent reader processes.")
+@click.option("--seconds", type=float, default=5.0, show_default=True,
+              help="How long each configuration runs.")
+@click.option("--work-ms", type=float, default=1.0, show_default=True,
+              help="Application time spent inside each write transaction.")
+def bench_command(
+    writers: int, readers: int, seconds: float, work_ms: float
+) -> None:
+    """Compare throughput with and without the SQLite profile."""
+    click.echo(f"{writers} writer and {readers} reader processes, "
+               f"{seconds:g}s each")
+    click.echo(f"{'profile':<8}  {'commits/s':>9}  {'errors':>7}  "
+               f"{'reads/s':>8}  {'errors':>7}")
+    for label, profile in (("off", False), ("on", True)):
+        totals = run_write_bench(writers, readers, seconds, profile,
+                                 work_ms / 1000)
+        click.echo(f"{label:<8}  {totals['commits'] / seconds:>9.0f}  "
+                   f"{totals['write_errors']:>7}  "
+                   f"{totals['reads'] / seconds:>8.0f}  "
+                   f"{totals['read_errors']:>7}")
+
+
+def get_sqlite_writer() -> Optional[SqliteWriter]:
+    return cast(Optional[SqliteWriter],
+                current_app.extensions.get(EXTENSION_KEY))
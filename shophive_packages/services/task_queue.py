@@ -0,0 +1,287 @@
+"""
+A small durable background job queue.
+
+``enqueue`` only adds a ``BackgroundJob`` row to the current session, so
+the job is committed together with the order (or whatever else) that
+caused it and the request pays for a single insert.  A worker process
+(``flask jobs work``) claims due jobs with a conditional update, runs
+them on a thread pool and retries failures with exponential backoff.
+"""
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+import click
+from flask import Flask, current_app
+from flask.cli import AppGroup
+from sqlalchemy import insert, or_, select, update
+
+from shophive_packages import db
+from shophive_packages.db_utils import utcnow
+from shophive_packages.models.jobs import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+TaskHandler = Callable[[dict], None]
+
+_registry: dict[str, TaskHandler] = {}
+
+
+def task(name: str) -> Callable[[TaskHandler], TaskHandler]:
+    """Register a function as the handler for jobs called ``name``."""
+
+    def decorator(handler: TaskHandler) -> TaskHandler:
+        _registry[name] = handler
+        return handler
+
+    return decorator
+
+
+def enqueue(
+    name: str,
+    payload: Optional[dict] = None,
+    delay_seconds: float = 0,
+) -> BackgroundJob:
+    """
+    Add a job to the current transaction without committing it.
+
+    The job becomes visible to workers when the caller commits.
+    """
+    job = BackgroundJob(
+        name=name,
+        payload=payload or {},
+        status="queued",
+        attempts=0,
+        max_attempts=current_app.config.get("JOBS_MAX_ATTEMPTS", 5),
+        run_at=utcnow() + timedelta(seconds=delay_seconds),
+    )
+    db.session.add(job)
+    return job
+
+
+def ensure_queued(name: str, run_at: datetime) -> None:
+    """
+    Make sure one queued ``name`` job is due by ``run_at``.
+
+    For sweep jobs that handle every due item at once: a queued job is
+    reused (and brought forward if it is due later), so calling this on
+    every request does not add a row each time.  Like ``enqueue`` it only
+    touches the current transaction.
+    """
+    pending = db.session.scalars(
+        select(BackgroundJob)
+        .where(BackgroundJob.name == name, BackgroundJob.status == "queued")
+        .order_by(BackgroundJob.run_at)
+        .limit(1)
+    ).first()
+    if pending is None:
+        enqueue(name).run_at = run_at
+    elif pending.run_at > run_at:
+        pending.run_at = run_at
+
+
+def enqueue_many(name: str, payloads: list[dict]) -> None:
+    """Queue one ``name`` job per payload with a single ``INSERT``."""
+    if not payloads:
+        return
+    now = utcnow()
+    max_attempts = current_app.config.get("JOBS_MAX_ATTEMPTS", 5)
+    db.session.execute(insert(BackgroundJob), [
+        {
+            "name": name,
+            "payload": payload,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "run_at": now,
+        }
+        for payload in payloads
+    ])
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retry number ``attempts`` (1-based)."""
+    base = current_app.config.get("JOBS_BACKOFF_SECONDS", 5)
+    cap = current_app.config.get("JOBS_BACKOFF_MAX_SECONDS", 3600)
+    return float(min(base * 2 ** (attempts - 1), cap))
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def claim_jobs(limit: int, now: Optional[datetime] = None) -> list[int]:
+    """
+    Lock up to ``limit`` due jobs for this worker and return their ids.
+
+    Jobs left ``running`` by a worker that died are reclaimed once their
+    lease (``JOBS_LEASE_SECONDS``) has run out.
+    """
+    now = now or utcnow()
+    lease = timedelta(
+        seconds=current_app.config.get("JOBS_LEASE_SECONDS", 300)
+    )
+    candidates = db.session.scalars(
+        select(BackgroundJob.id)
+        .where(
+            or_(
+                (BackgroundJob.status == "queued")
+                & (BackgroundJob.run_at <= now),
+                (BackgroundJob.status == "running")
+                & (BackgroundJob.locked_at <= now - lease),
+            )
+        )
+        .order_by(BackgroundJob.run_at)
+        .limit(limit)
+    ).all()
+
+    me = worker_id()
+    claimed = []
+    for job_id in candidates:
+        result = db.session.execute(
+            update(BackgroundJob)
+            .where(
+                BackgroundJob.id == job_id,
+                or_(
+                    BackgroundJob.status == "queued",
+                    (BackgroundJob.status == "running")
+                    & (BackgroundJob.locked_at <= now - lease),
+                ),
+            )
+            .values(
+                status="running",
+                locked_by=me,
+                locked_at=now,
+                attempts=BackgroundJob.attempts + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            claimed.append(job_id)
+    db.session.commit()
+    return claimed
+
+
+def run_job(job_id: int) -> bool:
+    """Run one claimed job and record the outcome; ``True`` on success."""
+    job = db.session.get(BackgroundJob, job_id)
+    if job is None:
+        return False
+    handler = _registry.get(job.name)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for {job.name!r}")
+        handler(dict(job.payload or {}))
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(BackgroundJob, job_id)
+        job.last_error = f"{type(e).__name__}: {e}"
+        job.locked_by = None
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = "failed"
+            logger.error("Job %s (%s) failed permanently: %s",
+                         job.id, job.name, job.last_error)
+        else:
+            job.status = "queued"
+            job.run_at = utcnow() + timedelta(
+                seconds=backoff_seconds(job.attempts)
+            )
+            logger.warning("Job %s (%s) failed, retrying: %s",
+                           job.id, job.name, job.last_error)
+        db.session.commit()
+        return False
+
+    job.status = "done"
+    job.locked_by = None
+    job.locked_at = None
+    job.last_error = None
+    db.session.commit()
+    return True
+
+
+def run_pending(limit: int = 100) -> int:
+    """Claim and run due jobs in the calling thread; returns jobs run."""
+    ran = 0
+    while ran < limit:
+        job_ids = claim_jobs(min(limit - ran, 50))
+        if not job_ids:
+            break
+        for job_id in job_ids:
+            run_job(job_id)
+        ran += len(job_ids)
+    return ran
+
+
+class Worker:
+    """Polls the queue and runs jobs on a bounded thread pool."""
+
+    def __init__(self, app: Flask, concurrency: int = 4) -> None:
+        self.app = app
+        self.concurrency = concurrency
+        self._stop = threading.Event()
+        self._slots = threading.Semaphore(concurrency)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, job_id: int) -> None:
+        try:
+            with self.app.app_context():
+                run_job(job_id)
+                db.session.remove()
+        except Exception:
+            logger.exception("Worker crashed running job %s", job_id)
+        finally:
+            self._slots.release()
+
+    def run_forever(self) -> None:
+        poll = self.app.config.get("JOBS_POLL_INTERVAL", 1.0)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while not self._stop.is_set():
+                # Only claim what the pool can start right away so leases
+                # are not wasted on jobs waiting in the executor queue.
+                if not self._slots.acquire(timeout=poll):
+                    continue
+                free = 1
+                while free < self.concurrency and self._slots.acquire(
+                    blocking=False
+                ):
+                    free += 1
+                with self.app.app_context():
+                    job_ids = claim_jobs(free)
+                    db.session.remove()
+                for _ in range(free - len(job_ids)):
+                    self._slots.release()
+                for job_id in job_ids:
+                    pool.submit(self._run, job_id)
+                if not job_ids:
+                    self._stop.wait(poll)
+
+
+jobs_cli = AppGroup("jobs", help="Background job queue.")
+
+
+@jobs_cli.command("work")
+@click.option("--concurrency", default=4, show_default=True,
+              help="Number of jobs run in parallel.")
+def work_command(concurrency: int) -> None:
+    """Run a worker until interrupted."""
+    worker = Worker(current_app._get_current_object(),  # type: ignore
+                    concurrency)
+    click.echo(f"Job worker started with {concurrency} threads")
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+@jobs_cli.command("run-pending")
+@click.option("--limit", default=1000, show_default=True)
+def run_pending_command(limit: int) -> None:
+    """Run due jobs once and exit."""
+    click.echo(f"Ran {run_pending(limit)} jobs")
@@ -0,0 +1,158 @@
+"""
+Stateless API authentication with JWTs.
+
+Clients trade a username and password for a short-lived access token and
+a long-lived refresh token (``POST /api/v1/auth/token``) and send the
+access token as ``Authorization: Bearer <token>``.  The subject is the
+same ``user_<id>`` / ``seller_<id>`` token Flask-Login keeps in the
+session, so ``flask_jwt_extended.current_user`` resolves through the
+identity cache and API requests never read or write a session.
+
+Revoking a token records its ``jti`` until the token would have expired
+anyway.  Access tokens live ``JWT_ACCESS_TOKEN_EXPIRES`` (15 minutes), so
+the denylist only ever holds recently revoked tokens plus revoked refresh
+tokens.  It is kept in Redis when ``JWT_DENYLIST_REDIS_URL`` is set
+(one ``EXISTS`` per request, entries expire on their own) and otherwise in
+the ``revoked_tokens`` table (one primary-key lookup per request, pruned
+by ``flask tokens purge``).
+"""
+from datetime import datetime, timezone
+from typing import Any, Optional, Protocol
+
+import click
+from flask import Flask, current_app
+from flask.cli import AppGroup
+from flask_jwt_extended import (
+    create_access_token, create_refresh_token, decode_token
+)
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+from shophive_packages import db, jwt
+from shophive_packages.db_utils import utcnow
+from shophive_packages.models.tokens import RevokedToken
+from shophive_packages.services.identity_service import (
+    CachedIdentity, load_identity
+)
+
+EXTENSION_KEY = "token_denylist"
+
+
+class Denylist(Protocol):
+    def revoke(self, jti: str, expires_at: datetime) -> None:
+        ...
+
+    def is_revoked(self, jti: str) -> bool:
+        ...
+
+
+class DatabaseDenylist:
+    """Revoked ``jti`` values in the ``revoked_tokens`` table."""
+
+    def revoke(self, jti: str, expires_at: datetime) -> None:
+        db.session.add(RevokedToken(jti=jti, expires_at=expires_at))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # already revoked
+
+    def is_revoked(self, jti: str) -> bool:
+        return db.session.scalar(
+            select(RevokedToken.jti).where(RevokedToken.jti == jti)
+        ) is not None
+
+    def purge(self) -> int:
+        result = db.session.execute(
+            delete(RevokedToken).where(RevokedToken.expires_at <= utcnow())
+        )
+        db.session.commit()
+        return int(result.rowcount or 0)
+
+
+class RedisDenylist:
+    """Revoked ``jti`` values as Redis keys that expire with the token."""
+
+    def __init__(self, url: str, prefix: str = "shophive:jwt:") -> None:
+        import redis  # type: ignore
+
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def revoke(self, jti: str, expires_at: datetime) -> None:
+        when = expires_at.replace(tzinfo=timezone.utc)
+        self._redis.set(self.prefix + jti, b"", exat=int(when.timestamp()) + 1)
+
+    def is_revoked(self, jti: str) -> bool:
+        return bool(self._redis.exists(self.prefix + jti))
+
+    def purge(self) -> int:
+        return 0
+
+
+def init_tokens(app: Flask) -> None:
+    url = app.config.get("JWT_DENYLIST_REDIS_URL")
+    app.extensions[EXTENSION_KEY] = (
+        RedisDenylist(url) if url else DatabaseDenylist()
+    )
+
+
+def get_denylist() -> Denylist:
+    denylist = current_app.extensions[EXTENSION_KEY]
+    return denylist  # type: ignore[no-any-return]
+
+
+@jwt.token_in_blocklist_loader
+def _token_revoked(jwt_header: dict, jwt_payload: dict) -> bool:
+    return get_denylist().is_revoked(jwt_payload["jti"])
+
+
+@jwt.user_lookup_loader
+def _token_user(
+    jwt_header: dict, jwt_payload: dict
+) -> Optional[CachedIdentity]:
+    return load_identity(jwt_payload["sub"])
+
+
+def issue_tokens(user: Any) -> dict:
+    """An access/refresh token pair for a buyer or seller."""
+    identity = user.get_id()
+    claims = {"role": user.role}
+    expires = current_app.config["JWT_ACCESS_TOKEN_EXPIRES"]
+    return {
+        "access_token": create_access_token(
+            identity=identity, additional_claims=claims
+        ),
+        "refresh_token": create_refresh_token(
+            identity=identity, additional_claims=claims
+        ),
+        "token_type": "Bearer",
+        "expires_in": int(expires.total_seconds()),
+    }
+
+
+def revoke_token(jwt_payload: dict) -> None:
+    expires_at = datetime.fromtimestamp(
+        jwt_payload["exp"], timezone.utc
+    ).replace(tzinfo=None)
+    get_denylist().revoke(jwt_payload["jti"], expires_at)
+
+
+def revoke_encoded(token: str) -> bool:
+    """Revoke a token the client handed back; False if it is not valid."""
+    try:
+        payload = decode_token(token, allow_expired=True)
+    except Exception:
+        return False
+    revoke_token(payload)
+    return True
+
+
+tokens_cli = AppGroup("tokens", help="API token denylist.")
+
+
+@tokens_cli.command("purge")
+def purge_command() -> None:
+    """Drop denylist entries for tokens that have expired anyway."""
+    denylist = get_denylist()
+    removed = denylist.purge() if hasattr(denylist, "purge") else 0
+    click.echo(f"Purged {removed} expired revocations")
@@ -0,0 +1,40 @@
+"""
+Session interface adjustments applied by the app factory.
+"""
+from typing import Optional, Sequence
+
+from flask import Flask, Request, Response
+from flask.sessions import SessionInterface, SessionMixin
+
+
+class StatelessPathSessionInterface(SessionInterface):
+    """
+    Skips the session store for token-authenticated paths.
+
+    Requests under ``prefixes`` get Flask's read-only null session:
+    nothing is loaded from the store, nothing is saved and no session
+    cookie is set.  Every other request goes to ``inner`` unchanged.
+    """
+
+    def __init__(
+        self, inner: SessionInterface, prefixes: Sequence[str]
+    ) -> None:
+        self.inner = inner
+        self.prefixes = tuple(prefixes)
+
+    def _stateless(self, request: Request) -> bool:
+        return bool(self.prefixes) and request.path.startswith(self.prefixes)
+
+    def open_session(
+        self, app: Flask, request: Request
+    ) -> Optional[SessionMixin]:
+        if self._stateless(request):
+            return self.make_null_session(app)
+        return self.inner.open_session(app, request)
+
+    def save_session(
+        self, app: Flask, session: SessionMixin, response: Response
+    ) -> None:
+        if self.is_null_session(session):
+            return
+        self.inner.save_session(app, session, response)
@@ -1,10 +1,15 @@
 # tests/conftest.py
 import pytest
+from contextlib import contextmanager
+from dataclasses import dataclass
 from shophive_packages import create_app, db
-from shophive_packages.models import User, Product
-from typing import Generator
+from shophive_packages.models import (
+    Cart, Category, Order, OrderItem, Product, Seller, Tag, User
+)
+from typing import Any, Generator, Iterator
 from flask.testing import FlaskClient
-from flask import Flask
+from flask import Flask, g
+from sqlalchemy import event
 
 
 @pytest.fixture
@@ -53,3 +58,113 @@ def test_product(client: FlaskClient) -> Product:
     db.session.add(product)
     db.session.commit()
     return product
+
+
+class QueryBudget:
+    """
+    Fails a test when a block of it runs more SQL statements than allowed.
+
+    ``with query_budget(4): client.get("/cart")`` counts the statements of
+    every engine while the block runs and, when there are more than 4,
+    fails with the numbered list of them.  The ``client`` fixture keeps
+    one app context, and so one ORM session, for the whole test; the
+    block starts with the login cached in ``g`` dropped and every loaded
+    row expired, so it counts what a fresh request would run.
+    """
+
+    def __init__(self) -> None:
+        self.statements: list[str] = []
+
+    def _record(self, conn: Any, cursor: Any, statement: str,
+                *args: Any) -> None:
+        self.statements.append(" ".join(statement.split()))
+
+    @contextmanager
+    def __call__(self, limit: int) -> Iterator[list[str]]:
+        self.statements = []
+        g.pop("_login_user", None)
+        db.session.expire_all()
+        engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._record)
+        try:
+            yield self.statements
+        finally:
+            for engine in engines:
+                event.remove(engine, "before_cursor_execute", self._record)
+        if len(self.statements) > limit:
+            listing = "\n".join(
+                f"{number:>3}. {statement[:200]}"
+                for number, statement in enumerate(self.statements, 1)
+            )
+            pytest.fail(f"{len(self.statements)} SQL statements, "
+                        f"budget {limit}:\n{listing}", pytrace=False)
+
+
+@pytest.fixture
+def query_budget(client: FlaskClient) -> QueryBudget:
+    """Statement budgets for requests made with ``client``."""
+    return QueryBudget()
+
+
+@dataclass
+class SeededShop:
+    buyer_id: int
+    seller_ids: list[int]
+    product_ids: list[int]
+    order_ids: list[int]
+
+
+@pytest.fixture
+def seeded_shop(client: FlaskClient) -> SeededShop:
+    """
+    A shop with realistic cardinalities, so per-row queries show up.
+
+    3 sellers with 20 products each, every product in 2 of 8 tags and
+    1 of 5 categories; a buyer (``testuser``/``testpass``) with 6 cart
+    lines and 10 past orders of 3 items each.
+    """
+    sellers = [Seller(f"seller{i}", f"seller{i}@example.com", "testpass")
+               for i in range(3)]
+    buyer = User(username="testuser", email="test@example.com")
+    buyer.set_password("testpass")
+    tags = [Tag(name=f"tag{i}") for i in range(8)]
+    categories = [Category(name=f"category{i}") for i in range(5)]
+    db.session.add_all([*sellers, buyer, *tags, *categories])
+    db.session.flush()
+
+    products = []
+    for number in range(60):
+        product = Product(
+            name=f"Product {number}",
+            description="A product",
+            price=5 + number,
+            quantity=100,
+            seller_id=sellers[number % 3].id,
+        )
+        product.tags.extend([tags[number % 8], tags[(number + 3) % 8]])
+        product.categories.append(categories[number % 5])
+        products.append(product)
+    db.session.add_all(products)
+    db.session.flush()
+
+    db.session.add_all(Cart(buyer.id, product.id, 1)
+                       for product in products[:6])
+    orders = []
+    for number in range(10):
+        order = Order(buyer_id=buyer.id, total_amount=0)
+        for product in products[number * 3:number * 3 + 3]:
+            order.items.append(OrderItem(
+                product_id=product.id, quantity=1, price=product.price,
+                address="1 Main St", seller_id=product.seller_id,
+            ))
+            order.total_amount += product.price
+        orders.append(order)
+    db.session.add_all(orders)
+    db.session.commit()
+    return SeededShop(
+        buyer.id,
+        [seller.id for seller in sellers],
+        [product.id for product in products],
+        [order.id for order in orders],
+    )
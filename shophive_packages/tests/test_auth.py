@@ -54,3 +54,53 @@ def test_user_login(client: FlaskClient) -> None:
         },
     )
     assert response.status_code == 302  # Redirect after successful login
+
+
+def test_registration_is_case_insensitive_unique(client: FlaskClient) -> None:
+    """Duplicates are caught by the lower() indexes on a single insert."""
+    client.post("/register", json={
+        "username": "NewUser", "email": "New@Example.com", "password": "pw"
+    })
+    response = client.post("/register", json={
+        "username": "newuser", "email": "other@example.com", "password": "pw"
+    })
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Username already exists"
+
+    response = client.post("/register", json={
+        "username": "other", "email": " NEW@example.com", "password": "pw"
+    })
+    assert response.get_json()["error"] == "Email already exists"
+    assert User.query.count() == 1
+    assert User.query.one().email == "new@example.com"
+
+
+def test_find_user_is_one_query(client: FlaskClient) -> None:
+    """Username or email, buyer or seller: one statement, right class."""
+    from sqlalchemy import event
+    from shophive_packages.models import Seller
+    from shophive_packages.services.auth_helpers import find_user
+
+    seller = Seller(username="Shop", email="shop@example.com", password="pw")
+    db.session.add(seller)
+    db.session.commit()
+    seller_id = seller.id
+    db.session.expunge_all()
+
+    statements = []
+
+    def record(conn, cursor, statement, *args) -> None:  # type: ignore
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        by_name = find_user("shop")
+        db.session.expunge_all()
+        by_email = find_user("SHOP@example.com")
+        # Subclass columns came with the row
+        assert by_email is not None and by_email.id == seller_id
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    assert isinstance(by_name, Seller) and isinstance(by_email, Seller)
+    assert len(statements) == 2
+    assert find_user("nobody") is None
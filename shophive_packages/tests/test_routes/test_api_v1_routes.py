@@ -0,0 +1,127 @@
+from typing import Any
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from shophive_packages import db
+from shophive_packages.models import Product, Seller, User
+
+
+def _tokens(client: FlaskClient, username: str = "testuser",
+            password: str = "testpass") -> dict:
+    response = client.post("/api/v1/auth/token", json={
+        "username": username, "password": password
+    })
+    assert response.status_code == 200
+    return dict(response.get_json())
+
+
+def _bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_api_requests_never_touch_the_session(
+    app: Flask, client: FlaskClient, test_user: User,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    product = Product(name="Mug", price=8.50, quantity=5, seller_id=1)
+    db.session.add(product)
+    db.session.commit()
+
+    store = app.session_interface.inner  # type: ignore[attr-defined]
+    calls = []
+
+    def spy(name: str) -> Any:
+        real = getattr(store, name)
+
+        def record(*args: Any) -> Any:
+            calls.append(name)
+            return real(*args)
+        return record
+
+    for name in ("open_session", "save_session"):
+        monkeypatch.setattr(store, name, spy(name))
+
+    auth = _bearer(_tokens(client)["access_token"])
+    response = client.put("/api/v1/cart/items", headers=auth, json={
+        "product_id": product.id, "quantity": 2
+    })
+    assert response.status_code == 200
+    response = client.get("/api/v1/cart", headers=auth)
+    assert response.get_json()["items"][0]["quantity"] == 2
+    assert response.get_json()["total"] == "17.00"
+    assert "Set-Cookie" not in response.headers
+    assert calls == []
+
+    # Browser routes still use the store
+    client.get("/api/products")
+    assert calls == ["open_session", "save_session"]
+
+
+def test_refresh_rotates_and_revoke_denies(
+    client: FlaskClient, test_user: User
+) -> None:
+    tokens = _tokens(client)
+    response = client.post("/api/v1/auth/refresh",
+                           headers=_bearer(tokens["refresh_token"]))
+    assert response.status_code == 200
+    fresh = response.get_json()
+
+    # The used refresh token is revoked by the rotation
+    response = client.post("/api/v1/auth/refresh",
+                           headers=_bearer(tokens["refresh_token"]))
+    assert response.status_code == 401
+
+    response = client.post(
+        "/api/v1/auth/revoke", headers=_bearer(fresh["access_token"]),
+        json={"refresh_token": fresh["refresh_token"]},
+    )
+    assert response.status_code == 200
+    assert client.get(
+        "/api/v1/cart", headers=_bearer(fresh["access_token"])
+    ).status_code == 401
+    assert client.post(
+        "/api/v1/auth/refresh", headers=_bearer(fresh["refresh_token"])
+    ).status_code == 401
+
+
+def test_orders_are_placed_and_listed_for_the_caller(
+    client: FlaskClient, test_user: User
+) -> None:
+    product = Product(name="Lamp", price=10.00, quantity=5, seller_id=1)
+    db.session.add(product)
+    db.session.commit()
+    auth = _bearer(_tokens(client)["access_token"])
+
+    response = client.post("/api/v1/orders", headers=auth, json={
+        "address": "1 Main St",
+        "items": [{"product_id": product.id, "quantity": 2}],
+    })
+    assert response.status_code == 201
+    order_id = response.get_json()["order_id"]
+
+    orders = client.get("/api/v1/orders", headers=auth).get_json()["orders"]
+    assert [o["order_id"] for o in orders] == [order_id]
+    assert orders[0]["total_amount"] == "20.00"
+
+    other = User(username="other", email="other@example.com")
+    other.set_password("pw")
+    db.session.add(other)
+    db.session.commit()
+    other_auth = _bearer(_tokens(client, "other", "pw")["access_token"])
+    assert client.get(
+        f"/api/v1/orders/{order_id}", headers=other_auth
+    ).status_code == 404
+
+
+def test_sellers_have_no_cart_and_anonymous_is_rejected(
+    client: FlaskClient
+) -> None:
+    seller = Seller(username="shop", email="shop@example.com", password="pw")
+    db.session.add(seller)
+    db.session.commit()
+    auth = _bearer(_tokens(client, "shop", "pw")["access_token"])
+    assert client.get("/api/v1/cart", headers=auth).status_code == 403
+    assert client.get("/api/v1/cart").status_code == 401
+    assert client.get("/api/v1/products").status_code == 200
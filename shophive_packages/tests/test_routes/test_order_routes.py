@@ -0,0 +1,237 @@
+import pytest
+from flask.testing import FlaskClient
+from sqlalchemy import event
+from shophive_packages import db
+from shophive_packages.models import (
+    Order, OrderHistory, OrderItem, Product, Seller, SellerSalesDaily, User
+)
+from shophive_packages.services.rollup_service import rebuild_rollups
+
+
+def _create_order(client: FlaskClient, seller_id: int = 1) -> int:
+    """Place an order through the API and return its id."""
+    product = Product(name="Kettle", price=20.00, quantity=10,
+                      seller_id=seller_id)
+    db.session.add(product)
+    db.session.commit()
+    response = client.post("/api/orders", json={
+        "user_id": 1,
+        "address": "1 Main St",
+        "items": [{"product_id": product.id, "quantity": 1, "price": 20.00}],
+    })
+    return int(response.get_json()["data"]["order_id"])
+
+
+def test_status_update_appends_history(
+    client: FlaskClient, test_user: User
+) -> None:
+    """Valid transitions update the order and are recorded in history."""
+    order_id = _create_order(client)
+
+    for status in ("Processing", "Shipped"):
+        response = client.patch(f"/api/orders/{order_id}",
+                                json={"status": status})
+        assert response.status_code == 200
+
+    response = client.get(f"/api/orders/{order_id}/status")
+    assert response.get_json()["data"]["current_status"] == "Shipped"
+
+    response = client.get(f"/api/orders/{order_id}/history")
+    assert response.status_code == 200
+    events = response.get_json()["data"]
+    assert [e["status"] for e in events] == [
+        "Pending", "Processing", "Shipped"
+    ]
+    assert [e["from_status"] for e in events] == [
+        None, "Pending", "Processing"
+    ]
+
+
+def test_invalid_transitions_are_rejected(
+    client: FlaskClient, test_user: User
+) -> None:
+    """Unknown statuses and illegal moves leave the order untouched."""
+    order_id = _create_order(client)
+
+    response = client.patch(f"/api/orders/{order_id}",
+                            json={"status": "Lost"})
+    assert response.status_code == 400
+
+    response = client.patch(f"/api/orders/{order_id}",
+                            json={"status": "Delivered"})
+    assert response.status_code == 409
+
+    assert db.session.get(Order, order_id).status == "Pending"
+    assert OrderHistory.query.filter_by(order_id=order_id).count() == 1
+
+
+def test_history_is_paginated(client: FlaskClient, test_user: User) -> None:
+    """The after_id cursor walks the history in order."""
+    order_id = _create_order(client)
+    client.patch(f"/api/orders/{order_id}", json={"status": "Processing"})
+
+    first = client.get(
+        f"/api/orders/{order_id}/history?limit=1").get_json()
+    assert [e["status"] for e in first["data"]] == ["Pending"]
+
+    second = client.get(
+        f"/api/orders/{order_id}/history"
+        f"?limit=1&after_id={first['next_after_id']}"
+    ).get_json()
+    assert [e["status"] for e in second["data"]] == ["Processing"]
+
+
+def test_history_rows_cannot_change(
+    client: FlaskClient, test_user: User
+) -> None:
+    """History events are append-only."""
+    order_id = _create_order(client)
+    event = OrderHistory.query.filter_by(order_id=order_id).first()
+    event.note = "edited"
+    with pytest.raises(ValueError):
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_seller_orders_are_paginated(
+    client: FlaskClient, test_user: User
+) -> None:
+    """Seller order lines come back newest first with a keyset cursor."""
+    order_ids = [_create_order(client) for _ in range(3)]
+
+    first = client.get("/api/sellers/1/orders?limit=2").get_json()
+    assert [o["order_id"] for o in first["data"]] == order_ids[:0:-1]
+
+    second = client.get(
+        f"/api/sellers/1/orders?limit=2&before_id={first['next_before_id']}"
+    ).get_json()
+    assert [o["order_id"] for o in second["data"]] == order_ids[:1]
+    assert second["next_before_id"] is None
+
+
+def test_dashboard_reads_rollups(client: FlaskClient, test_user: User) -> None:
+    """Rollups follow new orders and cancellations and match a rebuild."""
+    seller = Seller("shop", "shop@example.com", "testpass")
+    db.session.add(seller)
+    db.session.commit()
+    order_ids = [_create_order(client, seller.id) for _ in range(2)]
+    client.patch(f"/api/orders/{order_ids[0]}", json={"status": "Cancelled"})
+    dashboard = f"/api/sellers/{seller.id}/dashboard"
+    assert client.get(dashboard).status_code == 401
+
+    client.post("/user/login", data={
+        "username": "shop", "password": "testpass"
+    })
+    assert client.get(
+        f"/api/sellers/{seller.id + 1}/dashboard"
+    ).status_code == 403
+    for granularity in ("daily", "hourly"):
+        data = client.get(
+            f"{dashboard}?granularity={granularity}"
+        ).get_json()["data"]
+        assert data["revenue"] == 20.00
+        assert data["units"] == 1
+        assert [b["order_lines"] for b in data["buckets"]] == [1]
+
+    incremental = [
+        (r.product_id, r.units, float(r.revenue))
+        for r in SellerSalesDaily.query.order_by(SellerSalesDaily.product_id)
+    ]
+    rebuild_rollups()
+    rebuilt = [
+        (r.product_id, r.units, float(r.revenue))
+        for r in SellerSalesDaily.query.order_by(SellerSalesDaily.product_id)
+        if r.units
+    ]
+    assert [row for row in incremental if row[1]] == rebuilt
+
+
+BATCH_AUTH = {"Authorization": "Bearer batch-token"}
+
+
+def _allow_batches(client: FlaskClient) -> None:
+    client.application.config["ORDER_BATCH_TOKEN"] = "batch-token"
+
+
+def test_batch_orders_need_a_credential(
+    client: FlaskClient, test_user: User
+) -> None:
+    _allow_batches(client)
+    body = {"orders": [{"user_id": 1, "items": []}]}
+    assert client.post("/api/orders/batch", json=body).status_code == 401
+    assert client.post(
+        "/api/orders/batch", json=body,
+        headers={"Authorization": "Bearer wrong"},
+    ).status_code == 401
+    client.post("/user/login", data={
+        "username": "testuser", "password": "testpass"
+    })
+    assert client.post("/api/orders/batch", json=body).status_code == 401
+
+
+def test_batch_orders_report_per_order_results(
+    client: FlaskClient, test_user: User
+) -> None:
+    """Valid orders are placed at catalogue prices; the rest are rejected."""
+    _allow_batches(client)
+    product = Product(name="Kettle", price=20.00, quantity=3, seller_id=7)
+    db.session.add(product)
+    db.session.commit()
+    line = {"product_id": product.id, "quantity": 2, "price": 0.01}
+
+    orders = [
+        {"user_id": 1, "address": "1 Main St", "items": [line]},
+        {"user_id": 1, "items": [line]},
+        {"user_id": 1, "items": [{"product_id": 999, "quantity": 1}]},
+        {"user_id": "x", "items": [line]},
+        {"user_id": True, "items": [line]},
+        {"user_id": 1, "items": [{**line, "quantity": True}]},
+        {"user_id": 404, "items": [line]},
+    ]
+    response = client.post("/api/orders/batch", headers=BATCH_AUTH,
+                           json={"orders": orders})
+
+    assert response.status_code == 200
+    data = response.get_json()["data"]
+    assert (data["created"], data["rejected"]) == (1, 6)
+    assert [r.get("error") for r in data["results"]] == [
+        None, "insufficient_stock", "product_not_found", "invalid",
+        "invalid", "invalid", "buyer_not_found",
+    ]
+    assert data["results"][0]["total_amount"] == 40.00
+    item = OrderItem.query.one()
+    assert (item.seller_id, float(item.price)) == (7, 20.00)
+    assert db.session.get(Product, product.id).quantity == 1
+
+
+def test_batch_statement_count_is_bounded(
+    client: FlaskClient, test_user: User
+) -> None:
+    """A large batch costs no more statements than a small one."""
+    _allow_batches(client)
+    product = Product(name="Kettle", price=20.00, quantity=1000, seller_id=1)
+    db.session.add(product)
+    db.session.commit()
+
+    def count_statements(size: int) -> int:
+        statements = []
+
+        def record(*args: object) -> None:
+            statements.append(args)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            client.post("/api/orders/batch", headers=BATCH_AUTH, json={
+                "orders": [
+                    {"user_id": 1, "items": [
+                        {"product_id": product.id, "quantity": 1}
+                    ]}
+                    for _ in range(size)
+                ]
+            })
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+        return len(statements)
+
+    assert count_statements(100) == count_statements(5)
+    assert Order.query.count() == 105
@@ -0,0 +1,142 @@
+import json
+import threading
+from typing import Iterator
+
+from flask import Flask
+from flask.testing import FlaskClient
+from shophive_packages import db
+from shophive_packages.models import OrderHistory, Product, User
+from shophive_packages.routes.order_stream_routes import _stream
+from shophive_packages.services.order_events import (
+    InProcessBroker, RedisBroker, Subscription, get_broker
+)
+
+
+def _login_and_order(client: FlaskClient, user: User) -> int:
+    """Log the test user in and place an order for them."""
+    product = Product(name="Tent", price=80.00, quantity=3, seller_id=1)
+    db.session.add(product)
+    db.session.commit()
+    response = client.post("/api/orders", json={
+        "user_id": user.id,
+        "address": "1 Main St",
+        "items": [{"product_id": product.id, "quantity": 1, "price": 80.00}],
+    })
+    client.post("/user/login", data={
+        "username": "testuser",
+        "password": "testpass"
+    })
+    return int(response.get_json()["data"]["order_id"])
+
+
+def test_committed_change_reaches_subscriber(
+    client: FlaskClient, test_user: User
+) -> None:
+    """Status changes are pushed to subscribers once committed."""
+    order_id = _login_and_order(client, test_user)
+    broker = get_broker()
+    sub = broker.subscribe([order_id])
+
+    client.patch(f"/api/orders/{order_id}", json={"status": "Processing"})
+
+    events = sub.drain(timeout=1)
+    broker.unsubscribe(sub)
+    assert [e["status"] for e in events] == ["Processing"]
+    assert broker.subscriber_count() == 0
+
+
+def test_stream_resumes_from_last_event_id(
+    app: Flask, client: FlaskClient, test_user: User
+) -> None:
+    """A reconnecting client gets the changes it missed."""
+    app.config.update(SSE_MAX_STREAM_SECONDS=0.2, SSE_HEARTBEAT_SECONDS=0.05)
+    order_id = _login_and_order(client, test_user)
+    created = OrderHistory.query.filter_by(order_id=order_id).first()
+    client.patch(f"/api/orders/{order_id}", json={"status": "Processing"})
+
+    response = client.get(
+        f"/api/orders/stream?order_id={order_id}",
+        headers={"Last-Event-ID": str(created.id)},
+    )
+    body = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    assert '"status": "Processing"' in body
+    assert '"from_status": null' not in body
+    assert ": keep-alive" in body
+
+
+def test_stream_refuses_other_buyers_orders(
+    client: FlaskClient, test_user: User
+) -> None:
+    """Buyers can only follow their own orders."""
+    order_id = _login_and_order(client, test_user)
+    response = client.get(f"/api/orders/stream?order_id={order_id + 1}")
+    assert response.status_code == 404
+
+
+def test_slow_subscriber_buffer_is_bounded() -> None:
+    """A full buffer drops the oldest events and flags a resync."""
+    sub = Subscription([1], maxsize=2)
+    for n in range(5):
+        sub.push({"id": n, "order_id": 1})
+    assert [e["id"] for e in sub.drain(timeout=0)] == [3, 4]
+    assert sub.overflowed
+
+
+def test_out_of_order_events_are_not_dropped() -> None:
+    """Only events sent from the backlog are skipped, whatever their id."""
+    broker = InProcessBroker()
+    sub = broker.subscribe([1, 2])
+    for event_id, order_id in ((5, 1), (7, 2), (6, 1)):
+        sub.push({"id": event_id, "order_id": order_id})
+    body = "".join(_stream(broker, sub, [{"id": 5, "order_id": 1}],
+                           heartbeat=0.05, max_duration=0.1))
+    sent = [line for line in body.splitlines() if line.startswith("id: ")]
+    assert sent == ["id: 5", "id: 7", "id: 6"]
+
+
+class _FlakyPubSub:
+    """Drops the connection on first use, then delivers one event."""
+
+    def __init__(self, attempt: int) -> None:
+        self.attempt = attempt
+
+    def subscribe(self, channel: str) -> None:
+        pass
+
+    def listen(self) -> Iterator[dict]:
+        if self.attempt == 1:
+            raise ConnectionError("Connection reset by peer")
+        yield {"data": json.dumps({"id": 9, "order_id": 1})}
+        threading.Event().wait()  # then stay connected and quiet
+
+    def close(self) -> None:
+        pass
+
+
+class _FlakyRedis:
+    def __init__(self) -> None:
+        self.attempts = 0
+
+    def pubsub(self, **kwargs: object) -> _FlakyPubSub:
+        self.attempts += 1
+        return _FlakyPubSub(self.attempts)
+
+
+def test_redis_listener_reconnects_and_asks_for_resync() -> None:
+    """A dropped Redis connection does not end delivery for good."""
+    broker = RedisBroker("redis://localhost:6379/0")
+    broker.RECONNECT_DELAY = 0.01
+    broker._redis = _FlakyRedis()
+
+    sub = broker.subscribe([1])
+    events = []
+    for _ in range(100):
+        events += sub.drain(timeout=0.05)
+        if events:
+            break
+
+    assert sub.overflowed  # streams are told to refetch what they missed
+    assert [e["id"] for e in events] == [9]
@@ -0,0 +1,59 @@
+# tests/test_routes/test_query_budgets.py
+"""
+SQL statement budgets for the busiest routes.
+
+Each budget is the number of statements the route runs today against
+``seeded_shop``.  A change that makes a route run more fails here; lower
+the budget when a route gets cheaper.
+"""
+import pytest
+from flask.testing import FlaskClient
+
+from shophive_packages.tests.conftest import QueryBudget, SeededShop
+
+
+@pytest.fixture
+def buyer(client: FlaskClient, seeded_shop: SeededShop) -> SeededShop:
+    client.post("/user/login", data={
+        "username": "testuser", "password": "testpass"
+    })
+    return seeded_shop
+
+
+@pytest.mark.parametrize("path, budget", [
+    ("/", 1),
+    ("/product/{product_id}", 1),
+    ("/products/page/1", 2),
+])
+def test_catalog_pages(
+    client: FlaskClient, seeded_shop: SeededShop,
+    query_budget: QueryBudget, path: str, budget: int
+) -> None:
+    url = path.format(product_id=seeded_shop.product_ids[0])
+    with query_budget(budget):
+        assert client.get(url).status_code == 200
+
+
+@pytest.mark.parametrize("path, budget", [
+    ("/cart", 19),
+    ("/checkout", 11),
+    ("/buyer/orders", 12),
+    ("/api/orders", 21),
+    ("/api/orders/{order_id}", 12),
+    ("/api/orders/{order_id}/history", 12),
+])
+def test_buyer_pages(
+    client: FlaskClient, buyer: SeededShop,
+    query_budget: QueryBudget, path: str, budget: int
+) -> None:
+    url = path.format(order_id=buyer.order_ids[0])
+    with query_budget(budget):
+        assert client.get(url).status_code == 200
+
+
+def test_going_over_budget_fails(
+    client: FlaskClient, seeded_shop: SeededShop, query_budget: QueryBudget
+) -> None:
+    with pytest.raises(pytest.fail.Exception, match="1 SQL statements"):
+        with query_budget(0):
+            client.get("/")
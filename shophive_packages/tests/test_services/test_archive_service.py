@@ -0,0 +1,110 @@
+# tests/test_services/test_archive_service.py
+from datetime import timedelta
+
+from flask.testing import FlaskClient
+from sqlalchemy import update
+
+from shophive_packages import db
+from shophive_packages.db_utils import utcnow
+from shophive_packages.models import (
+    ArchivedOrder, ArchivedOrderHistory, ArchivedOrderItem, Order,
+    OrderHistory, OrderItem, Product, SellerSalesDaily, User
+)
+from shophive_packages.services.archive_service import archive_orders
+from shophive_packages.services.rollup_service import rebuild_rollups
+
+
+def _place_order(client: FlaskClient, status: str, age_days: int) -> int:
+    """Place an order, move it to ``status`` and backdate it."""
+    product = Product(name="Mug", price=8.00, quantity=10, seller_id=1)
+    db.session.add(product)
+    db.session.commit()
+    response = client.post("/api/orders", json={
+        "user_id": 1,
+        "address": "1 Main St",
+        "items": [{"product_id": product.id, "quantity": 1, "price": 8.00}],
+    })
+    order_id = int(response.get_json()["data"]["order_id"])
+    path = {
+        "Delivered": ("Processing", "Shipped", "Delivered"),
+        "Cancelled": ("Cancelled",),
+        "Pending": (),
+    }[status]
+    for step in path:
+        client.patch(f"/api/orders/{order_id}", json={"status": step})
+    db.session.execute(
+        update(Order)
+        .where(Order.id == order_id)
+        .values(updated_at=utcnow() - timedelta(days=age_days))
+    )
+    db.session.commit()
+    return order_id
+
+
+def test_archive_moves_only_old_finished_orders(
+    client: FlaskClient, test_user: User
+) -> None:
+    """Old delivered/cancelled orders move with their lines and history."""
+    old_delivered = _place_order(client, "Delivered", 400)
+    old_cancelled = _place_order(client, "Cancelled", 400)
+    old_pending = _place_order(client, "Pending", 400)
+    recent = _place_order(client, "Delivered", 10)
+
+    assert archive_orders(batch_size=1) == 2
+    assert archive_orders(batch_size=1) == 0
+
+    assert {o.id for o in Order.query} == {old_pending, recent}
+    assert {o.id for o in ArchivedOrder.query} == {
+        old_delivered, old_cancelled
+    }
+    assert ArchivedOrderItem.query.count() == 2
+    assert OrderItem.query.count() == 2
+    assert ArchivedOrderHistory.query.filter_by(
+        order_id=old_delivered
+    ).count() == 4
+    assert OrderHistory.query.filter_by(order_id=old_delivered).count() == 0
+
+
+def test_reads_use_archive_only_when_asked(
+    client: FlaskClient, test_user: User
+) -> None:
+    """Archived orders are hidden unless include_archived is passed."""
+    archived = _place_order(client, "Delivered", 400)
+    live = _place_order(client, "Pending", 0)
+    archive_orders()
+
+    assert client.get(f"/api/orders/{archived}").status_code == 404
+    response = client.get(f"/api/orders/{archived}?include_archived=1")
+    assert response.status_code == 200
+    assert response.get_json()["data"]["status"] == "Delivered"
+
+    history = client.get(
+        f"/api/orders/{archived}/history?include_archived=1"
+    ).get_json()["data"]
+    assert history[-1]["status"] == "Delivered"
+
+    hot = client.get("/api/user/1/orders").get_json()["data"]
+    assert [o["order_id"] for o in hot] == [live]
+    both = client.get("/api/user/1/orders?include_archived=1").get_json()
+    assert [o["order_id"] for o in both["data"]] == [live, archived]
+
+    page = client.get(
+        "/api/sellers/1/orders?include_archived=1&limit=1"
+    ).get_json()
+    assert [o["order_id"] for o in page["data"]] == [live]
+    older = client.get(
+        "/api/sellers/1/orders?include_archived=1&limit=1"
+        f"&before_id={page['next_before_id']}"
+    ).get_json()
+    assert [o["order_id"] for o in older["data"]] == [archived]
+
+
+def test_rebuild_counts_archived_sales(
+    client: FlaskClient, test_user: User
+) -> None:
+    """Rebuilding rollups after archiving keeps archived revenue."""
+    _place_order(client, "Delivered", 400)
+    archive_orders()
+
+    rebuild_rollups()
+    assert sum(r.units for r in SellerSalesDaily.query) == 1
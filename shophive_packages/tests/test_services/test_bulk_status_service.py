@@ -0,0 +1,158 @@
+# tests/test_services/test_bulk_status_service.py
+from flask.testing import FlaskClient
+from sqlalchemy import func, insert, select
+
+from shophive_packages import db
+from shophive_packages.models import (
+    Order, OrderHistory, OrderItem, Product, Seller
+)
+from shophive_packages.services.bulk_status_service import (
+    OrderFilter, bulk_transition
+)
+from shophive_packages.services.order_events import get_broker
+
+
+def _seed_orders(
+    count: int, status: str = "Pending", seller_id: int = 1
+) -> list[int]:
+    """Insert ``count`` single-line orders for one seller in bulk."""
+    product = Product(name="Lamp", price=5.00, quantity=count)
+    db.session.add(product)
+    db.session.flush()
+    first = (db.session.scalar(select(func.max(Order.id))) or 0) + 1
+    ids = list(range(first, first + count))
+    db.session.execute(insert(Order), [
+        {"id": i, "buyer_id": 1, "total_amount": 5.00, "status": status}
+        for i in ids
+    ])
+    db.session.execute(insert(OrderItem), [
+        {
+            "order_id": i, "product_id": product.id, "seller_id": seller_id,
+            "quantity": 1, "price": 5.00, "address": "", "status": status,
+        }
+        for i in ids
+    ])
+    db.session.commit()
+    return ids
+
+
+def test_bulk_transition_reports_rejections(client: FlaskClient) -> None:
+    """Valid orders move; unknown and ineligible ones are reported."""
+    pending = _seed_orders(3)
+    shipped = _seed_orders(1, status="Shipped")
+
+    result = bulk_transition(
+        "Processing", pending + shipped + [999999], note="picked"
+    )
+
+    assert result.updated == 3
+    assert {r["reason"] for r in result.rejected} == {
+        "invalid_transition_from_Shipped", "not_found"
+    }
+    assert Order.query.filter_by(status="Processing").count() == 3
+    assert OrderItem.query.filter_by(status="Processing").count() == 3
+    history = OrderHistory.query.filter_by(status="Processing").all()
+    assert {(h.order_id, h.from_status, h.note) for h in history} == {
+        (i, "Pending", "picked") for i in pending
+    }
+
+
+def test_bulk_transition_publishes_events(client: FlaskClient) -> None:
+    """Bulk-inserted history still reaches stream subscribers."""
+    order_ids = _seed_orders(2)
+    subscription = get_broker().subscribe(order_ids)
+    try:
+        bulk_transition("Cancelled", order_ids)
+        events = subscription.drain(timeout=1.0)
+    finally:
+        get_broker().unsubscribe(subscription)
+
+    assert sorted(e["order_id"] for e in events) == order_ids
+    assert {e["status"] for e in events} == {"Cancelled"}
+
+
+def test_bulk_transition_by_filter(client: FlaskClient) -> None:
+    """Filters are walked in chunks and re-running is a no-op."""
+    order_ids = _seed_orders(2500)
+    order_filter = OrderFilter(seller_id=1, status="Pending")
+
+    result = bulk_transition("Processing", order_filter=order_filter,
+                             chunk_size=1000)
+    assert result.updated == len(order_ids)
+    assert Order.query.filter_by(status="Pending").count() == 0
+
+    again = bulk_transition("Processing", order_filter=order_filter)
+    assert again.updated == 0
+
+
+def _login_seller(client: FlaskClient) -> Seller:
+    seller = Seller("shop", "shop@example.com", "testpass")
+    db.session.add(seller)
+    db.session.commit()
+    client.post("/user/login", data={
+        "username": "shop", "password": "testpass"
+    })
+    return seller
+
+
+def test_bulk_transition_by_seller_skips_shared_orders(
+    client: FlaskClient
+) -> None:
+    """A seller filter never moves another seller's lines."""
+    own = _seed_orders(2, seller_id=7)
+    shared = _seed_orders(1, seller_id=7)
+    db.session.add(OrderItem(order_id=shared[0], product_id=1, seller_id=8,
+                             quantity=1, price=5.00, address=""))
+    db.session.commit()
+
+    result = bulk_transition("Processing", own + shared,
+                             OrderFilter(seller_id=7))
+
+    assert result.updated == 2
+    assert result.rejected == [{"order_id": shared[0],
+                                "reason": "not_found"}]
+    assert db.session.get(Order, shared[0]).status == "Pending"
+
+
+def test_bulk_status_route(client: FlaskClient) -> None:
+    """The endpoint validates the status and returns the summary."""
+    seller = _login_seller(client)
+    order_ids = _seed_orders(2, seller_id=seller.id)
+
+    response = client.post("/api/orders/bulk-status",
+                           json={"status": "Lost", "order_ids": order_ids})
+    assert response.status_code == 400
+
+    response = client.post("/api/orders/bulk-status",
+                           json={"status": "Processing",
+                                 "order_ids": order_ids})
+    assert response.status_code == 200
+    assert response.get_json()["data"]["updated"] == 2
+
+
+def test_bulk_status_route_is_scoped_to_the_seller(
+    client: FlaskClient
+) -> None:
+    """Anonymous callers are refused; sellers only move their orders."""
+    others = _seed_orders(2, seller_id=999)
+    response = client.post("/api/orders/bulk-status",
+                           json={"status": "Cancelled", "filter": {}})
+    assert response.status_code == 401
+
+    seller = _login_seller(client)
+    own = _seed_orders(1, seller_id=seller.id)
+    response = client.post("/api/orders/bulk-status",
+                           json={"status": "Cancelled",
+                                 "filter": {"seller_id": 999}})
+    assert response.status_code == 403
+
+    response = client.post("/api/orders/bulk-status",
+                           json={"status": "Cancelled", "filter": {}})
+    assert response.get_json()["data"]["updated"] == 1
+    response = client.post("/api/orders/bulk-status",
+                           json={"status": "Cancelled",
+                                 "order_ids": others})
+    assert response.get_json()["data"]["updated"] == 0
+    assert {o.status for o in Order.query.filter(Order.id.in_(others))} \
+        == {"Pending"}
+    assert db.session.get(Order, own[0]).status == "Cancelled"
@@ -0,0 +1,42 @@
+# tests/test_services/test_db_pool.py
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from config import ProductionConfig, postgres_engine_options
+from shophive_packages.services.db_pool import pool_report
+
+
+def test_engine_options_suit_direct_and_pgbouncer_connections() -> None:
+    direct = postgres_engine_options(
+        pool_size=8, max_overflow=2, pool_timeout=5, pool_recycle=1800,
+        statement_timeout_ms=5000, lock_timeout_ms=2000,
+    )
+    assert direct["pool_size"] == 8 and direct["pool_pre_ping"]
+    assert direct["connect_args"]["options"] == (
+        "-c statement_timeout=5000 -c lock_timeout=2000"
+    )
+    behind_bouncer = postgres_engine_options(
+        pool_size=8, max_overflow=2, pool_timeout=5, pool_recycle=1800,
+        statement_timeout_ms=5000, lock_timeout_ms=2000, pgbouncer=True,
+    )
+    assert "options" not in behind_bouncer["connect_args"]
+    assert ProductionConfig.SQLALCHEMY_DATABASE_URI.startswith("postgresql")
+
+
+def test_pool_report_flags_an_oversubscribed_server(tmp_path: Path) -> None:
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=QueuePool,
+        pool_size=6, max_overflow=4, pool_recycle=1800, pool_pre_ping=True,
+    )
+    report = pool_report(engine, processes=12)
+    assert report.error is None
+    assert report.per_process == 10
+    assert "connections: 10 per process x 12 processes = 120" \
+        in report.lines()
+    assert report.problems() == []
+
+    report.max_connections = 100
+    assert "exceeds max_connections 100" in report.problems()[0]
+    assert engine.pool.checkedout() == 0
@@ -0,0 +1,102 @@
+# tests/test_services/test_guest_cart.py
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from sqlalchemy import event
+
+from shophive_packages import db
+from shophive_packages.models import Cart, Product, User
+from shophive_packages.services.guest_cart import (
+    decode_cart, encode_cart, price_guest_cart
+)
+
+
+@pytest.fixture
+def cookie_mode(app: Flask) -> None:
+    app.config["GUEST_CART_COOKIE"] = True
+
+
+def _products(*prices: float) -> list[Product]:
+    products = [Product(name=f"Item {i}", price=price, quantity=10,
+                        seller_id=1) for i, price in enumerate(prices)]
+    db.session.add_all(products)
+    db.session.commit()
+    return products
+
+
+def test_cookie_is_signed_and_bounded(app: Flask, client: FlaskClient) -> None:
+    value = encode_cart([{"product_id": 12, "quantity": 2},
+                         {"product_id": 7, "quantity": 1}])
+    assert value.startswith("12-2_7-1.")
+    assert decode_cart(value) == [{"product_id": 12, "quantity": 2},
+                                  {"product_id": 7, "quantity": 1}]
+    assert decode_cart(value.replace("12-2", "12-9")) == []
+    assert decode_cart("garbage") == []
+
+    app.config.update(GUEST_CART_MAX_LINES=3, GUEST_CART_MAX_QUANTITY=5)
+    value = encode_cart([{"product_id": i, "quantity": 50}
+                         for i in range(10)])
+    assert decode_cart(value) == [{"product_id": i, "quantity": 5}
+                                  for i in range(3)]
+
+
+def test_guest_cart_is_priced_in_one_query(client: FlaskClient) -> None:
+    mug_id, lamp_id = (p.id for p in _products(8.50, 10.00))
+    statements = []
+
+    def count(*args: object) -> None:
+        statements.append(1)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        lines, total = price_guest_cart([
+            {"product_id": mug_id, "quantity": 2},
+            {"product_id": lamp_id, "quantity": 1},
+            {"product_id": 999, "quantity": 1},
+        ])
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    assert len(statements) == 1
+    assert [(p.id, q) for p, q in lines] == [(mug_id, 2), (lamp_id, 1)]
+    assert str(total) == "27.00"
+
+
+def test_anonymous_cart_lives_in_the_cookie(
+    app: Flask, client: FlaskClient, cookie_mode: None
+) -> None:
+    (mug,) = _products(8.50)
+    client.post("/cart/add", data={"product_id": mug.id, "quantity": 2})
+    cookie = client.get_cookie("shophive_cart")
+    assert cookie is not None
+    assert decode_cart(cookie.value) == [
+        {"product_id": mug.id, "quantity": 2}
+    ]
+    # No server-side session, not even for the "added" flash
+    assert client.get_cookie("shophive_session") is None
+
+    response = client.get("/cart")
+    assert b"Item 0" in response.data
+    client.post("/cart/update", data={"remove": mug.id})
+    assert client.get_cookie("shophive_cart") is None
+    assert client.get_cookie("shophive_session") is None
+
+
+def test_guest_cart_merges_into_the_buyer_cart_on_login(
+    client: FlaskClient, test_user: User, cookie_mode: None
+) -> None:
+    mug, lamp = _products(8.50, 10.00)
+    db.session.add(Cart(test_user.id, mug.id, 1))
+    db.session.commit()
+    client.set_cookie("shophive_cart", encode_cart([
+        {"product_id": mug.id, "quantity": 2},
+        {"product_id": lamp.id, "quantity": 1},
+        {"product_id": 999, "quantity": 1},
+    ]))
+
+    client.post("/user/login", data={
+        "username": "testuser", "password": "testpass"
+    })
+    lines = {c.product_id: c.quantity for c in
+             Cart.query.filter_by(user_id=test_user.id)}
+    assert lines == {mug.id: 3, lamp.id: 1}
+    assert client.get_cookie("shophive_cart") is None
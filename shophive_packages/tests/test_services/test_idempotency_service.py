@@ -0,0 +1,188 @@
+# tests/test_services/test_idempotency_service.py
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from config import TestingConfig, config
+from shophive_packages import create_app, db
+from shophive_packages.db_utils import utcnow
+from shophive_packages.models import IdempotencyKey, Order, Product, User
+
+
+def _order_payload(product_id: int, quantity: int = 1) -> dict:
+    return {
+        "user_id": 1,
+        "address": "1 Main St",
+        "items": [
+            {"product_id": product_id, "quantity": quantity, "price": 5.00}
+        ],
+    }
+
+
+def _stocked_product() -> int:
+    product = Product(name="Mug", price=5.00, quantity=10, seller_id=1)
+    db.session.add(product)
+    db.session.commit()
+    return int(product.id)
+
+
+def test_retry_replays_first_response(
+    client: FlaskClient, test_user: User
+) -> None:
+    """A retried order with the same key returns the original order."""
+    payload = _order_payload(_stocked_product())
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first = client.post("/api/orders", json=payload, headers=headers)
+    second = client.post("/api/orders", json=payload, headers=headers)
+
+    assert first.status_code == second.status_code == 201
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert first.get_json()["data"] == second.get_json()["data"]
+    assert Order.query.count() == 1
+
+
+def test_key_reuse_with_other_body_is_rejected(
+    client: FlaskClient, test_user: User
+) -> None:
+    """The same key cannot be used for a different request."""
+    product_id = _stocked_product()
+    headers = {"Idempotency-Key": "reuse-1"}
+
+    client.post("/api/orders", json=_order_payload(product_id),
+                headers=headers)
+    response = client.post("/api/orders", json=_order_payload(product_id, 2),
+                           headers=headers)
+
+    assert response.status_code == 422
+    assert Order.query.count() == 1
+
+
+def test_key_of_a_dead_request_is_reclaimed_after_its_lease(
+    app: Flask, client: FlaskClient, test_user: User
+) -> None:
+    """A key left in progress is refused until its lease runs out."""
+    app.config["IDEMPOTENCY_WAIT_SECONDS"] = 0
+    payload = _order_payload(_stocked_product())
+    headers = {"Idempotency-Key": "crash-1"}
+    client.post("/api/orders", json=payload, headers=headers)
+    assert IdempotencyKey.query.one().expires_at > (
+        utcnow() + timedelta(hours=23)
+    )
+    # The worker died before storing a response
+    IdempotencyKey.query.update({
+        "status": "in_progress",
+        "expires_at": utcnow() + timedelta(seconds=60),
+    })
+    db.session.commit()
+
+    response = client.post("/api/orders", json=payload, headers=headers)
+    assert response.status_code == 409
+
+    IdempotencyKey.query.update(
+        {"expires_at": utcnow() - timedelta(seconds=1)}
+    )
+    db.session.commit()
+    db.session.expunge_all()
+    response = client.post("/api/orders", json=payload, headers=headers)
+    assert response.status_code == 201
+    assert "Idempotent-Replayed" not in response.headers
+
+
+def test_waiting_duplicate_holds_no_transaction_while_sleeping(
+    app: Flask, client: FlaskClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A duplicate polls with its transaction closed between looks."""
+    from shophive_packages.services import idempotency_service
+
+    app.config["IDEMPOTENCY_WAIT_SECONDS"] = 0.05
+    db.session.add(IdempotencyKey(
+        scope="orders", key="slow-1", fingerprint="x",
+        status="in_progress",
+        expires_at=utcnow() + timedelta(seconds=60),
+    ))
+    db.session.commit()
+    open_while_sleeping = []
+    sleep = idempotency_service.time.sleep
+
+    def watch(seconds: float) -> None:
+        open_while_sleeping.append(db.session().in_transaction())
+        sleep(seconds)
+
+    monkeypatch.setattr(idempotency_service.time, "sleep", watch)
+    response = client.post("/api/orders", json=_order_payload(1),
+                           headers={"Idempotency-Key": "slow-1"})
+
+    assert response.status_code == 422
+    assert open_while_sleeping and not any(open_while_sleeping)
+
+
+def test_purge_command_deletes_expired_keys(
+    app: Flask, client: FlaskClient
+) -> None:
+    payload = _order_payload(_stocked_product())
+    for key in ("old-1", "new-1"):
+        client.post("/api/orders", json=payload,
+                    headers={"Idempotency-Key": key})
+    IdempotencyKey.query.filter_by(key="old-1").update(
+        {"expires_at": utcnow()}
+    )
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=["idempotency", "purge"])
+
+    assert "Purged 1 expired idempotency keys" in result.output
+    assert [k.key for k in IdempotencyKey.query] == ["new-1"]
+
+
+def test_concurrent_duplicates_create_one_order(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Duplicates racing the first request wait for it and replay it."""
+
+    class IdempotencyConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'orders.db'}"
+        SQLALCHEMY_ENGINE_OPTIONS = {"connect_args": {"timeout": 30}}
+
+    monkeypatch.setitem(config, "idempotency", IdempotencyConfig)
+    app = create_app("idempotency")
+    with app.app_context():
+        db.create_all()
+        buyer = User(username="buyer", email="buyer@example.com")
+        buyer.set_password("buyerpass")
+        db.session.add(buyer)
+        db.session.commit()
+        payload = _order_payload(_stocked_product())
+
+    barrier = threading.Barrier(8)
+    results: list[tuple[int, int]] = []
+
+    def submit() -> None:
+        with app.test_client() as client:
+            barrier.wait()
+            response = client.post(
+                "/api/orders",
+                json=payload,
+                headers={"Idempotency-Key": "burst-1"}
+            )
+            results.append(
+                (response.status_code, response.get_json()["data"]["order_id"])
+            )
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 8
+    assert {status for status, _ in results} == {201}
+    assert len({order_id for _, order_id in results}) == 1
+    with app.app_context():
+        assert Order.query.count() == 1
+        assert db.session.get(Product, 1).quantity == 9
+        db.drop_all()
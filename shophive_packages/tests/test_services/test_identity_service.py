@@ -0,0 +1,87 @@
+# tests/test_services/test_identity_service.py
+from flask import Flask, g
+from flask.testing import FlaskClient
+from sqlalchemy import event
+
+from shophive_packages import db
+from shophive_packages.models import Seller, User
+from shophive_packages.services.identity_service import (
+    CachedIdentity, IdentityCache, load_identity
+)
+
+
+def _login(client: FlaskClient) -> None:
+    client.post("/user/login", data={
+        "username": "testuser", "password": "testpass"
+    })
+
+
+def _user_queries(app: Flask, client: FlaskClient, path: str) -> int:
+    """Statements reading the user table while serving ``path``."""
+    seen = []
+
+    def record(conn, cursor, statement, *args) -> None:  # type: ignore
+        if 'FROM "user"' in statement or "FROM user" in statement:
+            seen.append(statement)
+
+    # The fixture's app context and session outlive requests; start from
+    # a clean slate as a production request would.
+    g.pop("_login_user", None)
+    db.session.expunge_all()
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        assert client.get(path).status_code == 200
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    return len(seen)
+
+
+def test_identity_is_cached_between_requests(
+    app: Flask, client: FlaskClient, test_user: User
+) -> None:
+    """Only the first request after login reads the user row."""
+    _login(client)
+    assert _user_queries(app, client, "/user/profile") == 1
+    assert _user_queries(app, client, "/user/profile") == 0
+
+
+def test_profile_update_invalidates_identity(
+    client: FlaskClient, test_user: User
+) -> None:
+    _login(client)
+    client.get("/user/profile")
+    client.post("/user/profile/update", data={
+        "username": "renamed", "email": "test@example.com"
+    })
+    assert b"renamed" in client.get("/user/profile").data
+
+
+def test_identity_is_detached_and_typed(
+    client: FlaskClient, test_user: User
+) -> None:
+    seller = Seller(username="shop", email="shop@example.com")
+    seller.set_password("pw")
+    db.session.add(seller)
+    db.session.commit()
+
+    identity = load_identity(f"seller_{seller.id}")
+    assert isinstance(identity, CachedIdentity)
+    assert identity.get_id() == f"seller_{seller.id}"
+    assert not hasattr(identity, "_sa_instance_state")
+    # A buyer token cannot load a seller and vice versa
+    assert load_identity(f"user_{seller.id}") is None
+    assert load_identity(f"seller_{test_user.id}") is None
+
+
+def test_cache_drops_expired_entries_and_stays_bounded() -> None:
+    identity = CachedIdentity(1, "a", "a@example.com", "buyer", None, False)
+    cache = IdentityCache(max_entries=3)
+    cache.put("user_1", identity, ttl=0)
+    cache.put("user_2", identity, ttl=60)
+    assert len(cache) == 1  # user_1 had expired
+
+    for token in ("user_3", "user_4", "user_5"):
+        cache.put(token, identity, ttl=60)
+    assert len(cache) == 3
+    assert cache.get("user_2") is None  # the oldest went first
+    assert cache.get("user_5") is identity
@@ -0,0 +1,158 @@
+# tests/test_services/test_inventory_service.py
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from flask.testing import FlaskClient
+
+from config import TestingConfig, config
+from shophive_packages import create_app, db
+from shophive_packages.db_utils import utcnow
+from shophive_packages.models import (
+    BackgroundJob, Cart, Order, Product, Seller, StockReservation, User
+)
+from shophive_packages.services.inventory_service import (
+    RELEASE_EXPIRED, InsufficientStockError, hold_stock,
+    release_expired_reservations, reserve_stock
+)
+from shophive_packages.services.task_queue import claim_jobs, run_job
+
+
+def _product(name: str, quantity: int) -> Product:
+    product = Product(name=name, price=10.00, quantity=quantity, seller_id=1)
+    db.session.add(product)
+    db.session.commit()
+    return product
+
+
+def test_reserve_stock_is_all_or_nothing(client: FlaskClient) -> None:
+    """A short line rolls back the lines taken before it."""
+    plenty = _product("Plenty", 10)
+    scarce = _product("Scarce", 1)
+
+    with pytest.raises(InsufficientStockError):
+        reserve_stock({plenty.id: 3, scarce.id: 2})
+    db.session.rollback()
+
+    assert db.session.get(Product, plenty.id).quantity == 10
+    assert db.session.get(Product, scarce.id).quantity == 1
+
+
+def test_create_order_rejects_oversell(
+    client: FlaskClient, test_user: User
+) -> None:
+    """The order API answers 409 instead of going below zero."""
+    product = _product("Widget", 2)
+    payload = {
+        "user_id": 1,
+        "address": "1 Main St",
+        "items": [
+            {"product_id": product.id, "quantity": 2, "price": 10.00}
+        ],
+    }
+
+    assert client.post("/api/orders", json=payload).status_code == 201
+    response = client.post("/api/orders", json=payload)
+    assert response.status_code == 409
+    assert db.session.get(Product, product.id).quantity == 0
+    assert Order.query.count() == 1
+
+
+def test_checkout_takes_stock(client: FlaskClient, test_user: dict) -> None:
+    """Placing an order decrements stock and records the sale."""
+    seller = Seller(username="lampco", email="lamps@example.com")
+    seller.set_password("sellerpass")
+    db.session.add(seller)
+    db.session.commit()
+    product = _product("Lamp", 5)
+    product.seller_id = seller.id
+    db.session.add(Cart(user_id=1, product_id=product.id, quantity=2))
+    db.session.commit()
+    client.post("/user/login", data={
+        "username": "testuser",
+        "password": "testpass"
+    })
+
+    response = client.post("/checkout", data={"address": "1 Main St"})
+    assert response.status_code == 302
+
+    product = db.session.get(Product, product.id)
+    db.session.refresh(product)
+    assert product.quantity == 3
+    assert product.sales == 2
+    assert Order.query.count() == 1
+    assert Cart.query.count() == 0
+
+
+def test_expired_hold_returns_stock(client: FlaskClient) -> None:
+    """Holds take stock immediately and give it back once expired."""
+    product = _product("Chair", 3)
+
+    expires_at = hold_stock(1, {product.id: 2}, ttl_seconds=60)
+    db.session.commit()
+    assert db.session.get(Product, product.id).quantity == 1
+    job = BackgroundJob.query.filter_by(name=RELEASE_EXPIRED).one()
+    assert job.run_at == expires_at
+
+    # Viewing checkout again moves the same job, it does not add one
+    expires_at = hold_stock(1, {product.id: 2}, ttl_seconds=30)
+    db.session.commit()
+    job = BackgroundJob.query.filter_by(name=RELEASE_EXPIRED).one()
+    assert job.run_at == expires_at
+
+    # A run while the hold is live releases nothing and queues the next
+    assert claim_jobs(10, now=expires_at) == [job.id]
+    assert run_job(job.id)
+    assert db.session.get(Product, product.id).quantity == 1
+    queued = BackgroundJob.query.filter_by(
+        name=RELEASE_EXPIRED, status="queued"
+    ).one()
+    assert queued.run_at == expires_at
+
+    assert release_expired_reservations(
+        utcnow() + timedelta(seconds=61)
+    ) == 1
+    db.session.expire_all()
+    assert db.session.get(Product, product.id).quantity == 3
+    assert StockReservation.query.count() == 0
+
+
+def test_concurrent_checkouts_never_oversell(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Many threads racing for the last units never drive stock negative."""
+
+    class ContentionConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'stock.db'}"
+        SQLALCHEMY_ENGINE_OPTIONS = {"connect_args": {"timeout": 30}}
+
+    monkeypatch.setitem(config, "contention", ContentionConfig)
+    app = create_app("contention")
+    with app.app_context():
+        db.create_all()
+        product_id = _product("Flash sale", 5).id
+
+    sold: list[int] = []
+    barrier = threading.Barrier(20)
+
+    def buy() -> None:
+        with app.app_context():
+            barrier.wait()
+            try:
+                reserve_stock({product_id: 1})
+                db.session.commit()
+                sold.append(1)
+            except InsufficientStockError:
+                db.session.rollback()
+
+    threads = [threading.Thread(target=buy) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        assert len(sold) == 5
+        assert db.session.get(Product, product_id).quantity == 0
+        db.drop_all()
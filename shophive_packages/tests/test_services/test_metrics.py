@@ -0,0 +1,90 @@
+# tests/test_services/test_metrics.py
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from flask import Flask, g
+from flask.testing import FlaskClient
+from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+
+from shophive_packages.models import User
+
+HEALTH = {"blueprint": "home_bp", "endpoint": "home_bp.health",
+          "method": "GET", "status": "200"}
+
+
+def _sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_requests_are_recorded_by_route(client: FlaskClient) -> None:
+    before = _sample("shophive_http_request_duration_seconds_count",
+                     **HEALTH)
+    client.get("/health")
+    client.get("/health")
+    assert _sample("shophive_http_request_duration_seconds_count",
+                   **HEALTH) == before + 2
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'shophive_http_request_duration_seconds_bucket{blueprint=' \
+        '"home_bp",endpoint="home_bp.health",le="0.005",method="GET",' \
+        'status="200"}' in text
+    assert 'shophive_db_queries_count{blueprint="home_bp",' \
+        'endpoint="home_bp.health"}' in text
+    assert 'shophive_db_pool_in_use{engine="primary"}' in text
+
+
+def test_sessions_and_identity_cache_are_measured(
+    client: FlaskClient, test_user: User
+) -> None:
+    loads = _sample("shophive_session_store_seconds_count",
+                    backend="memory", operation="load")
+    hits = _sample("shophive_cache_lookups_total",
+                   cache="identity", result="hit")
+    client.post("/user/login", data={
+        "username": "testuser", "password": "testpass"
+    })
+    for _ in range(2):
+        g.pop("_login_user", None)  # each real request loads the user
+        client.get("/cart")
+    assert _sample("shophive_session_store_seconds_count",
+                   backend="memory", operation="load") >= loads + 2
+    assert _sample("shophive_cache_lookups_total",
+                   cache="identity", result="hit") > hits
+
+
+def test_metrics_token(app: Flask, client: FlaskClient) -> None:
+    app.config["METRICS_PUBLIC"] = False
+    assert client.get("/metrics").status_code == 404
+    app.config["METRICS_TOKEN"] = "s3cret"
+    assert client.get("/metrics").status_code == 401
+    response = client.get("/metrics",
+                          headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+
+
+WORKER = """
+from shophive_packages import create_app, db
+app = create_app("testing")
+with app.app_context():
+    db.create_all()
+    client = app.test_client()
+    for _ in range(3):
+        client.get("/health")
+"""
+
+
+def test_workers_add_up_through_the_multiprocess_directory(
+    tmp_path: Path
+) -> None:
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path),
+               PYTHONPATH=os.pathsep.join(sys.path))
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", WORKER], env=env, check=True)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=str(tmp_path))
+    assert registry.get_sample_value(
+        "shophive_http_request_duration_seconds_count", HEALTH
+    ) == 6
@@ -0,0 +1,95 @@
+# tests/test_services/test_outbox_service.py
+import json
+from pathlib import Path
+
+from flask import Flask
+from flask.testing import FlaskClient
+
+from shophive_packages import db
+from shophive_packages.models import OutboxEvent, Product, User
+from shophive_packages.services.outbox_service import (
+    FileSink, dispatch_batch, get_outbox, outbox_lag, publish
+)
+
+
+class BrokenSink:
+    def send(self, events: list[dict]) -> None:
+        raise ConnectionError("indexer down")
+
+
+def _product(price: float = 10.00) -> Product:
+    product = Product(name="Lamp", price=price, quantity=5, seller_id=1)
+    db.session.add(product)
+    db.session.commit()
+    return product
+
+
+def test_order_changes_write_events(
+    client: FlaskClient, test_user: User
+) -> None:
+    """Creating and moving an order writes events with the change."""
+    product = _product()
+    response = client.post("/api/orders", json={
+        "user_id": 1,
+        "items": [{"product_id": product.id, "quantity": 1}],
+    })
+    order_id = response.get_json()["data"]["order_id"]
+    client.patch(f"/api/orders/{order_id}", json={"status": "Processing"})
+
+    events = OutboxEvent.query.order_by(OutboxEvent.id).all()
+    assert [e.topic for e in events] == [
+        "order.created", "order.status_changed"
+    ]
+    assert events[1].payload["from_status"] == "Pending"
+
+
+def test_rolled_back_change_has_no_event(client: FlaskClient) -> None:
+    """Events share the fate of the transaction that wrote them."""
+    publish("order.created", "order", 1, {})
+    db.session.rollback()
+    assert OutboxEvent.query.count() == 0
+
+
+def test_price_change_events(client: FlaskClient) -> None:
+    """Editing a product's price emits updated and price_changed."""
+    product = _product(10.00)
+    client.put(f"/api/products/{product.id}", json={"price": 12.5})
+
+    topics = [e.topic for e in OutboxEvent.query.order_by(OutboxEvent.id)]
+    assert topics == ["product.updated", "product.price_changed"]
+    change = OutboxEvent.query.filter_by(
+        topic="product.price_changed"
+    ).one()
+    assert change.payload == {
+        "product_id": product.id, "old_price": 10.0, "new_price": 12.5
+    }
+
+
+def test_dispatch_is_at_least_once(app: Flask, client: FlaskClient) -> None:
+    """A failing sink keeps the batch for the next attempt."""
+    publish("order.created", "order", 1, {"order_id": 1})
+    publish("order.created", "order", 2, {"order_id": 2})
+    db.session.commit()
+    outbox = get_outbox()
+    memory = outbox.sinks[0]
+
+    outbox.sinks.append(BrokenSink())
+    assert dispatch_batch() == 0
+    assert outbox_lag()["pending"] == 2
+    assert OutboxEvent.query.first().last_error.startswith("ConnectionError")
+
+    outbox.sinks.pop()
+    assert dispatch_batch() == 2
+    assert dispatch_batch() == 0
+    assert outbox_lag()["pending"] == 0
+    # The first attempt had already reached the memory sink
+    assert [e["aggregate_id"] for e in memory.events] == [1, 2, 1, 2]
+
+
+def test_file_sink_appends_json_lines(tmp_path: Path) -> None:
+    path = tmp_path / "events.jsonl"
+    sink = FileSink(str(path))
+    sink.send([{"id": 1, "topic": "order.created"}])
+    sink.send([{"id": 2, "topic": "order.created"}])
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [1, 2]
@@ -0,0 +1,71 @@
+# tests/test_services/test_password_service.py
+import threading
+import time
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from shophive_packages import db
+from shophive_packages.models import User
+from shophive_packages.services.password_service import (
+    HasherBusy, PasswordHasher, _hash, hash_cost
+)
+
+
+def test_queue_depth_is_bounded() -> None:
+    """With every worker and queue slot taken, hashing fails fast."""
+    hasher = PasswordHasher(rounds=4, max_workers=1, max_queue=0)
+    busy = threading.Thread(target=hasher._run, args=(time.sleep, 0.2))
+    busy.start()
+    time.sleep(0.02)
+    try:
+        with pytest.raises(HasherBusy):
+            hasher.hash("pw")
+    finally:
+        busy.join()
+    # The slot is returned once the work finishes
+    assert hasher.verify("pw", hasher.hash("pw"))
+    hasher.shutdown()
+
+
+def test_login_rehashes_outdated_cost(
+    client: FlaskClient, test_user: User
+) -> None:
+    test_user.password = _hash("testpass", 5)
+    db.session.commit()
+
+    response = client.post("/user/login", data={
+        "username": "testuser", "password": "testpass"
+    })
+    assert response.status_code == 302
+    assert hash_cost(db.session.get(User, test_user.id).password) == 4
+    assert test_user.check_password("testpass")
+
+
+def test_busy_hasher_answers_503(
+    app: Flask, client: FlaskClient, test_user: User
+) -> None:
+    hasher = PasswordHasher(rounds=4, max_workers=1, max_queue=0)
+    app.extensions["password_hasher"] = hasher
+    busy = threading.Thread(target=hasher._run, args=(time.sleep, 0.2))
+    busy.start()
+    time.sleep(0.02)
+    try:
+        response = client.post("/login", json={
+            "username": "testuser", "password": "testpass"
+        })
+    finally:
+        busy.join()
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_bench_reports_each_cost(app: Flask) -> None:
+    result = app.test_cli_runner().invoke(
+        args=["passwords", "bench", "--costs", "4,5", "--seconds", "0.05",
+              "--workers", "1"]
+    )
+    assert result.exit_code == 0, result.output
+    costs = [line.split()[0] for line in result.output.splitlines()[2:-1]]
+    assert costs == ["4", "5"]
@@ -0,0 +1,250 @@
+# tests/test_services/test_payment_service.py
+import json
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from shophive_packages import db
+from shophive_packages.models import Cart, Order, Product, User
+from shophive_packages.services.payment_service import (
+    CircuitBreaker, FakeGateway, HttpGateway, PaymentClient, PaymentDeclined,
+    PaymentUnavailable, get_payments, init_payments
+)
+from shophive_packages.services.task_queue import run_pending
+
+
+class _Processor(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+    body = b""
+    connections: set = set()
+
+    def do_POST(self) -> None:
+        _Processor.connections.add(self.client_address)
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(_Processor.delay)
+        body = _Processor.body or json.dumps(
+            {"id": "auth_1", "status": "authorized"}
+        ).encode()
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def processor() -> Iterator[str]:
+    _Processor.delay = 0.0
+    _Processor.body = b""
+    _Processor.connections = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Processor)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_gateway_reuses_connections(processor: str) -> None:
+    """Sequential calls share one keep-alive connection."""
+    gateway = HttpGateway(processor, "key", read_timeout=1.0)
+    for i in range(3):
+        auth = gateway.authorize(Decimal("9.99"), "USD", f"ref-{i}", "tok")
+        assert auth.id == "auth_1"
+    assert len(_Processor.connections) == 1
+
+
+def test_http_gateway_read_timeout(processor: str) -> None:
+    """A slow processor fails the call instead of pinning the worker."""
+    _Processor.delay = 0.5
+    gateway = HttpGateway(processor, "key", read_timeout=0.1)
+    with pytest.raises(PaymentUnavailable):
+        gateway.authorize(Decimal("1.00"), "USD", "slow", "tok")
+
+
+@pytest.mark.parametrize("body", [b"<html>oops</html>", b'{"status": "ok"}'])
+def test_http_gateway_bad_response_is_unavailable(
+    processor: str, body: bytes
+) -> None:
+    """A garbled 2xx body counts as an outage, not a crash."""
+    _Processor.body = body
+    gateway = HttpGateway(processor, "key", read_timeout=1.0)
+    with pytest.raises(PaymentUnavailable):
+        gateway.authorize(Decimal("1.00"), "USD", "garbled", "tok")
+
+
+def test_circuit_breaker_fails_fast_then_recovers() -> None:
+    gateway = FakeGateway()
+    client = PaymentClient(gateway, CircuitBreaker(2, reset_seconds=0.05))
+    gateway.fail_next = 2
+    for _ in range(2):
+        with pytest.raises(PaymentUnavailable):
+            client.authorize(Decimal("1"), "USD", "a", "tok")
+
+    # Open: the gateway is not called at all
+    with pytest.raises(PaymentUnavailable, match="circuit"):
+        client.authorize(Decimal("1"), "USD", "b", "tok")
+
+    time.sleep(0.06)
+    client.authorize(Decimal("1"), "USD", "c", "tok")
+    assert client.breaker.state == "closed"
+
+
+def test_failed_trial_does_not_wedge_the_circuit() -> None:
+    """A half-open trial that crashes re-opens the circuit for a retry."""
+    gateway = FakeGateway()
+    client = PaymentClient(gateway, CircuitBreaker(1, reset_seconds=0.05))
+    gateway.fail_next = 1
+    with pytest.raises(PaymentUnavailable):
+        client.authorize(Decimal("1"), "USD", "a", "tok")
+
+    time.sleep(0.06)
+    with pytest.raises(KeyError):
+        client.capture("missing")  # unexpected error on the trial call
+
+    time.sleep(0.06)
+    client.authorize(Decimal("1"), "USD", "b", "tok")
+    assert client.breaker.state == "closed"
+
+
+def test_concurrency_is_bounded() -> None:
+    """Calls beyond the limit give up instead of queueing."""
+    client = PaymentClient(
+        FakeGateway(latency=0.2), max_concurrency=1, acquire_timeout=0.01
+    )
+    errors = []
+
+    def pay(ref: str) -> None:
+        try:
+            client.authorize(Decimal("1"), "USD", ref, "tok")
+        except PaymentUnavailable as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=pay, args=(f"r{i}",))
+               for i in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(errors) == 1
+
+
+@pytest.mark.parametrize("name", [None, "fake"])
+def test_fake_gateway_is_refused_where_not_allowed(name: str) -> None:
+    """A production deploy must name a real processor."""
+    app = Flask(__name__)
+    app.config.update(PAYMENT_GATEWAY=name, PAYMENT_ALLOW_FAKE=False)
+    with pytest.raises(ValueError, match="PAYMENT_GATEWAY"):
+        init_payments(app)
+
+
+def _checkout(client: FlaskClient, stock: int, token: str = "tok") -> None:
+    product = Product(name="Lamp", price=10.00, quantity=stock, seller_id=1)
+    db.session.add(product)
+    db.session.commit()
+    db.session.add(Cart(user_id=1, product_id=product.id, quantity=2))
+    db.session.commit()
+    client.post("/user/login", data={
+        "username": "testuser", "password": "testpass"
+    })
+    client.post("/checkout", data={
+        "address": "1 Main St", "payment_token": token
+    })
+
+
+def test_checkout_authorizes_and_captures(
+    client: FlaskClient, test_user: User
+) -> None:
+    _checkout(client, stock=5)
+
+    order = Order.query.one()
+    gateway = get_payments().gateway
+    assert gateway.authorizations[order.payment_reference]["amount"] == 20
+    run_pending()
+    assert gateway.authorizations[order.payment_reference]["status"] == (
+        "captured"
+    )
+
+
+def test_declined_capture_cancels_and_restocks(
+    client: FlaskClient, test_user: User, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _checkout(client, stock=5)
+
+    def decline(authorization_id: str) -> None:
+        raise PaymentDeclined("Insufficient funds")
+
+    monkeypatch.setattr(get_payments().gateway, "capture", decline)
+    run_pending()
+
+    order = Order.query.one()
+    db.session.refresh(order)
+    assert order.status == "Cancelled"
+    assert "Insufficient funds" in order.history.all()[-1].note
+    assert db.session.get(Product, order.items[0].product_id).quantity == 5
+
+
+def test_declined_payment_places_no_order(
+    client: FlaskClient, test_user: User
+) -> None:
+    _checkout(client, stock=5, token=FakeGateway.DECLINED_TOKEN)
+    assert Order.query.count() == 0
+    assert Product.query.one().quantity == 5
+
+
+def test_failed_order_voids_authorization(
+    client: FlaskClient, test_user: User
+) -> None:
+    _checkout(client, stock=1)
+    assert Order.query.count() == 0
+    statuses = {
+        a["status"] for a in get_payments().gateway.authorizations.values()
+    }
+    assert statuses == {"voided"}
+
+
+def test_retry_after_failed_order_gets_a_live_authorization(
+    client: FlaskClient, test_user: User, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Retrying with the same key must not reuse the voided payment."""
+    from shophive_packages.routes import checkout_routes
+
+    record_sales = checkout_routes.record_sales
+    calls = []
+
+    def fail_once(lines: dict) -> None:
+        calls.append(lines)
+        if len(calls) == 1:
+            raise RuntimeError("database went away")
+        record_sales(lines)
+
+    monkeypatch.setattr(checkout_routes, "record_sales", fail_once)
+    client.application.config["PROPAGATE_EXCEPTIONS"] = False
+    product = Product(name="Lamp", price=10.00, quantity=5, seller_id=1)
+    db.session.add(product)
+    db.session.commit()
+    db.session.add(Cart(user_id=1, product_id=product.id, quantity=1))
+    db.session.commit()
+    client.post("/user/login", data={
+        "username": "testuser", "password": "testpass"
+    })
+    form = {"address": "1 Main St", "payment_token": "tok",
+            "idempotency_key": "retry-me"}
+    assert client.post("/checkout", data=form).status_code == 500
+    assert client.post("/checkout", data=form).status_code == 302
+
+    order = Order.query.one()
+    gateway = get_payments().gateway
+    assert gateway.authorizations[order.payment_reference]["status"] == (
+        "authorized"
+    )
@@ -0,0 +1,75 @@
+# tests/test_services/test_rate_limit.py
+import time
+
+from flask import Flask
+from flask.testing import FlaskClient
+from sqlalchemy import event
+
+from shophive_packages import db
+from shophive_packages.models import User
+from shophive_packages.services.rate_limit import (
+    Limit, MemoryBuckets, RateLimiter, RedisBuckets, by_ip
+)
+
+
+def _login(client: FlaskClient, username: str) -> int:
+    return client.post("/login", json={
+        "username": username, "password": "wrong"
+    }).status_code
+
+
+def test_login_is_rejected_before_any_query(
+    app: Flask, client: FlaskClient, test_user: User
+) -> None:
+    app.extensions["rate_limiter"] = RateLimiter(
+        MemoryBuckets(), {"login:username": "2/minute"}
+    )
+    assert _login(client, "testuser") == 401
+    assert _login(client, "TestUser ") == 401
+
+    statements = []
+
+    def record(conn, cursor, statement, *args) -> None:  # type: ignore
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        response = client.post("/login", json={
+            "username": "testuser", "password": "testpass"
+        })
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert statements == []
+
+    # Other usernames have their own bucket
+    assert _login(client, "someoneelse") == 401
+
+
+def test_buckets_refill() -> None:
+    buckets = MemoryBuckets()
+    fast = Limit(1, 100.0)
+    assert buckets.take([("k", fast)]) == 0
+    assert buckets.take([("k", fast)]) > 0
+    time.sleep(0.02)
+    assert buckets.take([("k", fast)]) == 0
+
+
+def test_charges_are_all_or_nothing() -> None:
+    buckets = MemoryBuckets()
+    one, many = Limit(1, 0.01), Limit(5, 0.01)
+    assert buckets.take([("ip", many), ("user", one)]) == 0
+    assert buckets.take([("ip", many), ("user", one)]) > 0
+    # The rejected request did not use up the IP bucket
+    for _ in range(4):
+        assert buckets.take([("ip", many)]) == 0
+    assert buckets.take([("ip", many)]) > 0
+
+
+def test_unreachable_redis_lets_requests_through(app: Flask) -> None:
+    limiter = RateLimiter(
+        RedisBuckets("redis://127.0.0.1:1/0"), {"login:ip": "1/minute"}
+    )
+    with app.test_request_context("/login", method="POST"):
+        assert limiter.check("login", [by_ip]) == 0
@@ -0,0 +1,141 @@
+# tests/test_services/test_replica_router.py
+from pathlib import Path
+from typing import Generator
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+from config import TestingConfig
+from shophive_packages import create_app, db
+from shophive_packages.models import Product, ReplicaHeartbeat
+from shophive_packages.services.replica_router import (
+    ReplicaRouter, get_replica_router
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def replica_app(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Generator[Flask, None, None]:
+    """A primary and one replica, each an SQLite file."""
+    monkeypatch.setattr(TestingConfig, "SQLALCHEMY_DATABASE_URI",
+                        f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setattr(TestingConfig, "SQLALCHEMY_BINDS",
+                        {"replica1": f"sqlite:///{tmp_path / 'replica.db'}"})
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(db.engines["replica1"])
+        # Same ids, different names: the response shows who answered
+        for engine, name in ((db.engine, "Primary mug"),
+                             (db.engines["replica1"], "Replica mug")):
+            with engine.begin() as conn:
+                conn.execute(Product.__table__.insert().values(
+                    id=1, name=name, price=8.5, quantity=10
+                ))
+        router = get_replica_router()
+        assert router is not None
+        router.clock = FakeClock()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+        db.engines["replica1"].dispose()
+
+
+def _served_by(app: Flask, **cookies: str) -> str:
+    client = app.test_client()
+    for name, value in cookies.items():
+        client.set_cookie(name, value)
+    page = client.get("/product/1").data
+    return "Replica mug" if b"Replica mug" in page else "Primary mug"
+
+
+def test_catalog_reads_go_to_a_healthy_replica(replica_app: Flask) -> None:
+    assert _served_by(replica_app) == "Replica mug"
+    # Blueprints outside DB_REPLICA_BLUEPRINTS stay on the primary
+    replica_app.config["DB_REPLICA_BLUEPRINTS"] = ()
+    assert _served_by(replica_app) == "Primary mug"
+
+
+def test_a_browser_that_wrote_reads_from_the_primary(
+    replica_app: Flask
+) -> None:
+    client = replica_app.test_client()
+    client.post("/user/register", data={
+        "username": "buyer", "email": "buyer@example.com",
+        "password": "secret123",
+    })
+    cookie = client.get_cookie("shophive_primary")
+    assert cookie is not None
+    assert b"Primary mug" in client.get("/product/1").data
+
+    with replica_app.app_context():
+        clock = get_replica_router().clock  # type: ignore[union-attr]
+        clock.now += 6  # past DB_REPLICA_STICKY_SECONDS
+    assert _served_by(replica_app,
+                      shophive_primary=cookie.value) == "Replica mug"
+
+
+def test_a_lagging_replica_drops_out_until_it_catches_up(
+    tmp_path: Path
+) -> None:
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    for engine in (primary, replica):
+        ReplicaHeartbeat.__table__.create(engine)
+    clock = FakeClock()
+    router = ReplicaRouter(primary, {"replica1": replica}, max_lag=10,
+                           clock=clock)
+
+    def replicate() -> None:
+        with primary.connect() as source, replica.begin() as target:
+            beat = source.execute(
+                ReplicaHeartbeat.__table__.select()
+            ).one()
+            target.execute(ReplicaHeartbeat.__table__.delete())
+            target.execute(ReplicaHeartbeat.__table__.insert().values(
+                id=beat.id, beat_at=beat.beat_at
+            ))
+
+    (state,) = router.check()
+    assert state.healthy and state.lag == 0
+    replicate()
+    for _ in range(3):
+        clock.now += 2
+        router.check()
+        replicate()
+    assert state.healthy and state.lag == 0
+
+    # Replication stops: the replica falls further behind every check
+    for _ in range(5):
+        clock.now += 3
+        router.check()
+    assert not state.healthy and state.lag == 15
+    assert router.pick() is None
+
+    replicate()
+    clock.now += 2
+    router.check()
+    assert state.healthy
+    assert router.pick() is replica
+
+
+def test_an_unreachable_replica_is_taken_out(replica_app: Flask) -> None:
+    with replica_app.app_context():
+        router = get_replica_router()
+        assert router is not None
+        broken: Engine = create_engine("sqlite:////nonexistent/dir/x.db")
+        router.replicas[0].engine = broken
+        (state,) = router.check()
+    assert not state.healthy and state.error
+    assert _served_by(replica_app) == "Primary mug"
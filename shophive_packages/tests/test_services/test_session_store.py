@@ -0,0 +1,191 @@
+# tests/test_services/test_session_store.py
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from cachelib.file import FileSystemCache
+from flask import Flask, Response, request
+from flask.testing import FlaskClient
+from sqlalchemy import update
+
+from shophive_packages import db
+from shophive_packages.db_utils import utcnow
+from shophive_packages.models import ServerSession, User
+from shophive_packages.services.session_store import (
+    CountingStore, FakeRedis, RedisSessionStore, SqlSessionStore,
+    StoredSession, StoreSessionInterface, dumps, loads,
+    migrate_file_sessions
+)
+
+
+def test_serialization_is_compact_and_typed() -> None:
+    data = {
+        "_flashes": [("info", "hi")],
+        "at": datetime(2024, 1, 2, tzinfo=timezone.utc),
+    }
+    blob = dumps(data)
+    assert blob.startswith(b"j")
+    assert loads(blob) == data
+
+    big = {"cart_items": [{"product_id": i, "quantity": 1}
+                          for i in range(100)]}
+    blob = dumps(big)
+    assert blob.startswith(b"z")
+    assert len(blob) < len(dumps(big, compress_min_bytes=10**6)) / 3
+    assert loads(blob) == big
+    assert loads(b"jnot json") is None
+
+
+def test_login_session_lives_in_the_store(
+    app: Flask, client: FlaskClient, test_user: User
+) -> None:
+    client.post("/user/login", data={
+        "username": "testuser", "password": "testpass"
+    })
+    sid = client.get_cookie("shophive_session").value
+    store = app.extensions["session_store"]
+    assert loads(store.get(sid))["_user_id"] == f"user_{test_user.id}"
+    assert client.get("/user/profile").status_code == 200
+
+
+def test_sql_store_expires_and_purges(client: FlaskClient) -> None:
+    store = SqlSessionStore()
+    store.set("a" * 43, b"j{}", ttl=60)
+    store.set("a" * 43, b'j{"x":1}', ttl=60)
+    store.set("b" * 43, b"j{}", ttl=60)
+    assert store.get("a" * 43) == b'j{"x":1}'
+
+    with db.engine.begin() as conn:
+        conn.execute(
+            update(ServerSession.__table__)
+            .where(ServerSession.sid == "b" * 43)
+            .values(expires_at=utcnow() - timedelta(seconds=1))
+        )
+    assert store.get("b" * 43) is None
+    assert store.purge() == 1
+    store.delete("a" * 43)
+    assert store.get("a" * 43) is None
+
+
+def test_file_sessions_are_migrated_and_adopted(
+    app: Flask, tmp_path: Path
+) -> None:
+    sid = "legacy-session-id-0123456789"
+    files = FileSystemCache(str(tmp_path))
+    files.set("shophive:" + sid,
+              {"cart_items": [{"product_id": 3, "quantity": 2}]},
+              timeout=3600)
+    files.set("shophive:expired-session-0123456789", {"a": 1}, timeout=1)
+    time.sleep(1.1)
+    store = RedisSessionStore(FakeRedis())
+    with app.app_context():
+        assert migrate_file_sessions(store, str(tmp_path)) == (1, 1)
+
+    interface = StoreSessionInterface(store, legacy_key_prefix="shophive:")
+    cookie = f"shophive_session={sid}"
+    with app.test_request_context(headers={"Cookie": cookie}):
+        session = interface.open_session(app, request)
+    assert session.sid == sid
+    assert session["cart_items"] == [{"product_id": 3, "quantity": 2}]
+    # Saved under the real id at the end of the request
+    assert session.modified
+
+
+def test_unchanged_sessions_are_not_rewritten(
+    app: Flask, client: FlaskClient
+) -> None:
+    now = [1_000_000.0]
+    store = CountingStore(RedisSessionStore(FakeRedis()))
+    interface = StoreSessionInterface(store, clock=lambda: now[0])
+
+    def request_with(sid: str = "", **values: object) -> Response:
+        headers = {"Cookie": f"shophive_session={sid}"} if sid else {}
+        with app.test_request_context(headers=headers):
+            session = interface.open_session(app, request)
+        session.update(values)
+        response = Response()
+        interface.save_session(app, session, response)
+        return response
+
+    # Nothing stored for a visitor who never used the session
+    assert "Set-Cookie" not in request_with().headers
+    assert store.writes == 0
+    response = request_with(cart_items=[1])
+    sid = response.headers["Set-Cookie"].split(";")[0].split("=", 1)[1]
+    assert store.writes == 1
+
+    now[0] += 600
+    assert "Set-Cookie" not in request_with(sid).headers
+    assert "Set-Cookie" not in request_with(sid, cart_items=[1]).headers
+    assert store.writes == 1
+    assert "Set-Cookie" in request_with(sid, cart_items=[1, 2]).headers
+    assert store.writes == 2
+
+    # Expiry is pushed forward once the refresh interval has passed
+    now[0] += 3600
+    assert "Set-Cookie" in request_with(sid).headers
+    assert store.writes == 3
+    assert "Set-Cookie" not in request_with(sid).headers
+    assert store.writes == 3
+
+
+def test_anonymous_csrf_token_is_kept_in_a_cookie(
+    app: Flask, client: FlaskClient
+) -> None:
+    store = CountingStore(RedisSessionStore(FakeRedis()))
+    interface = StoreSessionInterface(store)
+
+    def request_with(
+        cookie: str = "", **values: object
+    ) -> tuple[StoredSession, Response]:
+        headers = {"Cookie": cookie} if cookie else {}
+        with app.test_request_context(headers=headers):
+            session = interface.open_session(app, request)
+        session.update(values)
+        response = Response()
+        interface.save_session(app, session, response)
+        return session, response
+
+    _, response = request_with(csrf_token="abc")
+    assert response.headers["Set-Cookie"].startswith("shophive_csrf=abc.")
+    assert store.writes == 0
+    cookie = response.headers["Set-Cookie"].split(";")[0]
+
+    session, response = request_with(cookie)
+    assert session["csrf_token"] == "abc"
+    assert "Set-Cookie" not in response.headers
+    session, _ = request_with(cookie[:-2] + "xx")
+    assert "csrf_token" not in session
+
+    # A flash message makes it a stored session, token included
+    session, response = request_with(cookie, _flashes=[("info", "hi")])
+    assert store.writes == 1
+    assert loads(store.get(session.sid))["csrf_token"] == "abc"
+    assert any(c.startswith("shophive_csrf=;")
+               for c in response.headers.getlist("Set-Cookie"))
+
+    # The home page renders a CSRF token without storing a session
+    client.get("/")
+    assert client.get_cookie("shophive_session") is None
+    assert client.get_cookie("shophive_csrf") is not None
+
+
+def test_health_and_static_never_open_a_session(
+    app: Flask, client: FlaskClient, test_user: User,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    client.post("/user/login", data={
+        "username": "testuser", "password": "testpass"
+    })
+    store = app.session_interface.inner  # type: ignore[attr-defined]
+    calls = []
+    original = store.open_session
+    monkeypatch.setattr(store, "open_session",
+                        lambda *args: calls.append(1) or original(*args))
+
+    response = client.get("/health")
+    assert response.get_json() == {"status": "ok"}
+    assert "Set-Cookie" not in response.headers
+    client.get("/static/css/missing.css")
+    assert calls == []
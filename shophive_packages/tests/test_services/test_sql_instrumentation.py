@@ -0,0 +1,78 @@
+# tests/test_services/test_sql_instrumentation.py
+import logging
+import re
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from sqlalchemy import select
+
+from config import TestingConfig
+from shophive_packages import create_app, db
+from shophive_packages.models import Cart, Product, User
+from shophive_packages.services.sql_instrumentation import (
+    RepeatedQueryError, statement_shape
+)
+
+
+@pytest.fixture
+def app(monkeypatch: pytest.MonkeyPatch) -> Flask:
+    monkeypatch.setattr(TestingConfig, "SQL_INSTRUMENTATION", True)
+    monkeypatch.setattr(TestingConfig, "SQL_REPEAT_THRESHOLD", 5)
+    return create_app("testing")
+
+
+def _buyer_with_cart(client: FlaskClient, user: User, lines: int) -> None:
+    products = [Product(name=f"Item {i}", price=1.0, quantity=10,
+                        seller_id=1) for i in range(lines)]
+    db.session.add_all(products)
+    db.session.commit()
+    db.session.add_all(Cart(user.id, product.id, 1) for product in products)
+    db.session.commit()
+    client.post("/user/login", data={
+        "username": "testuser", "password": "testpass"
+    })
+    db.session.expunge_all()
+
+
+def test_statement_shapes_fold_literals_and_lists() -> None:
+    assert statement_shape(
+        "SELECT *\n  FROM products WHERE id IN (?, ?, ?) AND name = 'mug'"
+        " LIMIT 10"
+    ) == "SELECT * FROM products WHERE id IN (?) AND name = ? LIMIT ?"
+    assert statement_shape("SELECT anon_1.id FROM t1 AS anon_1") == (
+        "SELECT anon_1.id FROM t1 AS anon_1"
+    )
+
+
+def test_requests_report_their_queries(
+    client: FlaskClient, caplog: pytest.LogCaptureFixture
+) -> None:
+    with caplog.at_level(logging.INFO):
+        response = client.get("/health")
+    assert re.fullmatch(r'db;dur=\d+\.\d;desc="\d+ queries"',
+                        response.headers["Server-Timing"])
+    assert "GET /health 200: " in caplog.text
+
+
+def test_the_buyer_cart_page_is_reported(
+    client: FlaskClient, test_user: User, caplog: pytest.LogCaptureFixture
+) -> None:
+    _buyer_with_cart(client, test_user, 8)
+    with caplog.at_level(logging.WARNING):
+        assert client.get("/cart").status_code == 200
+    warnings = [r.getMessage() for r in caplog.records
+                if "likely an N+1 query" in r.getMessage()]
+    assert warnings
+    assert all("GET /cart (cart_bp.cart)" in w for w in warnings)
+
+
+def test_raise_mode_stops_the_repeated_statement(
+    app: Flask, client: FlaskClient
+) -> None:
+    app.extensions["sql_instrumentation"].repeat_action = "raise"
+    with app.test_request_context("/products"):
+        for product_id in range(5):
+            db.session.execute(select(Product).where(Product.id == product_id))
+        with pytest.raises(RepeatedQueryError, match="more than 5 times"):
+            db.session.execute(select(Product).where(Product.id == 5))
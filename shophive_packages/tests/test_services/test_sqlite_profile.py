@@ -0,0 +1,137 @@
+# tests/test_services/test_sqlite_profile.py
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from flask import Flask, has_request_context, request
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+from config import TestingConfig, config
+from shophive_packages import create_app, db
+from shophive_packages.models import Cart, Product, StockReservation, User
+from shophive_packages.services.sqlite_profile import (
+    DEFAULT_PRAGMAS, SqliteWriter, _write_intent, get_sqlite_writer,
+    run_write_bench
+)
+
+
+def _engine(tmp_path: Path) -> tuple[Engine, SqliteWriter]:
+    engine = create_engine(f"sqlite:///{tmp_path / 'shop.db'}")
+    writer = SqliteWriter(engine, DEFAULT_PRAGMAS, queue_timeout=5)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE stock (id INTEGER, quantity INT)"))
+        conn.execute(text("INSERT INTO stock VALUES (1, 10)"))
+    return engine, writer
+
+
+def test_connections_get_the_pragmas(tmp_path: Path) -> None:
+    engine, _ = _engine(tmp_path)
+    with engine.connect() as conn:
+        pragma = conn.exec_driver_sql
+        assert pragma("PRAGMA journal_mode").scalar() == "wal"
+        assert pragma("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert pragma("PRAGMA busy_timeout").scalar() == 5000
+        assert pragma("PRAGMA cache_size").scalar() == -64000
+
+
+def test_writers_queue_while_readers_carry_on(tmp_path: Path) -> None:
+    engine, writer = _engine(tmp_path)
+    order = []
+
+    def second_writer() -> None:
+        with engine.begin() as conn:
+            order.append("second writer in")
+            conn.execute(text("UPDATE stock SET quantity = quantity - 1"))
+
+    with engine.begin() as conn:
+        # Read first, write later: safe because the lock is taken up-front
+        conn.execute(text("SELECT quantity FROM stock")).scalar()
+        thread = threading.Thread(target=second_writer)
+        thread.start()
+        time.sleep(0.2)
+
+        writer.intent = lambda: False
+        with engine.connect() as reader:
+            assert reader.execute(
+                text("SELECT quantity FROM stock")
+            ).scalar() == 10
+        writer.intent = lambda: True
+
+        conn.execute(text("UPDATE stock SET quantity = quantity - 1"))
+        order.append("first writer done")
+    thread.join()
+
+    assert order == ["first writer done", "second writer in"]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT quantity FROM stock")).scalar() == 8
+
+
+def test_only_unsafe_requests_take_the_writer_path(app: Flask) -> None:
+    with app.test_request_context("/cart/add", method="POST"):
+        assert _write_intent()
+    with app.test_request_context("/cart", method="GET"):
+        assert not _write_intent()
+    # Token logins are marked read_mostly
+    with app.test_request_context("/api/v1/auth/token", method="POST"):
+        assert not _write_intent()
+    # The checkout page holds stock on GET
+    with app.test_request_context("/checkout", method="GET"):
+        assert _write_intent()
+    with app.app_context():
+        assert _write_intent()
+
+
+def test_checkout_page_holds_stock_on_the_writer_path(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    class ProfileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'shop.db'}"
+        SQLITE_HIGH_CONCURRENCY = True
+        INVENTORY_RESERVATION_TTL = 60
+        WTF_CSRF_ENABLED = False
+
+    monkeypatch.setitem(config, "profile", ProfileConfig)
+    app = create_app("profile")
+    with app.app_context():
+        db.create_all()
+        user = User(username="buyer", email="buyer@example.com")
+        user.set_password("testpass")
+        product = Product(name="Lamp", price=5.00, quantity=3, seller_id=1)
+        db.session.add_all([user, product])
+        db.session.commit()
+        product_id = product.id
+        db.session.add(Cart(user.id, product_id, 2))
+        db.session.commit()
+        writer = get_sqlite_writer()
+        assert writer is not None
+
+    writer_paths = []
+    acquire = writer._acquire
+
+    def recording_acquire() -> bool:
+        if has_request_context():
+            writer_paths.append(request.path)
+        return acquire()
+
+    monkeypatch.setattr(writer, "_acquire", recording_acquire)
+    client = app.test_client()
+    client.post("/user/login", data={
+        "username": "buyer", "password": "testpass"
+    })
+    writer_paths.clear()
+    assert client.get("/checkout").status_code == 200
+
+    assert "/checkout" in writer_paths
+    with app.app_context():
+        assert StockReservation.query.count() == 1
+        assert db.session.get(Product, product_id).quantity == 1
+        db.session.remove()
+        db.drop_all()
+
+
+def test_bench_runs_writer_and_reader_processes(tmp_path: Path) -> None:
+    totals = run_write_bench(2, 1, 0.3, True, directory=str(tmp_path))
+    assert totals["commits"] > 0 and totals["reads"] > 0
+    assert totals["write_errors"] == totals["read_errors"] == 0
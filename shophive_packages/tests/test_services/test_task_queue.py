@@ -0,0 +1,94 @@
+# tests/test_services/test_task_queue.py
+from datetime import timedelta
+
+from flask.testing import FlaskClient
+
+from shophive_packages import db
+from shophive_packages.db_utils import utcnow
+from shophive_packages.models import BackgroundJob, Product, User
+from shophive_packages.services.task_queue import (
+    claim_jobs, enqueue, run_job, run_pending, task
+)
+
+calls: list[dict] = []
+
+
+@task("test.flaky")
+def flaky(payload: dict) -> None:
+    calls.append(payload)
+    raise RuntimeError("downstream unavailable")
+
+
+def test_order_enqueues_single_job(
+    client: FlaskClient, test_user: User
+) -> None:
+    """Placing an order costs one queue insert; the worker fans it out."""
+    product = Product(name="Pen", price=1.00, quantity=5, seller_id=1)
+    db.session.add(product)
+    db.session.commit()
+
+    client.post("/api/orders", json={
+        "user_id": 1,
+        "address": "1 Main St",
+        "items": [{"product_id": product.id, "quantity": 1, "price": 1.00}],
+    })
+    assert BackgroundJob.query.count() == 1
+    assert BackgroundJob.query.first().name == "order.placed"
+
+    assert run_pending() == 5
+    statuses = {job.status for job in BackgroundJob.query.all()}
+    assert statuses == {"done"}
+
+
+def test_enqueue_rolls_back_with_caller(client: FlaskClient) -> None:
+    """A job is only visible if the transaction that queued it commits."""
+    enqueue("test.flaky", {"n": 1})
+    db.session.rollback()
+    assert BackgroundJob.query.count() == 0
+
+
+def test_failed_job_backs_off_then_gives_up(client: FlaskClient) -> None:
+    """Failures are retried later and marked failed after max attempts."""
+    calls.clear()
+    job = enqueue("test.flaky", {"n": 1})
+    job.max_attempts = 2
+    db.session.commit()
+
+    assert run_pending() == 1
+    db.session.refresh(job)
+    assert job.status == "queued"
+    assert job.run_at > utcnow()
+    assert claim_jobs(10) == []
+
+    assert claim_jobs(10, now=job.run_at + timedelta(seconds=1)) == [job.id]
+    assert run_job(job.id) is False
+    db.session.refresh(job)
+    assert job.status == "failed"
+    assert job.attempts == 2
+    assert "downstream unavailable" in job.last_error
+    assert len(calls) == 2
+
+
+@task("test.ok")
+def ok(payload: dict) -> None:
+    calls.append(payload)
+
+
+def test_only_running_jobs_are_reclaimed_after_their_lease(
+    client: FlaskClient
+) -> None:
+    """A stale lease is taken over; a finished job is never run again."""
+    calls.clear()
+    job = enqueue("test.ok", {"n": 1})
+    db.session.commit()
+    later = utcnow() + timedelta(hours=1)
+
+    assert claim_jobs(10) == [job.id]
+    # The worker died: the lease runs out and another worker takes over
+    assert claim_jobs(10, now=later) == [job.id]
+    assert run_job(job.id) is True
+    db.session.refresh(job)
+    assert (job.status, job.locked_at) == ("done", None)
+
+    assert claim_jobs(10, now=later + timedelta(hours=1)) == []
+    assert len(calls) == 1